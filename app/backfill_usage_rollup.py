@@ -0,0 +1,31 @@
+import os
+import sys
+import argparse
+from datetime import date
+
+# Ensure app is in path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import SessionLocal, engine, Base
+from app.models.user import User
+from app.models.feedback import Feedback
+from app.models.stats import UsageLog, UsageDailyRollup
+from app.services.usage_accounting import backfill_rollup
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild usage_daily_rollup from raw usage_logs.")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD). Default: all history")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD). Default: today")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, tables=[UsageDailyRollup.__table__])
+
+    db = SessionLocal()
+    try:
+        rows = backfill_rollup(db, start=args.start, end=args.end)
+        print(f"Backfill complete: {rows} rollup rows written.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -30,10 +30,127 @@ class Settings(BaseSettings):
     AZURE_OPENAI_DEPLOYMENT_NAME: str | None = None
     AZURE_OPENAI_API_VERSION: str = "2024-12-01-preview"
 
+    # LLM Gateway connection pool (one per endpoint, shared by all LLM callers)
+    LLM_HTTP2: bool = True
+    LLM_POOL_MAX_CONNECTIONS: int = 100
+    LLM_POOL_MAX_KEEPALIVE: int = 20
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_TIMEOUT: float = 60.0
+
+    # Exact-match LLM response cache (opt-in). Only calls at or below LLM_CACHE_MAX_TEMPERATURE are cached
+    # unless the caller passes cache=True; entries are namespaced per tenant. Hits are logged as zero-cost usage.
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.0
+    LLM_CACHE_TTL_SECONDS: int = 3600 # 0 = no expiry
+    LLM_CACHE_MAX_ENTRIES: int = 1000 # In-process LRU tier
+    LLM_CACHE_PATH: str | None = None # e.g. ./data/llm_cache.db: shared SQLite tier for all workers on the host
+    LLM_CACHE_MAX_MB: int = 256
+
+    # Single-flight: identical concurrent LLM requests share one upstream call (followers are logged as zero-cost)
+    LLM_COALESCE_ENABLED: bool = True
+    LLM_COALESCE_MAX_TEMPERATURE: float = 2.0 # Lower it to keep concurrent sampled calls as independent samples
+
+    # Per-deployment rate limiting (AIModel.rpm_limit / tpm_limit / max_inflight override; 0 = unlimited).
+    # Callers queue FIFO for budget instead of hitting Azure 429s.
+    LLM_DEFAULT_RPM_LIMIT: int = 0
+    LLM_DEFAULT_TPM_LIMIT: int = 0
+    LLM_DEFAULT_MAX_INFLIGHT: int = 0
+    LLM_LIMITER_BURST_SECONDS: float = 10.0 # Bucket size: this many seconds of the per-minute budget
+    LLM_LIMITER_COMPLETION_TOKENS: int = 500 # TPM reservation for the completion when max_tokens is not set
+    LLM_LIMITER_QUEUE_TIMEOUT_SECONDS: float = 120.0 # Waiting longer fails the call; 0 = wait indefinitely
+    LLM_LIMITER_429_PAUSE_SECONDS: float = 1.0 # Queue pause on a 429 without Retry-After
+
+    # Resilience: retries (429 / 5xx / timeouts, jittered exponential backoff honoring Retry-After),
+    # hedging to the fallback deployment (AIModel.fallback_model_id) and a per-deployment circuit breaker
+    LLM_RETRY_MAX_ATTEMPTS: int = 3 # Total attempts per call; 1 = no retries
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 20.0 # Backoff cap; a longer Retry-After fails the call instead
+    LLM_HEDGE_ENABLED: bool = False # Duplicate a slow request to the fallback deployment (costs a second call)
+    LLM_HEDGE_PERCENTILE: float = 95.0 # Hedge once the primary is slower than this latency percentile
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # Latency samples needed before hedging kicks in
+    LLM_LATENCY_WINDOW: int = 200 # Recent successful calls kept per deployment
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5 # Consecutive 5xx / timeouts that open the circuit
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0 # Open circuits fail fast (or fail over) this long before a probe
+    LLM_HEALTH_WINDOW_SECONDS: float = 300.0 # Latency / error-rate samples older than this are ignored
+
+    # Multi-deployment routing: AIModel rows sharing a route_group are interchangeable deployments;
+    # each call goes to one of them, weighted by route_weight, latency, error rate and queue depth
+    LLM_ROUTING_ENABLED: bool = True
+    LLM_ROUTING_MIN_SAMPLES: int = 5 # Recent calls needed before latency / error rate affect routing
+    LLM_ROUTING_GROUP_TTL_SECONDS: float = 30.0 # Group membership cache (edits via /models apply at once)
+
     # Azure Computer Vision
     AZURE_VISION_ENDPOINT: str | None = None
     AZURE_VISION_KEY: str | None = None
 
+    # OCR polling (adaptive backoff, seconds)
+    OCR_POLL_INITIAL_INTERVAL: float = 0.25
+    OCR_POLL_MAX_INTERVAL: float = 2.0
+    OCR_POLL_BACKOFF: float = 1.5
+    OCR_POLL_TIMEOUT: float = 30.0
+
+    # Buffered usage accounting (UsageLog bulk writer)
+    USAGE_WRITER_BATCH_SIZE: int = 200
+    USAGE_WRITER_FLUSH_MS: int = 500
+    USAGE_WRITER_MAX_QUEUE: int = 10000
+    USAGE_WRITER_RETRY_ATTEMPTS: int = 3 # Failed batches are retried, then written record by record before anything is dropped
+    USAGE_WRITER_RETRY_DELAY: float = 0.5 # Doubles per attempt
+
+    # Agent planner: only the top-k most relevant tools (BM25 over skill.md) go into the prompt; 0 = all
+    AGENT_TOOL_SHORTLIST_K: int = 8
+    AGENT_TOOL_CATALOG_TTL_SECONDS: int = 300 # Safety net for skill/assistant edits made by other processes
+
+    # Agent conversation memory: summary + recent turns within a token budget
+    AGENT_HISTORY_TOKEN_BUDGET: int = 3000 # Default; Assistant.history_token_budget overrides
+    AGENT_HISTORY_MIN_MESSAGES: int = 4 # Always sent verbatim (truncated if huge)
+    AGENT_HISTORY_MESSAGE_MAX_TOKENS: int = 800
+    AGENT_SUMMARY_TRIGGER_TOKENS: int = 2000 # Unsummarized history size that triggers a refresh
+    AGENT_SUMMARY_MAX_TOKENS: int = 400
+
+    # Tool results sent to the synthesis call are projected down to this size (skill.md synthesis_max_chars overrides)
+    AGENT_SYNTHESIS_MAX_RESULT_CHARS: int = 8000
+
+    # Skill execution (agent / API): sync run.py execute() runs in a bounded thread pool,
+    # each skill is capped at SKILL_MAX_CONCURRENCY in-flight calls (skill.md max_concurrency overrides; 0 = unlimited)
+    SKILL_THREAD_POOL_SIZE: int = 8
+    SKILL_MAX_CONCURRENCY: int = 4
+    SKILL_QUEUE_TIMEOUT_SECONDS: float = 30.0 # Waiting longer for a slot returns SKILL_BUSY
+
+    # Process sandbox for CPU-heavy skills (skill.md `execution: process`; timeout_seconds / memory_limit_mb override)
+    SKILL_SANDBOX_WORKERS: int = 2 # 0 = run those skills in-process
+    SKILL_SANDBOX_TIMEOUT_SECONDS: float = 120.0
+    SKILL_SANDBOX_MEMORY_MB: int = 2048 # Address-space cap per call (Linux/macOS only)
+    SKILL_SANDBOX_MAX_TASKS_PER_WORKER: int = 100
+    SKILL_SANDBOX_PRELOAD: str = "pypdf,pdfplumber,pandas,openpyxl,docx" # Imported once per worker
+
+    # PDF text extraction (pdf skill, text-layer checks): pages are sharded across worker processes
+    PDF_EXTRACT_WORKERS: int = 4
+    PDF_PARALLEL_MIN_PAGES: int = 24 # Smaller selections are extracted serially (process start-up would dominate)
+    PDF_EXTRACT_CHUNK_PAGES: int = 16
+    PDF_TEXT_LAYER_ENABLED: bool = True # Born-digital PDFs skip OCR; only scanned pages go to Azure Read
+    PDF_TEXT_LAYER_MIN_CHARS: int = 20 # Pages with less extractable text count as scanned
+
+    # DAG workflows: max steps executing concurrently within one run
+    WORKFLOW_MAX_PARALLEL_STEPS: int = 4
+
+    # Background workflow runs (POST /workflows/{id}/run?background=true)
+    RUN_QUEUE_WORKERS: int = 2 # In-process workers; 0 = use a separate `python -m app.run_worker`
+    RUN_QUEUE_POLL_SECONDS: float = 2.0
+    RUN_QUEUE_STALE_MINUTES: int = 30 # RUNNING without a heartbeat for this long is requeued
+    RUN_QUEUE_MAX_ATTEMPTS: int = 3
+
+    # Uploads (/chat/message, /ocr/analyze): spooled to disk past UPLOAD_SPOOL_MEMORY_BYTES, streamed to Azure in chunks
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024 # Per request; 0 = unlimited
+    UPLOAD_SPOOL_MEMORY_BYTES: int = 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_SPOOL_DIR: str | None = None # None = system temp dir
+
+    # OCR result cache (content-addressed by SHA-256 of the file bytes)
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_PATH: str = ".cache/ocr_cache.sqlite3"
+    OCR_CACHE_MAX_MB: int = 256
+    OCR_CACHE_TTL_SECONDS: int | None = None # None = entries never expire
+
     model_config = SettingsConfigDict(case_sensitive=True, env_file=".env", extra="ignore")
 
 settings = Settings()
@@ -1,3 +1,5 @@
+import asyncio
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.core.config import settings
@@ -17,3 +19,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def run_in_session(db, fn, *args):
+    """
+    Runs blocking Session work (queries, commits) in a worker thread so it stays off the event loop.
+    Calls sharing a Session are serialized (a Session must not be used by two threads at once).
+    """
+    lock = db.info.setdefault("run_in_session_lock", threading.Lock())
+
+    def locked():
+        with lock:
+            return fn(*args)
+
+    return await asyncio.to_thread(locked)
@@ -0,0 +1,92 @@
+import threading
+from collections import defaultdict, deque
+
+class MetricsRegistry:
+    """
+    Minimal in-process metrics registry (counters, gauges, latency summaries).
+    Exposed via GET /api/v1/system/metrics. Values are per worker process.
+    """
+    WINDOW_SIZE = 1024 # Recent samples kept per summary for percentile estimates
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+        self._summaries: dict[str, dict] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> str:
+        # Prometheus-like key, e.g. llm_pool_wait_ms{endpoint="foo.openai.azure.com"}
+        if not labels:
+            return name
+        label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = {"count": 0, "sum": 0.0, "max": 0.0, "window": deque(maxlen=self.WINDOW_SIZE)}
+                self._summaries[key] = summary
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+            summary["window"].append(value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def get_gauge(self, name: str, **labels) -> float | None:
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def get_summary(self, name: str, **labels) -> dict | None:
+        with self._lock:
+            summary = self._summaries.get(self._key(name, labels))
+            return self._render_summary(summary) if summary else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {k: self._render_summary(v) for k, v in self._summaries.items()}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    @staticmethod
+    def _render_summary(summary: dict) -> dict:
+        window = sorted(summary["window"])
+
+        def pct(p: float) -> float:
+            if not window:
+                return 0.0
+            return window[min(len(window) - 1, int(p * len(window)))]
+
+        return {
+            "count": summary["count"],
+            "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0,
+            "max": summary["max"],
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99)
+        }
+
+metrics = MetricsRegistry()
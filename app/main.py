@@ -37,11 +37,68 @@ def on_startup():
         # 3. Load Skills from File System
         from app.services.skill_loader import load_skills
         load_skills(db)
+        # 4. Usage rollups: backfill raw log history older than the rollup (empty on first deploy)
+        from app.services.usage_accounting import ensure_rollup
+        ensure_rollup(db)
     except Exception as e:
         print(f"Init DB failed: {e}")
     finally:
         db.close()
 
+@app.on_event("startup")
+def start_run_workers():
+    # Drain queued workflow runs (POST /workflows/{id}/run?background=true)
+    from app.services.run_queue import run_workers
+    run_workers.start()
+
+@app.on_event("shutdown")
+async def stop_run_workers():
+    # Join off the event loop: in-flight runs may still need it for gateway calls
+    import asyncio
+    from app.services.run_queue import run_workers
+    await asyncio.to_thread(run_workers.stop)
+
+@app.on_event("startup")
+def start_skill_sandbox():
+    # Pre-warm worker processes for CPU-heavy skills (pdf, excel_handler, docx_writer)
+    from app.services.skill_sandbox import skill_sandbox
+    skill_sandbox.start()
+
+@app.on_event("shutdown")
+async def stop_skill_sandbox():
+    import asyncio
+    from app.services.skill_sandbox import skill_sandbox
+    await asyncio.to_thread(skill_sandbox.stop)
+
+@app.on_event("shutdown")
+async def stop_skill_executor():
+    # Let sync skills still running in the pool finish (they may call the gateway)
+    import asyncio
+    from app.services.skill_loader import shutdown_skill_executor
+    await asyncio.to_thread(shutdown_skill_executor)
+
+@app.on_event("startup")
+async def start_llm_gateway():
+    # Open the shared LLM connection pools on the app event loop
+    from app.services.gateway import LLMGateway
+    await LLMGateway.startup()
+
+@app.on_event("shutdown")
+async def stop_llm_gateway():
+    from app.services.gateway import LLMGateway
+    await LLMGateway.shutdown()
+
+@app.on_event("startup")
+def start_usage_writer():
+    # Usage accounting is flushed in bulk off the request path
+    from app.services.usage_accounting import usage_writer
+    usage_writer.start()
+
+@app.on_event("shutdown")
+def stop_usage_writer():
+    from app.services.usage_accounting import usage_writer
+    usage_writer.stop() # After the run workers, so their last usage records are flushed
+
 # CORS
 # In production, set CLIENT_ORIGIN to your frontend domain (e.g. https://mypage.vercel.app)
 origins = [
@@ -79,6 +79,113 @@ def migrate():
     except Exception as e:
         print(f"Skipping skill_id: {e}")
 
+    # 5. Covering index for the stats dashboard (user_id, timestamp)
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_usage_logs_user_id_timestamp "
+                    "ON usage_logs (user_id, timestamp) INCLUDE (total_tokens, estimated_cost)"
+                ))
+                print("Ensured index ix_usage_logs_user_id_timestamp")
+    except Exception as e:
+        print(f"Skipping ix_usage_logs_user_id_timestamp: {e}")
+
+    # 6. Background workflow runs (run_executions as a durable job queue)
+    for column, ddl in [
+        ("user_id", "INTEGER"),
+        ("task_package_id", "UUID"),
+        ("heartbeat_at", "TIMESTAMP"),
+        ("attempts", "INTEGER DEFAULT 0"),
+    ]:
+        try:
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text(f"ALTER TABLE run_executions ADD COLUMN {column} {ddl}"))
+                    print(f"Added column {column} to run_executions")
+        except Exception as e:
+            print(f"Skipping run_executions.{column}: {e}")
+
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_run_executions_status_started_at "
+                    "ON run_executions (status, started_at)"
+                ))
+                print("Ensured index ix_run_executions_status_started_at")
+    except Exception as e:
+        print(f"Skipping ix_run_executions_status_started_at: {e}")
+
+    # 7. Conversation compaction (rolling summaries, per-assistant history budget)
+    for table, column, ddl in [
+        ("chat_sessions", "summary", "TEXT"),
+        ("chat_sessions", "summary_until_id", "INTEGER"),
+        ("chat_sessions", "summary_updated_at", "TIMESTAMP"),
+        ("assistants", "history_token_budget", "INTEGER"),
+    ]:
+        try:
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                    print(f"Added column {column} to {table}")
+        except Exception as e:
+            print(f"Skipping {table}.{column}: {e}")
+
+    # 8. Per-deployment LLM rate limits
+    for column in ["rpm_limit", "tpm_limit", "max_inflight"]:
+        try:
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text(f"ALTER TABLE ai_models ADD COLUMN {column} INTEGER"))
+                    print(f"Added column {column} to ai_models")
+        except Exception as e:
+            print(f"Skipping ai_models.{column}: {e}")
+
+    # 9. Fallback deployment (failover / hedged LLM requests)
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text(
+                    "ALTER TABLE ai_models ADD COLUMN fallback_model_id UUID "
+                    "REFERENCES ai_models(id) ON DELETE SET NULL"
+                ))
+                print("Added column fallback_model_id to ai_models")
+    except Exception as e:
+        print(f"Skipping ai_models.fallback_model_id: {e}")
+
+    # 10. Multi-deployment routing
+    for column, ddl in [
+        ("route_group", "VARCHAR"),
+        ("route_weight", "INTEGER"),
+        ("pinned_tenants", "JSON"),
+    ]:
+        try:
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text(f"ALTER TABLE ai_models ADD COLUMN {column} {ddl}"))
+                    print(f"Added column {column} to ai_models")
+        except Exception as e:
+            print(f"Skipping ai_models.{column}: {e}")
+
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                connection.execute(text("CREATE INDEX IF NOT EXISTS ix_ai_models_route_group ON ai_models (route_group)"))
+                print("Ensured index ix_ai_models_route_group")
+    except Exception as e:
+        print(f"Skipping ix_ai_models_route_group: {e}")
+
+    # 11. Per-deployment Azure resource (multi-region route groups)
+    for column in ["endpoint", "api_key_env"]:
+        try:
+            with engine.connect() as connection:
+                with connection.begin():
+                    connection.execute(text(f"ALTER TABLE ai_models ADD COLUMN {column} VARCHAR"))
+                    print(f"Added column {column} to ai_models")
+        except Exception as e:
+            print(f"Skipping ai_models.{column}: {e}")
+
     with engine.connect() as conn:
         # Check if ai_models table exists
         result = conn.execute(text("SELECT to_regclass('public.ai_models')"))
@@ -20,6 +20,7 @@ class Assistant(Base):
     description = Column(String, nullable=True)
     instruction = Column(Text, nullable=True) # System Prompt Override
     avatar = Column(String, nullable=True) # Icon/Image
+    history_token_budget = Column(Integer, nullable=True) # Prompt tokens for summary + history (default: settings)
     
     # Relationships
     skills = relationship("Skill", secondary=assistant_skills, backref="assistants")
@@ -13,6 +13,11 @@ class ChatSession(Base):
     title = Column(String, nullable=True)
     tenant_id = Column(String, index=True, default="default")
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Rolling summary of older turns (services/conversation_memory.py)
+    summary = Column(Text, nullable=True)
+    summary_until_id = Column(Integer, nullable=True) # Last ChatMessage.id folded into summary
+    summary_updated_at = Column(DateTime, nullable=True)
     
     # Relationship
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
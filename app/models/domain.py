@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from enum import Enum
-from sqlalchemy import String, Boolean, ForeignKey, JSON, DateTime, Enum as SQLEnum
+from sqlalchemy import String, Boolean, Integer, ForeignKey, JSON, DateTime, Index, Enum as SQLEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 from app.core.database import Base
@@ -50,6 +50,10 @@ class Workflow(Base):
 
 class RunExecution(Base):
     __tablename__ = "run_executions"
+    __table_args__ = (
+        # Queue scan: oldest PENDING run first (services/run_queue.py)
+        Index("ix_run_executions_status_started_at", "status", "started_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     workflow_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("workflows.id"))
@@ -57,9 +61,15 @@ class RunExecution(Base):
     input_payload: Mapped[dict] = mapped_column(JSON)
     output_payload: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     log: Mapped[list[dict]] = mapped_column(JSON, default=[]) # List of execution logs per step
-    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow) # Naive UTC, like finished_at / heartbeat_at
     finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
+    # Background execution (submit-and-poll)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    task_package_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True) # Last progress write by the executing worker
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+
     workflow = relationship("Workflow", back_populates="runs")
 
 class AIModel(Base):
@@ -71,3 +81,16 @@ class AIModel(Base):
     api_version: Mapped[str] = mapped_column(String) # e.g., "2023-05-15"
     description: Mapped[str | None] = mapped_column(String, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=False) # Can be used to highlight default model
+    # Azure resource of this deployment (NULL = AZURE_OPENAI_ENDPOINT): lets a route group span regions
+    endpoint: Mapped[str | None] = mapped_column(String, nullable=True)
+    api_key_env: Mapped[str | None] = mapped_column(String, nullable=True) # Env var holding that resource's key (NULL = AZURE_OPENAI_API_KEY)
+    # Gateway rate limits for this deployment (NULL = LLM_DEFAULT_* settings, 0 = unlimited)
+    rpm_limit: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    tpm_limit: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    max_inflight: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Deployment used for failover (open circuit, retries) and hedged requests
+    fallback_model_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("ai_models.id", ondelete="SET NULL"), nullable=True)
+    # Routing: rows with the same route_group are interchangeable deployments (e.g. regional copies)
+    route_group: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+    route_weight: Mapped[int | None] = mapped_column(Integer, nullable=True) # NULL = 1, 0 = standby only
+    pinned_tenants: Mapped[list | None] = mapped_column(JSON, nullable=True) # Serves only these tenants
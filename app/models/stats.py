@@ -1,10 +1,17 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from datetime import datetime, date
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.database import Base
 
 class UsageLog(Base):
     __tablename__ = "usage_logs"
+    __table_args__ = (
+        # Covering index for per-user time-range aggregation (stats dashboard)
+        Index(
+            "ix_usage_logs_user_id_timestamp", "user_id", "timestamp",
+            postgresql_include=["total_tokens", "estimated_cost"]
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
@@ -24,3 +31,31 @@ class UsageLog(Base):
     estimated_cost: Mapped[float] = mapped_column(Float, default=0.0)
     
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class UsageDailyRollup(Base):
+    """
+    Pre-aggregated usage per tenant / user / app / model / day.
+    Maintained incrementally by usage_accounting (record_usage / UsageWriter batches); rebuild with app/backfill_usage_rollup.py.
+    """
+    __tablename__ = "usage_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "user_id", "app_name", "model_name", "day", name="uq_usage_daily_rollup_key"),
+        Index("ix_usage_daily_rollup_tenant_day", "tenant_id", "day"),
+        Index("ix_usage_daily_rollup_user_day", "user_id", "day"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # Key
+    tenant_id: Mapped[str] = mapped_column(String, default="default")
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    app_name: Mapped[str] = mapped_column(String)
+    model_name: Mapped[str] = mapped_column(String)
+    day: Mapped[date] = mapped_column(Date)
+
+    # Aggregates
+    request_count: Mapped[int] = mapped_column(Integer, default=0)
+    tokens_input: Mapped[int] = mapped_column(Integer, default=0)
+    tokens_output: Mapped[int] = mapped_column(Integer, default=0)
+    total_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    estimated_cost: Mapped[float] = mapped_column(Float, default=0.0)
@@ -1,6 +1,8 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.services.agent_service import AgentService
 from pydantic import BaseModel
 
@@ -31,3 +33,35 @@ async def run_agent(
         assistant_id=req.assistant_id
     )
     return result
+
+@router.post("/run/stream")
+async def run_agent_stream(
+    req: AgentRunRequest,
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Streaming variant of /agent/run over Server-Sent Events.
+    Emits: session, thought, tool_started, tool_finished, token, done, error.
+    """
+    user_id = current_user.id
+
+    async def event_source():
+        # The stream outlives the request-scoped session, so it owns its own.
+        db = SessionLocal()
+        try:
+            service = AgentService(db)
+            async for event in service.run_stream(
+                req.query,
+                user_id=user_id,
+                session_id=req.session_id,
+                assistant_id=req.assistant_id
+            ):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False, default=str)}\n\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.services.azure_integration import call_azure_openai, call_azure_ocr
+from app.services.azure_integration import call_azure_openai, extract_document_text
 from app.api import deps
 from app.models.user import User
 from app.models.stats import UsageLog
+from app.services.usage_accounting import record_usage
+from app.services.uploads import spool_upload, UploadTooLarge
 import json
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -35,12 +37,18 @@ async def chat_message(
     """
     
     context_text = message
+    text_source = None
     
-    # 1. Handle File Upload (OCR)
+    # 1. Handle File Upload (text layer for digital PDFs, OCR otherwise)
     if file:
         try:
-            content = await file.read()
-            ocr_result = await call_azure_ocr(content)
+            upload = await spool_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        try:
+            with upload:
+                ocr_result = await extract_document_text(upload)
+            text_source = ocr_result["text_source"]
             
             # Append OCR context to the user message
             # We format it clearly so the LLM knows what is user text and what is document text
@@ -83,13 +91,13 @@ async def chat_message(
             total_tokens=total_tokens,
             estimated_cost=estimated_cost
         )
-        db.add(log_entry)
-        db.commit()
+        record_usage(db, log_entry)
         
         return {
             "role": "assistant",
             "content": reply,
             "ocr_processed": bool(file),
+            "document_text_source": text_source, # "text_layer" | "ocr" | "mixed" | None
             "usage_info": {
                 "tokens": total_tokens,
                 "cost": estimated_cost
@@ -2,7 +2,9 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.config import settings
 from app.models.domain import AIModel
+from app.services.llm_router import llm_router
 from pydantic import BaseModel, ConfigDict
 
 router = APIRouter(prefix="/models", tags=["models"])
@@ -14,6 +16,15 @@ class AIModelBase(BaseModel):
     api_version: str
     description: str | None = None
     is_active: bool = False
+    endpoint: str | None = None # Azure resource of this deployment (NULL = AZURE_OPENAI_ENDPOINT)
+    api_key_env: str | None = None # Name of the env var holding its key, never the key itself
+    rpm_limit: int | None = None # NULL = LLM_DEFAULT_RPM_LIMIT, 0 = unlimited
+    tpm_limit: int | None = None
+    max_inflight: int | None = None
+    fallback_model_id: UUID | None = None # Failover / hedging target
+    route_group: str | None = None # Rows sharing a group are load-balanced deployments
+    route_weight: int | None = None # NULL = 1, 0 = standby
+    pinned_tenants: list[str] | None = None
 
 class AIModelCreate(AIModelBase):
     pass
@@ -24,6 +35,15 @@ class AIModelUpdate(BaseModel):
     api_version: str | None = None
     description: str | None = None
     is_active: bool | None = None
+    endpoint: str | None = None
+    api_key_env: str | None = None
+    rpm_limit: int | None = None
+    tpm_limit: int | None = None
+    max_inflight: int | None = None
+    fallback_model_id: UUID | None = None
+    route_group: str | None = None
+    route_weight: int | None = None
+    pinned_tenants: list[str] | None = None
 
 class AIModelOut(AIModelBase):
     id: UUID
@@ -34,12 +54,18 @@ class AIModelOut(AIModelBase):
 def list_models(db: Session = Depends(get_db)):
     return db.query(AIModel).order_by(AIModel.name).all()
 
+@router.get("/routing")
+def routing_status():
+    """Per route group: each deployment's weight, current routing score, latency, error rate and circuit state."""
+    return llm_router.snapshot((settings.AZURE_OPENAI_ENDPOINT or "").rstrip('/'))
+
 @router.post("/", response_model=AIModelOut)
 def create_model(model: AIModelCreate, db: Session = Depends(get_db)):
     db_obj = AIModel(**model.model_dump())
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
+    llm_router.invalidate()
     return db_obj
 
 @router.put("/{model_id}", response_model=AIModelOut)
@@ -49,12 +75,15 @@ def update_model(model_id: UUID, model: AIModelUpdate, db: Session = Depends(get
         raise HTTPException(status_code=404, detail="Model not found")
     
     update_data = model.model_dump(exclude_unset=True)
+    if update_data.get("fallback_model_id") == model_id:
+        raise HTTPException(status_code=400, detail="A model cannot be its own fallback")
     for key, value in update_data.items():
         setattr(obj, key, value)
     
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    llm_router.invalidate()
     return obj
 
 @router.delete("/{model_id}")
@@ -65,4 +94,5 @@ def delete_model(model_id: UUID, db: Session = Depends(get_db)):
     
     db.delete(obj)
     db.commit()
+    llm_router.invalidate()
     return {"ok": True}
@@ -1,8 +1,8 @@
-import time
-import httpx
 from fastapi import APIRouter, File, UploadFile, HTTPException, Form
 from typing import Optional
-from app.core.config import settings
+from app.services.azure_integration import extract_document_text, OCRError
+from app.services.ocr_cache import get_ocr_cache
+from app.services.uploads import spool_upload, UploadTooLarge
 
 router = APIRouter(prefix="/ocr", tags=["ocr"])
 
@@ -12,101 +12,38 @@ async def analyze_image(
 ):
     """
     Analyzes an image or PDF using Azure Computer Vision (Read API).
+    Born-digital PDFs are answered from their text layer (text_source="text_layer");
+    only scanned pages are sent to Azure.
     Handles:
     1. Upload to Azure (POST)
-    2. Polling for result (GET)
+    2. Polling for result (GET, non-blocking with adaptive backoff)
     3. Returning structured data
     """
-    
-    # 1. Get Config
-    endpoint = settings.AZURE_VISION_ENDPOINT
-    api_key = settings.AZURE_VISION_KEY
-    
-    if not endpoint or not api_key:
-        raise HTTPException(status_code=500, detail="Azure Vision credentials not configured in .env")
 
-    # Clean endpoint
-    endpoint = endpoint.rstrip("/")
-    if "cognitiveservices.azure.com" not in endpoint:
-        # User might provide just the name, but usually full URL. 
-        # Assume full URL for now based on user input.
-        pass
-
-    # URL for Read API v3.2
-    # https://{endpoint}/vision/v3.2/read/analyze
-    analyze_url = f"{endpoint}/vision/v3.2/read/analyze"
-
-    headers = {
-        "Ocp-Apim-Subscription-Key": api_key,
-        "Content-Type": "application/octet-stream"
-    }
-
-    # 2. Read file content
+    # 1. Spool file content (chunked, hashed on the fly, size-limited)
     try:
-        file_content = await file.read()
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read file: {e}")
 
-    # 3. Call Azure (Submit Operation)
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(analyze_url, content=file_content, headers=headers)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to contact Azure: {e}")
-
-        if response.status_code != 202:
-            raise HTTPException(status_code=response.status_code, detail=f"Azure Vision Error: {response.text}")
-
-        # 4. Get Operation-Location
-        operation_url = response.headers.get("Operation-Location")
-        if not operation_url:
-            raise HTTPException(status_code=500, detail="Azure did not return Operation-Location")
-
-        # 5. Poll for Result
-        max_retries = 30
-        poll_interval = 1
-        
-        for _ in range(max_retries):
-            # Wait before polling
-            time.sleep(poll_interval)
-            
-            poll_res = await client.get(operation_url, headers={"Ocp-Apim-Subscription-Key": api_key})
-            
-            if poll_res.status_code != 200:
-                raise HTTPException(status_code=500, detail=f"Polling failed: {poll_res.text}")
-            
-            analysis = poll_res.json()
-            status = analysis.get("status")
-            
-            if status == "succeeded":
-                # Success!
-                return format_ocr_result(analysis)
-            
-            if status == "failed":
-                raise HTTPException(status_code=500, detail="Azure Analysis Failed")
-            
-            # If "running" or "notStarted", continue loop
-        
-        raise HTTPException(status_code=504, detail="Analysis timed out")
-
-def format_ocr_result(analysis: dict):
+    # 2. Text layer check, then Submit + Poll for what still needs OCR (shared implementation with Chat)
+    try:
+        with upload:
+            return await extract_document_text(upload)
+    except OCRError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValueError as e:
+        # e.g. Azure Vision credentials not configured in .env
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache")
+def get_cache_stats():
     """
-    Format the complex Azure JSON into a simpler summary + raw data
+    OCR result cache size and hit/miss counters.
     """
-    read_results = analysis.get("analyzeResult", {}).get("readResults", [])
-    
-    full_text = []
-    lines = []
-    
-    for page in read_results:
-        for line in page.get("lines", []):
-            text = line.get("text", "")
-            full_text.append(text)
-            lines.append(text)
-            
-    return {
-        "status": "success",
-        "full_text": "\n".join(full_text),
-        "lines": lines,
-        "raw_data": analysis  # Keep raw data for advanced use cases
-    }
+    cache = get_ocr_cache()
+    if not cache:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
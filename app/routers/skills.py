@@ -3,7 +3,7 @@ import os
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.skill import Skill
-from app.services.skill_loader import load_skills, execute_skill
+from app.services.skill_loader import load_skills, execute_skill_async
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/skills", tags=["skills"])
@@ -24,9 +24,9 @@ def refresh_skills(background_tasks: BackgroundTasks, db: Session = Depends(get_
     return {"status": "refreshing", "message": "Skills scan complete"}
 
 @router.post("/{skill_name}/run")
-def run_skill_endpoint(skill_name: str, req: SkillRunRequest, db: Session = Depends(get_db)):
+async def run_skill_endpoint(skill_name: str, req: SkillRunRequest, db: Session = Depends(get_db)):
     try:
-        result = execute_skill(skill_name, req.input, db)
+        result = await execute_skill_async(skill_name, req.input, db)
         return {"status": "success", "result": result}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
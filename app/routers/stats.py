@@ -1,14 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 from app.core.database import get_db
 from app.api import deps
 from app.models.user import User
-from app.models.stats import UsageLog
-from datetime import datetime, timedelta
+from app.models.stats import UsageLog, UsageDailyRollup
+from app.models.domain import AIModel
+from datetime import date, datetime, timedelta
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
+def to_date(value) -> date:
+    # Normalizes DB day values (datetime / 'YYYY-MM-DD' / date) to date
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
 @router.get("/dashboard")
 def get_dashboard_stats(
     db: Session = Depends(get_db),
@@ -16,23 +25,33 @@ def get_dashboard_stats(
 ):
     """
     Returns aggregated stats for the User Dashboard.
+    Totals and the daily series read usage_daily_rollup, so latency does not grow with
+    raw log volume; recent activity is an index-backed LIMIT 5 on usage_logs.
+    History older than the rollup is backfilled at startup (ensure_rollup).
     """
-    # 1. Total Tokens (User)
-    total_tokens = db.query(func.sum(UsageLog.total_tokens)).filter(UsageLog.user_id == current_user.id).scalar() or 0
-    
-    # 2. Total Cost
-    total_cost = db.query(func.sum(UsageLog.estimated_cost)).filter(UsageLog.user_id == current_user.id).scalar() or 0.0
+    rollup_filter = UsageDailyRollup.user_id == current_user.id
+
+    # 1. Totals (User) + Active Model Name in a single SELECT
+    totals = db.execute(
+        select(
+            select(func.coalesce(func.sum(UsageDailyRollup.total_tokens), 0)).where(rollup_filter).scalar_subquery(),
+            select(func.coalesce(func.sum(UsageDailyRollup.estimated_cost), 0.0)).where(rollup_filter).scalar_subquery(),
+            select(AIModel.name).where(AIModel.is_active == True).limit(1).scalar_subquery()
+        )
+    ).one()
+    total_tokens, total_cost, active_model_name = totals
+    active_model_name = active_model_name or "No Active Model"
 
-    # 3. Daily Usage (Last 7 Days)
+    # 2. Daily Usage (Last 7 Days) from the rollup
     today = datetime.utcnow().date()
     start_date = today - timedelta(days=6)
-    
+
     chart_data = {
         "labels": [],
         "datasets": [
             {
                 "label": "Tokens",
-                "backgroundColor": "#10b981", 
+                "backgroundColor": "#10b981",
                 "data": []
             },
             {
@@ -42,55 +61,122 @@ def get_dashboard_stats(
             }
         ]
     }
-    
+
     # Init dictionary for 7 days
     daily_stats = {}
     for i in range(7):
         day = start_date + timedelta(days=i)
         daily_stats[day] = {"tokens": 0, "cost": 0.0}
-        
-    # Query logs
-    logs = db.query(UsageLog).filter(
-        UsageLog.user_id == current_user.id,
-        UsageLog.timestamp >= start_date
+
+    daily_rows = db.execute(
+        select(
+            UsageDailyRollup.day,
+            func.sum(UsageDailyRollup.total_tokens),
+            func.sum(UsageDailyRollup.estimated_cost)
+        )
+        .where(rollup_filter, UsageDailyRollup.day >= start_date)
+        .group_by(UsageDailyRollup.day)
     ).all()
-    
-    for log in logs:
-        # Check if timestamp is datetime or date (SQLAlchemy usually returns datetime)
-        log_date = log.timestamp.date()
+
+    for day_value, tokens, cost in daily_rows:
+        log_date = to_date(day_value)
         if log_date in daily_stats:
-            daily_stats[log_date]["tokens"] += log.total_tokens
-            daily_stats[log_date]["cost"] += log.estimated_cost
-            
+            daily_stats[log_date]["tokens"] = int(tokens or 0)
+            daily_stats[log_date]["cost"] = float(cost or 0.0)
+
     for day in sorted(daily_stats.keys()):
         chart_data["labels"].append(day.strftime("%a")) # Mon, Tue...
         chart_data["datasets"][0]["data"].append(daily_stats[day]["tokens"])
         chart_data["datasets"][1]["data"].append(round(daily_stats[day]["cost"], 4))
 
-    # 4. Recent Activity (Last 5)
-    recent_logs = db.query(UsageLog).filter(
-        UsageLog.user_id == current_user.id
-    ).order_by(UsageLog.timestamp.desc()).limit(5).all()
-    
+    # 3. Recent Activity (Last 5), only the columns we render
+    recent_logs = db.execute(
+        select(
+            UsageLog.app_name,
+            UsageLog.total_tokens,
+            UsageLog.model_name,
+            UsageLog.timestamp,
+            UsageLog.estimated_cost
+        )
+        .where(UsageLog.user_id == current_user.id)
+        .order_by(UsageLog.timestamp.desc())
+        .limit(5)
+    ).all()
+
     recent_activity = []
     for log in recent_logs:
         recent_activity.append({
             "action": "AI Usage",
             "app": log.app_name,
             "details": f"{log.total_tokens} tokens ({log.model_name})",
-            "time": log.timestamp.isoformat(), 
+            "time": log.timestamp.isoformat(),
             "cost": f"${log.estimated_cost:.4f}"
         })
-        
-    # 5. Get Active Model Name
-    from app.models.domain import AIModel
-    active_model = db.query(AIModel).filter(AIModel.is_active == True).first()
-    active_model_name = active_model.name if active_model else "No Active Model"
 
     return {
         "total_tokens": total_tokens,
-        "current_cost": f"{total_cost:.4f}",
+        "current_cost": f"{float(total_cost):.4f}",
         "active_model": active_model_name,
         "chart_data": chart_data,
         "recent_activity": recent_activity
     }
+
+REPORT_GROUPS = {
+    "app": UsageDailyRollup.app_name,
+    "model": UsageDailyRollup.model_name,
+    "user": UsageDailyRollup.user_id,
+    "day": UsageDailyRollup.day,
+}
+
+@router.get("/usage-report")
+def get_usage_report(
+    start: date | None = None,
+    end: date | None = None,
+    group_by: str = "app",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Cost report over usage_daily_rollup (default: last 30 days, grouped by app).
+    group_by: app | model | user | day.
+    Superusers see their whole tenant; other users only their own usage.
+    """
+    group_col = REPORT_GROUPS.get(group_by)
+    if group_col is None:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(REPORT_GROUPS)}")
+
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+
+    query = select(
+        group_col.label("key"),
+        func.sum(UsageDailyRollup.request_count),
+        func.sum(UsageDailyRollup.total_tokens),
+        func.sum(UsageDailyRollup.estimated_cost)
+    ).where(
+        UsageDailyRollup.day >= start,
+        UsageDailyRollup.day <= end
+    )
+    if current_user.is_superuser:
+        query = query.where(UsageDailyRollup.tenant_id == (current_user.tenant_id or "default"))
+    else:
+        query = query.where(UsageDailyRollup.user_id == current_user.id)
+
+    rows = db.execute(query.group_by(group_col).order_by(func.sum(UsageDailyRollup.estimated_cost).desc())).all()
+
+    items = []
+    for key, requests, tokens, cost in rows:
+        items.append({
+            group_by: key.isoformat() if isinstance(key, date) else key,
+            "requests": int(requests or 0),
+            "tokens": int(tokens or 0),
+            "cost": round(float(cost or 0.0), 4)
+        })
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "items": items,
+        "total_cost": round(sum(i["cost"] for i in items), 4)
+    }
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 import os
+from app.core.metrics import metrics
 
 router = APIRouter(prefix="/system", tags=["system"])
 
@@ -58,3 +59,10 @@ def get_readme():
     return {
         "content": f"# Documentation Not Found\n\nCould not locate README.md.\n\nChecked paths:\n- {debug_info}\n\nCurrent CWD: {os.getcwd()}"
     }
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    In-process performance metrics (LLM pool wait, request latency, error counts).
+    """
+    return metrics.snapshot()
@@ -1,5 +1,5 @@
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Response
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.domain import Workflow, RunExecution
@@ -72,11 +72,30 @@ from app.models.user import User
 def run_workflow(
     workflow_id: UUID, 
     run_req: RunExecutionCreate, 
+    response: Response,
+    background: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
+    """
+    Runs a workflow.
+    background=false (default): executes inline and returns the finished run.
+    background=true: queues the run and returns 202 with status PENDING; poll GET /runs/{id}.
+    """
     engine = WorkflowEngine(db)
     try:
+        if background:
+            from app.services.run_queue import run_workers
+            result = engine.submit_run(
+                workflow_id,
+                run_req.input_payload,
+                user_id=current_user.id,
+                task_package_id=run_req.task_package_id
+            )
+            run_workers.notify()
+            response.status_code = 202
+            return result
+
         # Use run_req.input_payload instead of raw dict
         result = engine.run_workflow(
             workflow_id, 
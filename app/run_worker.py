@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import argparse
+
+# Ensure app is in path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import SessionLocal, engine, Base
+import app.models  # noqa: F401 - registers domain models
+from app.models.user import User
+from app.models.feedback import Feedback
+from app.models.stats import UsageLog
+from app.models.skill import Skill
+from app.services.run_queue import RunWorkerPool
+from app.services.usage_accounting import usage_writer
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain queued workflow runs (run_executions with status PENDING).")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads")
+    parser.add_argument("--poll", type=float, default=None, help="Queue poll interval in seconds")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    pool = RunWorkerPool(session_factory=SessionLocal, workers=args.workers, poll_interval=args.poll)
+    usage_writer.start()
+    pool.start()
+    print(f"Run worker started ({args.workers} threads). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping run worker...")
+    finally:
+        pool.stop()
+        usage_writer.stop()
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,8 @@ class WorkflowStepConfig(BaseModel):
     # New: Dynamic Logic
     next_step_id: int | None = None # Explicit next step (overrides default sequence)
     condition: dict | None = None # e.g. {"field": "status", "operator": "==", "value": "check"}
+    # DAG mode: steps listing dependencies run as soon as those finish (in parallel when independent)
+    depends_on: list[int] | None = None
 
 class WorkflowBase(BaseModel):
     name: str
@@ -2,14 +2,80 @@ from sqlalchemy.orm import Session
 from app.models.skill import Skill
 from app.models.chat import ChatSession, ChatMessage
 from app.models.assistant import Assistant # NEW
-from app.services.skill_loader import execute_skill
+from app.services.skill_loader import execute_skill_async
+from app.services.skill_index import skill_index
+from app.services.tool_catalog import tool_catalog_cache
+from app.services.conversation_memory import build_history, history_budget, maybe_schedule_summary
+from app.services.tool_response import render_direct, project_result
+from app.core.metrics import metrics
 from app.services.gateway import LLMGateway # Use Gateway
 from app.core.config import settings
 from app.models.stats import UsageLog
+from app.services.usage_accounting import record_usage
 from app.core.cost_calculator import calculate_ai_cost
 import json
 import uuid
 
+SYNTHESIS_PROMPT_TEMPLATE = """你是使用者的 AI 助理。
+你剛剛使用了工具 '{tool_name}' 來解決使用者的問題。
+請根據執行結果，用繁體中文回答使用者的問題。
+- 確保回答自然、流暢。
+- 如果結果包含程式碼，請使用 Markdown code block 呈現。
+- 如果結果包含警告或風險，請清楚提示。
+"""
+
+PLANNER_DEFAULT_PERSONA = """你是中央代理大腦 (Central Agent Brain)。
+你的職責是判斷使用者的需求，並決定由你自己回答，還是調用專門的工具。"""
+
+PLANNER_PROMPT_TEMPLATE = """{base_system_prompt}
+
+你擁有的專業工具箱：
+{tools_str}
+
+決策原則 (Decision Principles)：
+1. **必須使用工具的情況**：
+   - 任務有明確的輸入與結構化輸出需求 (例如：讀取特定 PDF、分析 Excel、審閱合約風險、數學計算)。
+   - 使用者明確要求執行特定動作 (例如：「列出所有技能」、「幫我生成報告」、「OCR 這張圖」)。
+   - 需要精確的領域知識處理 (Finance, Legal, Scientific)。
+   
+2. **不應使用工具的情況 (直接回答)**：
+   - 一般閒聊、問候 (例如：「你好」、「你是誰」)。
+   - 詢問抽象概念、架構設計或建議 (例如：「Agent 要怎麼設計比較好？」、「為什麼你會這樣回答？」)。
+   - 使用者尚未提供必要檔案或內容 (例如：「幫我審閱合約」，但沒給合約內容 -> 請直接引導使用者上傳，回傳 "tool": "none")。
+
+3. **記憶回溯 (Memory Recall)**：
+   - 若使用者詢問「我是誰」、「我們剛才在聊什麼」，請直接根據對話歷史回答，回傳 "tool": "none" 並在 args 中填寫回答。
+
+思考流程：
+- 先在心中分析使用者的意圖 (Intent Analysis)。
+- 檢查是否有匹配的工具名稱與描述。
+- 判斷是否具備足夠的參數來呼叫工具。
+
+輸出規則：
+1. 僅回傳一個 JSON 物件。不要使用 markdown。
+2. JSON 格式：
+   {{
+      "thought": "簡短描述你的判斷過程：使用者想做什麼？為什麼選擇(或不選擇)這個工具？",
+      "tool": "tool_name" 或 "none",
+      "args": {{ ... }} // 若 tool 為 "none"，請在 args 中放入 "explanation" 欄位來回答使用者。
+   }}
+3. 如果工具需要 'text' 或 'file_url' 但使用者輸入中已包含文字，請用 "__INPUT_TEXT__" 作為佔位符。
+4. 嚴禁在沒有實際文件內容的情況下呼叫 legal_contract_review 或 ocr_processor。
+"""
+
+def render_planner_prompt(base_system_prompt: str | None, tools_str: str) -> str:
+    # base_system_prompt: Assistant persona (instruction) overlay, else the central brain persona
+    return PLANNER_PROMPT_TEMPLATE.format(base_system_prompt=base_system_prompt or PLANNER_DEFAULT_PERSONA, tools_str=tools_str)
+
+class AgentContext:
+    """Per-turn state shared by run() and run_stream()."""
+    def __init__(self, trace_id: str, session_id: str, assistant: Assistant | None, history_payload: list[dict]):
+        self.trace_id = trace_id
+        self.session_id = session_id
+        self.assistant = assistant
+        self.history_payload = history_payload
+        self.catalog = None # ToolCatalog used for planning (set by _build_decision_messages)
+
 class AgentService:
     def __init__(self, db: Session):
         self.db = db
@@ -26,6 +92,181 @@ class AgentService:
         7. 回應
         8. 儲存對話
         """
+        ctx = self._prepare_context(user_query, user_id, session_id, assistant_id)
+        gateway = LLMGateway(self.db)
+
+        try:
+            llm_response = await gateway.chat(
+                messages=self._build_decision_messages(ctx, user_query),
+                temperature=0.0,
+                user_id=user_id # Tenant: response cache namespace, deployment pinning
+            )
+        except Exception as e:
+            return {
+                "response": "抱歉，我在連接 AI 模型時發生錯誤。",
+                "error": f"LLM Call Failed: {str(e)}"
+            }
+
+        # 解析決策
+        content = "{}"
+        try:
+            self._log_usage(ctx, user_id, llm_response)
+            content = self._extract_content(llm_response)
+            decision = self._parse_decision(content)
+        except Exception as e:
+            return {
+                "response": "抱歉，我在思考時感到困惑。",
+                "error": str(e),
+                "raw_decision": content
+            }
+
+        tool_name, tool_args = self._resolve_tool_call(decision, user_query)
+
+        final_reply = ""
+        result = {}
+
+        if not tool_name or tool_name == "none":
+            final_reply = self._direct_reply(tool_args)
+        else:
+            # 3. 執行
+            try:
+                result = await execute_skill_async(tool_name, tool_args, self.db, trace_id=ctx.trace_id)
+
+                # 4. 回應合成 (skills with response_mode: direct are formatted locally)
+                direct_reply = self._render_direct(ctx, tool_name, result)
+                if direct_reply is not None:
+                    final_reply = direct_reply
+                else:
+                    try:
+                        synthesis_response = await gateway.chat(
+                            messages=self._build_synthesis_messages(ctx, user_query, tool_name, result),
+                            temperature=0.7,
+                            user_id=user_id
+                        )
+
+                        final_reply = synthesis_response.get("choices", [])[0].get("message", {}).get("content", "")
+
+                        # Log synthesis usage...
+
+                    except Exception as e:
+                        final_reply = f"工具執行成功，但彙整回答時發生錯誤: {str(e)}\n\n原始結果:\n{json.dumps(result, ensure_ascii=False)}"
+
+            except Exception as e:
+                 final_reply = f"我嘗試使用 {tool_name} 但失敗了。錯誤資訊: {str(e)}"
+                 result = {"error": str(e)}
+
+        self._save_reply(ctx, final_reply, decision, tool_name)
+
+        return {
+            "response": final_reply,
+            "tool_used": tool_name if tool_name != "none" else None,
+            "tool_result": result,
+            "agent_thought": decision.get("thought"),
+            "session_id": ctx.session_id,
+            "trace_id": ctx.trace_id, # Return to UI
+            "assistant_id": ctx.assistant.id if ctx.assistant else None
+        }
+
+    async def run_stream(self, user_query: str, user_id: int, session_id: str = None, assistant_id: str = None):
+        """
+        Streaming variant of run(). Async generator yielding events as dicts {"event": ..., "data": ...}:
+        - session:       {"session_id", "trace_id", "assistant_id"}
+        - thought:       {"thought", "tool"} as soon as the decision is parsed
+        - tool_started:  {"tool", "args"}
+        - tool_finished: {"tool", "result"}
+        - token:         {"text"} synthesis (or direct answer) chunks
+        - done:          final payload, same shape as run()
+        - error:         {"message", "error"}
+        The assistant ChatMessage is persisted once the stream finishes (or is cut off).
+        """
+        ctx = self._prepare_context(user_query, user_id, session_id, assistant_id)
+        gateway = LLMGateway(self.db)
+
+        yield {"event": "session", "data": {
+            "session_id": ctx.session_id,
+            "trace_id": ctx.trace_id,
+            "assistant_id": ctx.assistant.id if ctx.assistant else None
+        }}
+
+        try:
+            llm_response = await gateway.chat(
+                messages=self._build_decision_messages(ctx, user_query),
+                temperature=0.0,
+                user_id=user_id # Tenant: response cache namespace, deployment pinning
+            )
+        except Exception as e:
+            yield {"event": "error", "data": {"message": "抱歉，我在連接 AI 模型時發生錯誤。", "error": f"LLM Call Failed: {str(e)}"}}
+            return
+
+        content = "{}"
+        try:
+            self._log_usage(ctx, user_id, llm_response)
+            content = self._extract_content(llm_response)
+            decision = self._parse_decision(content)
+        except Exception as e:
+            yield {"event": "error", "data": {"message": "抱歉，我在思考時感到困惑。", "error": str(e), "raw_decision": content}}
+            return
+
+        tool_name, tool_args = self._resolve_tool_call(decision, user_query)
+        yield {"event": "thought", "data": {"thought": decision.get("thought"), "tool": tool_name}}
+
+        reply_parts = []
+        result = {}
+        try:
+            if not tool_name or tool_name == "none":
+                explanation = self._direct_reply(tool_args)
+                reply_parts.append(explanation)
+                yield {"event": "token", "data": {"text": explanation}}
+            else:
+                yield {"event": "tool_started", "data": {"tool": tool_name, "args": tool_args}}
+                try:
+                    result = await execute_skill_async(tool_name, tool_args, self.db, trace_id=ctx.trace_id)
+                except Exception as e:
+                    result = {"error": str(e)}
+                    message = f"我嘗試使用 {tool_name} 但失敗了。錯誤資訊: {str(e)}"
+                    reply_parts.append(message)
+                    yield {"event": "tool_finished", "data": {"tool": tool_name, "result": result}}
+                    yield {"event": "token", "data": {"text": message}}
+                else:
+                    yield {"event": "tool_finished", "data": {"tool": tool_name, "result": result}}
+                    direct_reply = self._render_direct(ctx, tool_name, result)
+                    if direct_reply is not None:
+                        reply_parts.append(direct_reply)
+                        yield {"event": "token", "data": {"text": direct_reply}}
+                    else:
+                        try:
+                            async for delta in gateway.chat_stream(
+                                messages=self._build_synthesis_messages(ctx, user_query, tool_name, result),
+                                temperature=0.7,
+                                user_id=user_id
+                            ):
+                                reply_parts.append(delta)
+                                yield {"event": "token", "data": {"text": delta}}
+                        except Exception as e:
+                            message = f"工具執行成功，但彙整回答時發生錯誤: {str(e)}\n\n原始結果:\n{json.dumps(result, ensure_ascii=False)}"
+                            reply_parts.append(message)
+                            yield {"event": "token", "data": {"text": message}}
+
+            final_reply = "".join(reply_parts)
+            yield {"event": "done", "data": {
+                "response": final_reply,
+                "tool_used": tool_name if tool_name != "none" else None,
+                "tool_result": result,
+                "agent_thought": decision.get("thought"),
+                "session_id": ctx.session_id,
+                "trace_id": ctx.trace_id,
+                "assistant_id": ctx.assistant.id if ctx.assistant else None
+            }}
+        finally:
+            # Persist whatever was produced, even if the client disconnected mid-stream
+            self._save_reply(ctx, "".join(reply_parts), decision, tool_name)
+
+    # ------------------------------------------------------------------
+    # Turn Phases
+    # ------------------------------------------------------------------
+
+    def _prepare_context(self, user_query: str, user_id: int, session_id: str | None, assistant_id: str | None) -> AgentContext:
+        """Resolves session + assistant, saves the user message and loads history."""
         # 0. Trace & Session Logic
         trace_id = str(uuid.uuid4())
         assistant = None
@@ -64,146 +305,81 @@ class AgentService:
         self.db.add(user_msg)
         self.db.commit()
 
-        # Load Context (Clean objects for message construction)
-        history_msgs = self.db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at.desc()).limit(10).all()
-        history_msgs.reverse()
-
-        # Build History Messages List for API
-        history_payload = []
-        for msg in history_msgs:
-            role = "assistant" if msg.role == "assistant" else "user"
-            history_payload.append({"role": role, "content": msg.content})
-
-            
-        
-        # 1. 取得工具 (Skill Routing)
-        if assistant and assistant.skills:
-            # If assistant has specific skills assigned, use ONLY those
-            skills = assistant.skills
-        else:
-            # Fallback: All active skills (General Bot)
-            skills = self.db.query(Skill).filter(Skill.is_active == True).all()
-            
-        tools_desc = []
-        for s in skills:
-            # 格式： - name: description (Args: {schema})
-            schema_str = json.dumps(s.input_schema) if s.input_schema else "{}"
-            tools_desc.append(f"- {s.name}: {s.description} (Args: {schema_str})")
-        
-        tools_str = "\n".join(tools_desc)
-        
-        # 2. 規劃提示詞 (Prompt Engineering)
-        base_system_prompt = f"""你是中央代理大腦 (Central Agent Brain)。
-你的職責是判斷使用者的需求，並決定由你自己回答，還是調用專門的工具。"""
-
-        # Overlay Assistant Persona
-        if assistant and assistant.instruction:
-             base_system_prompt = assistant.instruction
+        # Load Context: rolling summary + recent turns within the assistant's token budget
+        chat_session = self.db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        history_payload, unsummarized_tokens = build_history(self.db, chat_session, history_budget(assistant))
+        maybe_schedule_summary(chat_session, unsummarized_tokens)
 
-        system_prompt = f"""{base_system_prompt}
-
-你擁有的專業工具箱：
-{tools_str}
-
-決策原則 (Decision Principles)：
-1. **必須使用工具的情況**：
-   - 任務有明確的輸入與結構化輸出需求 (例如：讀取特定 PDF、分析 Excel、審閱合約風險、數學計算)。
-   - 使用者明確要求執行特定動作 (例如：「列出所有技能」、「幫我生成報告」、「OCR 這張圖」)。
-   - 需要精確的領域知識處理 (Finance, Legal, Scientific)。
-   
-2. **不應使用工具的情況 (直接回答)**：
-   - 一般閒聊、問候 (例如：「你好」、「你是誰」)。
-   - 詢問抽象概念、架構設計或建議 (例如：「Agent 要怎麼設計比較好？」、「為什麼你會這樣回答？」)。
-   - 使用者尚未提供必要檔案或內容 (例如：「幫我審閱合約」，但沒給合約內容 -> 請直接引導使用者上傳，回傳 "tool": "none")。
+        return AgentContext(trace_id, session_id, assistant, history_payload)
 
-3. **記憶回溯 (Memory Recall)**：
-   - 若使用者詢問「我是誰」、「我們剛才在聊什麼」，請直接根據對話歷史回答，回傳 "tool": "none" 並在 args 中填寫回答。
+    def _build_decision_messages(self, ctx: AgentContext, user_query: str) -> list[dict]:
+        # 1. 取得工具目錄 (cached per assistant; rebuilt when skills / assistants change)
+        catalog = tool_catalog_cache.get(self.db, ctx.assistant, render_planner_prompt)
+        ctx.catalog = catalog
+        tool_names = catalog.tool_names
 
-思考流程：
-- 先在心中分析使用者的意圖 (Intent Analysis)。
-- 檢查是否有匹配的工具名稱與描述。
-- 判斷是否具備足夠的參數來呼叫工具。
+        # 1.1 Shortlist the most relevant tools (BM25) so the prompt stays bounded
+        k = settings.AGENT_TOOL_SHORTLIST_K
+        if k and len(tool_names) > k:
+            recent_user_turns = [m["content"] for m in ctx.history_payload if m["role"] == "user"][-1:]
+            query = " ".join([user_query, *(t[:500] for t in recent_user_turns)])
+            tool_names = skill_index.shortlist_names(query, tool_names, k)
 
-輸出規則：
-1. 僅回傳一個 JSON 物件。不要使用 markdown。
-2. JSON 格式：
-   {{
-      "thought": "簡短描述你的判斷過程：使用者想做什麼？為什麼選擇(或不選擇)這個工具？",
-      "tool": "tool_name" 或 "none",
-      "args": {{ ... }} // 若 tool 為 "none"，請在 args 中放入 "explanation" 欄位來回答使用者。
-   }}
-3. 如果工具需要 'text' 或 'file_url' 但使用者輸入中已包含文字，請用 "__INPUT_TEXT__" 作為佔位符。
-4. 嚴禁在沒有實際文件內容的情況下呼叫 legal_contract_review 或 ocr_processor。
-"""
+        # 2. 規劃提示詞 (Prompt Engineering): rendered once per tool set
+        system_prompt = catalog.system_prompt(tool_names)
 
         # Construct Decision Messages
         decision_messages = [{"role": "system", "content": system_prompt}]
-        decision_messages.extend(history_payload)
+        decision_messages.extend(ctx.history_payload)
         decision_messages.append({"role": "user", "content": user_query})
+        return decision_messages
 
-        try:
-            gateway = LLMGateway(self.db)
-            llm_response = await gateway.chat(
-                messages=decision_messages,
-                temperature=0.0
-            )
-        except Exception as e:
-            return {
-                "response": "抱歉，我在連接 AI 模型時發生錯誤。",
-                "error": f"LLM Call Failed: {str(e)}"
-            }
+    def _log_usage(self, ctx: AgentContext, user_id: int, llm_response: dict):
+        # 記錄 Token 使用量與成本
+        usage = llm_response.get("usage", {})
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        total_tokens = usage.get("total_tokens", 0)
+        model_name = llm_response.get("model", "gpt-4")
         
-        # 解析決策
-        try:
-            # 記錄 Token 使用量與成本
-            usage = llm_response.get("usage", {})
-            prompt_tokens = usage.get("prompt_tokens", 0)
-            completion_tokens = usage.get("completion_tokens", 0)
-            total_tokens = usage.get("total_tokens", 0)
-            model_name = llm_response.get("model", "gpt-4")
-            
-            estimated_cost = calculate_ai_cost(model_name, prompt_tokens, completion_tokens)
-            
-            # 寫入 UsageLog
-            if user_id:
-                try:
-                    log_entry = UsageLog(
-                        user_id=user_id,
-                        app_name=f"Agent-{assistant.name}" if assistant else "Agent-General",
-                        model_name=model_name,
-                        tokens_input=prompt_tokens,
-                        tokens_output=completion_tokens,
-                        total_tokens=total_tokens,
-                        estimated_cost=estimated_cost,
-                        trace_id=trace_id # Add Trace ID
-                    )
-                    self.db.add(log_entry)
-                    self.db.commit()
-                except Exception as log_err:
-                    print(f"Failed to log usage stats: {log_err}")
-                
-            choices = llm_response.get("choices", [])
-            if choices and len(choices) > 0:
-                content = choices[0].get("message", {}).get("content", "{}")
-            else:
-                 content = "{}"
-            
-            # 清理 JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-                
-            decision = json.loads(content)
-        except Exception as e:
-            return {
-                "response": "抱歉，我在思考時感到困惑。",
-                "error": str(e),
-                "raw_decision": content
-            }
+        estimated_cost = calculate_ai_cost(model_name, prompt_tokens, completion_tokens)
+        
+        # 寫入 UsageLog
+        if user_id:
+            try:
+                log_entry = UsageLog(
+                    user_id=user_id,
+                    app_name=f"Agent-{ctx.assistant.name}" if ctx.assistant else "Agent-General",
+                    model_name=model_name,
+                    tokens_input=prompt_tokens,
+                    tokens_output=completion_tokens,
+                    total_tokens=total_tokens,
+                    estimated_cost=estimated_cost,
+                    trace_id=ctx.trace_id # Add Trace ID
+                )
+                record_usage(self.db, log_entry)
+            except Exception as log_err:
+                print(f"Failed to log usage stats: {log_err}")
+
+    @staticmethod
+    def _extract_content(llm_response: dict) -> str:
+        choices = llm_response.get("choices", [])
+        if choices and len(choices) > 0:
+            return choices[0].get("message", {}).get("content", "{}")
+        return "{}"
+
+    @staticmethod
+    def _parse_decision(content: str) -> dict:
+        # 清理 JSON
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
             
+        return json.loads(content)
+
+    @staticmethod
+    def _resolve_tool_call(decision: dict, user_query: str) -> tuple[str | None, dict]:
         tool_name = decision.get("tool")
         tool_args = decision.get("args", {})
 
@@ -211,63 +387,43 @@ class AgentService:
         for key, value in tool_args.items():
             if value == "__INPUT_TEXT__":
                 tool_args[key] = user_query
-        
-        final_reply = ""
-        result = {}
-        
-        if not tool_name or tool_name == "none":
-            explanation = tool_args.get("explanation") or tool_args.get("message") or tool_args.get("msg")
-            if not explanation:
-                explanation = "我目前沒有專門的工具處理這個問題，但我可以嘗試提供一般性的協助。"
-            
-            final_reply = explanation
-        else:
-            # 3. 執行
-            try:
-                result = execute_skill(tool_name, tool_args, self.db, trace_id=trace_id)
-                
-                # 4. 回應合成
-                synthesis_prompt = f"""你是使用者的 AI 助理。
-你剛剛使用了工具 '{tool_name}' 來解決使用者的問題。
-請根據執行結果，用繁體中文回答使用者的問題。
-- 確保回答自然、流暢。
-- 如果結果包含程式碼，請使用 Markdown code block 呈現。
-- 如果結果包含警告或風險，請清楚提示。
-"""
-                # Construct Synthesis Messages with History
-                synthesis_messages = [{"role": "system", "content": synthesis_prompt}]
-                synthesis_messages.extend(history_payload)
-                synthesis_messages.append({"role": "user", "content": user_query})
-                synthesis_messages.append({"role": "system", "content": f"工具 '{tool_name}' 執行結果:\n{json.dumps(result, ensure_ascii=False, indent=2)}"})
+        return tool_name, tool_args
 
-                try:
-                    synthesis_response = await gateway.chat(
-                        messages=synthesis_messages,
-                        temperature=0.7 
-                    )
-                    
-                    final_reply = synthesis_response.get("choices", [])[0].get("message", {}).get("content", "")
-                    
-                    # Log synthesis usage...
-    
-                except Exception as e:
-                    final_reply = f"工具執行成功，但彙整回答時發生錯誤: {str(e)}\n\n原始結果:\n{json.dumps(result, ensure_ascii=False)}"
+    @staticmethod
+    def _direct_reply(tool_args: dict) -> str:
+        explanation = tool_args.get("explanation") or tool_args.get("message") or tool_args.get("msg")
+        if not explanation:
+            explanation = "我目前沒有專門的工具處理這個問題，但我可以嘗試提供一般性的協助。"
+        return explanation
 
-            except Exception as e:
-                 final_reply = f"我嘗試使用 {tool_name} 但失敗了。錯誤資訊: {str(e)}"
-                 result = {"error": str(e)}
+    @staticmethod
+    def _tool_spec(ctx: AgentContext, tool_name: str) -> dict:
+        # Response settings declared in the skill's skill.md (see services/tool_response.py)
+        if ctx.catalog is None:
+            return {}
+        return ctx.catalog.tool_specs.get(tool_name, {})
 
+    def _render_direct(self, ctx: AgentContext, tool_name: str, result) -> str | None:
+        spec = self._tool_spec(ctx, tool_name)
+        if spec.get("response_mode") != "direct":
+            return None
+        reply = render_direct(result, spec)
+        if reply is not None:
+            metrics.inc("agent_synthesis_skipped", tool=tool_name)
+        return reply
+
+    def _build_synthesis_messages(self, ctx: AgentContext, user_query: str, tool_name: str, result) -> list[dict]:
+        # Construct Synthesis Messages with History; the tool result is sent as a compact projection
+        projected = project_result(result, self._tool_spec(ctx, tool_name).get("synthesis_max_chars"))
+        result_text = projected if isinstance(projected, str) else json.dumps(projected, ensure_ascii=False, indent=2)
+        synthesis_messages = [{"role": "system", "content": SYNTHESIS_PROMPT_TEMPLATE.format(tool_name=tool_name)}]
+        synthesis_messages.extend(ctx.history_payload)
+        synthesis_messages.append({"role": "user", "content": user_query})
+        synthesis_messages.append({"role": "system", "content": f"工具 '{tool_name}' 執行結果:\n{result_text}"})
+        return synthesis_messages
+
+    def _save_reply(self, ctx: AgentContext, final_reply: str, decision: dict, tool_name: str | None):
         # Save Assistant Response
-        asst_msg = ChatMessage(session_id=session_id, role="assistant", content=final_reply, tool_calls=decision if tool_name != "none" else None, trace_id=trace_id)
+        asst_msg = ChatMessage(session_id=ctx.session_id, role="assistant", content=final_reply, tool_calls=decision if tool_name != "none" else None, trace_id=ctx.trace_id)
         self.db.add(asst_msg)
         self.db.commit()
-
-        return {
-            "response": final_reply,
-            "tool_used": tool_name if tool_name != "none" else None,
-            "tool_result": result,
-            "agent_thought": decision.get("thought"),
-            "session_id": session_id,
-            "trace_id": trace_id, # Return to UI
-            "assistant_id": assistant.id if assistant else None
-        }
@@ -1,10 +1,15 @@
 import os
 import json
-import httpx
 import time
+import asyncio
+import httpx
 from sqlalchemy.orm import Session
-from app.models.domain import AIModel
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.gateway import LLMGateway
+from app.services.ocr_cache import get_ocr_cache, OCRCache
+from app.services.pdf_text import TextLayer, is_pdf, read_text_layer, select_pages
+from app.services.uploads import SpooledUpload
 
 # -----------------------------------------------------------------------------
 # Azure OpenAI Integration
@@ -22,72 +27,133 @@ async def call_azure_openai(
     Calls Azure OpenAI Chat Completions API.
     Used by: Workflow Engine (Universal Azure LLM), Chat Router (Enterprise Chat).
     Supports either manual 'messages' list OR simple 'input_text' + 'system_prompt'.
+    Delegates to LLMGateway so every call reuses the shared connection pool.
     """
+    if not messages:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": input_text}
+        ]
 
-    # 1. Determine Model
-    ai_model = None
-    if model_id:
-        ai_model = db.query(AIModel).filter(AIModel.id == model_id).first()
-    
-    if not ai_model:
-        # Fallback to default active
-        ai_model = db.query(AIModel).filter(AIModel.is_active == True).first()
-    
-    if not ai_model:
-        raise ValueError("No active AIModel configuration found.")
-
-    # 2. Get Credentials
-    api_key = settings.AZURE_OPENAI_API_KEY or settings.AZURE_OPENAI_KEY
-    endpoint = settings.AZURE_OPENAI_ENDPOINT
-    
-    if not api_key or not endpoint:
-        raise ValueError("Missing Azure OpenAI Credentials (AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT) in settings.")
-
-    # 3. Construct URL
-    endpoint = endpoint.rstrip('/')
-    url = f"{endpoint}/openai/deployments/{ai_model.deployment_name}/chat/completions?api-version={ai_model.api_version}"
-
-    print(f"DEBUG: Calling Azure OpenAI Model: {ai_model.name}, Deployment: {ai_model.deployment_name}")
-    print(f"DEBUG: Full URL: {url}") # CAREFUL: Don't log API Key, but URL is okay-ish for local debug (contains deployment name)
-
-    # 4. Prepare Payload
-    if messages:
-        payload = {
-            "messages": messages,
-            "temperature": temperature
-        }
-    else:
-        payload = {
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": input_text}
-            ],
-            "temperature": temperature
-        }
-
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": api_key
-    }
-
-    # 5. Call API
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=headers, timeout=60.0)
-        
-        if response.status_code != 200:
-             raise ValueError(f"Azure OpenAI Error ({response.status_code}): {response.text}")
-        
-        return response.json()
+    gateway = LLMGateway(db)
+    return await gateway.chat(messages=messages, temperature=temperature, model_id=model_id)
 
 
 # -----------------------------------------------------------------------------
 # Azure Computer Vision (OCR) Integration
 # -----------------------------------------------------------------------------
 
-async def call_azure_ocr(file_content: bytes) -> dict:
+class OCRError(ValueError):
+    """OCR failure carrying the HTTP status the API layer should surface."""
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    # Azure sends Retry-After as delta-seconds; HTTP-date form is ignored
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+def _ocr_poll_delays():
+    """
+    Adaptive poll schedule: short first waits (small receipts finish in well under a second),
+    then exponential backoff up to OCR_POLL_MAX_INTERVAL.
+    """
+    delay = settings.OCR_POLL_INITIAL_INTERVAL
+    while True:
+        yield delay
+        delay = min(delay * settings.OCR_POLL_BACKOFF, settings.OCR_POLL_MAX_INTERVAL)
+
+def _content_hash(file_content: bytes | SpooledUpload) -> str:
+    if isinstance(file_content, SpooledUpload):
+        return file_content.sha256 # Computed while the upload was spooled
+    return OCRCache.digest(file_content)
+
+async def call_azure_ocr(file_content: bytes | SpooledUpload, content_hash: str | None = None) -> dict:
     """
     Calls Azure Computer Vision Read API (v3.2).
-    Used by: Workflow Engine (AIOCR), Chat Router (File Analysis).
+    Used by: Workflow Engine (AIOCR), Chat Router (File Analysis), OCR Router.
+    Results are cached by SHA-256 of the file bytes (pass content_hash if already known).
+    A SpooledUpload is streamed to Azure in chunks instead of being read into memory.
+    """
+    cache = get_ocr_cache()
+    if cache:
+        content_hash = content_hash or _content_hash(file_content)
+        cached = await asyncio.to_thread(cache.get, content_hash)
+        if cached is not None:
+            return cached
+
+    result = await _analyze_with_azure(file_content)
+
+    if cache:
+        await asyncio.to_thread(cache.put, content_hash, result)
+    return result
+
+async def extract_document_text(file_content: bytes | SpooledUpload, content_hash: str | None = None, layer: TextLayer | None = None) -> dict:
+    """
+    Text of an uploaded document in the call_azure_ocr() shape, plus:
+      text_source: "text_layer" (born-digital PDF, read locally), "ocr" or "mixed"
+      ocr_pages:   1-based pages that went through Azure Read (None for non-PDF files)
+    Only scanned pages of a PDF are sent to OCR. Pass layer when the caller already read
+    the PDF's text layer, so the pages are not extracted twice.
+    """
+    spooled = isinstance(file_content, SpooledUpload)
+    source = file_content.source if spooled else file_content # bytes or spool file path
+    head = file_content.head() if spooled else file_content
+
+    if layer is None and settings.PDF_TEXT_LAYER_ENABLED and is_pdf(head):
+        started = time.perf_counter()
+        try:
+            layer = await asyncio.to_thread(read_text_layer, source)
+        except Exception as e:
+            print(f"Text layer check failed, falling back to OCR: {e}")
+        metrics.observe("pdf_text_layer_ms", (time.perf_counter() - started) * 1000)
+
+    if layer is None or not layer.text_pages:
+        metrics.inc("document_text_source", source="ocr")
+        result = await call_azure_ocr(file_content, content_hash)
+        return {**result, "text_source": "ocr", "ocr_pages": list(range(1, len(layer.pages) + 1)) if layer else None}
+
+    if layer.complete:
+        metrics.inc("document_text_source", source="text_layer")
+        return {**_merge_page_lines(layer, {}), "text_source": "text_layer", "ocr_pages": []}
+
+    # Mixed document: OCR just the scanned pages (cached under the original file's hash + page list)
+    metrics.inc("document_text_source", source="mixed")
+    scanned = await asyncio.to_thread(select_pages, source, layer.scanned_pages)
+    pages_key = ",".join(map(str, layer.scanned_pages))
+    ocr = await call_azure_ocr(scanned, f"{content_hash or _content_hash(file_content)}:pages={pages_key}")
+
+    read_results = ocr.get("raw_data", {}).get("analyzeResult", {}).get("readResults", [])
+    ocr_lines = {
+        number: [line.get("text", "") for line in page.get("lines", [])]
+        for number, page in zip(layer.scanned_pages, read_results)
+    }
+    return {**_merge_page_lines(layer, ocr_lines), "raw_data": ocr.get("raw_data"), "text_source": "mixed", "ocr_pages": layer.scanned_pages}
+
+def _merge_page_lines(layer, ocr_lines: dict[int, list[str]]) -> dict:
+    lines = []
+    for number, text in enumerate(layer.pages, start=1):
+        if number in ocr_lines:
+            lines.extend(ocr_lines[number])
+        else:
+            lines.extend(line.strip() for line in text.splitlines() if line.strip())
+    return {
+        "status": "success",
+        "full_text": "\n".join(lines),
+        "lines": lines,
+        "pages": len(layer.pages)
+    }
+
+async def _analyze_with_azure(file_content: bytes | SpooledUpload) -> dict:
+    """
+    Submits the Read operation and polls until it completes.
+    Polling is non-blocking (asyncio.sleep) and honors Azure's Retry-After header.
     """
     
     # 1. Get Credentials
@@ -105,42 +171,67 @@ async def call_azure_ocr(file_content: bytes) -> dict:
         "Content-Type": "application/octet-stream"
     }
 
+    body = file_content
+    if isinstance(file_content, SpooledUpload):
+        # Stream the spooled body; an explicit Content-Length avoids chunked transfer encoding
+        body = file_content.aiter_chunks()
+        headers["Content-Length"] = str(file_content.size)
+
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+
     # 2. Submit Operation (POST)
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(analyze_url, content=file_content, headers=headers)
+            response = await client.post(analyze_url, content=body, headers=headers)
         except Exception as e:
-            raise ValueError(f"Failed to contact Azure Vision: {str(e)}")
+            raise OCRError(f"Failed to contact Azure Vision: {str(e)}")
 
         if response.status_code != 202:
-            raise ValueError(f"Azure Vision Error ({response.status_code}): {response.text}")
+            raise OCRError(f"Azure Vision Error ({response.status_code}): {response.text}", status_code=response.status_code)
 
         operation_url = response.headers.get("Operation-Location")
         if not operation_url:
-            raise ValueError("Azure did not return Operation-Location header")
+            raise OCRError("Azure did not return Operation-Location header")
 
         # 3. Poll for Result (GET)
-        max_retries = 30
-        poll_interval = 1
-        
-        for _ in range(max_retries):
-            time.sleep(poll_interval)
+        deadline = started_at + settings.OCR_POLL_TIMEOUT
+        delays = _ocr_poll_delays()
+        wait = _retry_after_seconds(response) or next(delays)
+        polls = 0
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                metrics.inc("ocr_timeouts")
+                raise OCRError("OCR Analysis timed out", status_code=504)
+
+            await asyncio.sleep(min(wait, remaining))
             
             poll_res = await client.get(operation_url, headers={"Ocp-Apim-Subscription-Key": api_key})
+            polls += 1
+
+            if poll_res.status_code == 429:
+                # Throttled: back off as instructed and keep polling
+                wait = _retry_after_seconds(poll_res) or next(delays)
+                continue
             
             if poll_res.status_code != 200:
-                raise ValueError(f"Polling failed: {poll_res.text}")
+                raise OCRError(f"Polling failed: {poll_res.text}")
             
             analysis = poll_res.json()
             status = analysis.get("status")
             
             if status == "succeeded":
+                metrics.observe("ocr_polls", polls)
+                metrics.observe("ocr_analyze_ms", (loop.time() - started_at) * 1000)
                 return format_ocr_result(analysis)
             
             if status == "failed":
-                raise ValueError("Azure Analysis Failed (Status: failed)")
-        
-        raise ValueError("OCR Analysis timed out")
+                raise OCRError("Azure Analysis Failed (Status: failed)")
+
+            # "running" or "notStarted"
+            wait = _retry_after_seconds(poll_res) or next(delays)
 
 def format_ocr_result(analysis: dict) -> dict:
     read_results = analysis.get("analyzeResult", {}).get("readResults", [])
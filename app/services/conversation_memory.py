@@ -0,0 +1,161 @@
+import re
+import asyncio
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.chat import ChatSession, ChatMessage
+
+SUMMARY_PROMPT = """你負責維護一段對話的滾動摘要 (rolling summary)。
+請將「既有摘要」與「新增對話」整合成一份新的摘要：
+- 保留使用者身分、偏好、目標、已做出的決定與待辦事項。
+- 保留重要的數字、名稱、檔案與工具結果的結論；省略冗長的原文 (例如整份合約、OCR 全文)。
+- 使用繁體中文，條列式，不超過 {max_tokens} tokens。
+只輸出摘要本身。"""
+
+SUMMARY_MESSAGE_PREFIX = "先前對話摘要 (Summary of earlier conversation):\n"
+TRUNCATION_MARK = "\n…(內容過長，已截斷)"
+
+# Messages scanned per turn (unsummarized tail only)
+MAX_HISTORY_SCAN = 50
+
+_CJK_RE = re.compile(r"[\u3000-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_inflight: dict[str, asyncio.Task] = {}
+
+def estimate_tokens(text: str | None) -> int:
+    """Cheap token estimate: ~1 token per CJK character, ~4 characters per token otherwise."""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Shrink proportionally, then trim until it fits
+    cut = max(int(len(text) * max_tokens / max(estimate_tokens(text), 1)), 1)
+    while cut > 1 and estimate_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + TRUNCATION_MARK
+
+def history_budget(assistant) -> int:
+    return getattr(assistant, "history_token_budget", None) or settings.AGENT_HISTORY_TOKEN_BUDGET
+
+def build_history(db: Session, chat_session: ChatSession, token_budget: int) -> tuple[list[dict], int]:
+    """
+    History for the LLM: rolling summary (if any) + the most recent unsummarized turns that fit
+    in token_budget (at least AGENT_HISTORY_MIN_MESSAGES, each capped at
+    AGENT_HISTORY_MESSAGE_MAX_TOKENS). Returns (payload, unsummarized_tokens).
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == chat_session.id)
+    if chat_session.summary_until_id:
+        query = query.filter(ChatMessage.id > chat_session.summary_until_id)
+    recent = query.order_by(ChatMessage.id.desc()).limit(MAX_HISTORY_SCAN).all()
+
+    payload = []
+    used = 0
+    if chat_session.summary:
+        summary_msg = {"role": "system", "content": SUMMARY_MESSAGE_PREFIX + chat_session.summary}
+        used = estimate_tokens(summary_msg["content"])
+
+    unsummarized_tokens = sum(estimate_tokens(msg.content) for msg in recent)
+    for msg in recent:
+        content = truncate_to_tokens(msg.content or "", settings.AGENT_HISTORY_MESSAGE_MAX_TOKENS)
+        tokens = estimate_tokens(content)
+        if len(payload) >= settings.AGENT_HISTORY_MIN_MESSAGES and used + tokens > token_budget:
+            break
+        role = "assistant" if msg.role == "assistant" else "user"
+        payload.append({"role": role, "content": content})
+        used += tokens
+    payload.reverse()
+
+    if chat_session.summary:
+        payload.insert(0, summary_msg)
+    metrics.observe("agent_history_tokens", used)
+    return payload, unsummarized_tokens
+
+def maybe_schedule_summary(chat_session: ChatSession, unsummarized_tokens: int):
+    """Starts a background summary refresh once the unsummarized tail passes the threshold."""
+    if unsummarized_tokens < settings.AGENT_SUMMARY_TRIGGER_TOKENS:
+        return
+    session_id = chat_session.id
+    if session_id in _inflight:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return # Sync caller without a loop: next async turn will schedule it
+    task = loop.create_task(refresh_summary(session_id))
+    _inflight[session_id] = task
+    task.add_done_callback(lambda _: _inflight.pop(session_id, None))
+
+async def refresh_summary(session_id: str, session_factory=None):
+    """
+    Folds all but the last AGENT_HISTORY_MIN_MESSAGES unsummarized messages into
+    ChatSession.summary with one LLM call. Runs off the request path with its own Session.
+    """
+    if session_factory is None:
+        from app.core.database import SessionLocal
+        session_factory = SessionLocal
+
+    db = session_factory()
+    try:
+        chat_session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not chat_session:
+            return
+
+        query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+        if chat_session.summary_until_id:
+            query = query.filter(ChatMessage.id > chat_session.summary_until_id)
+        pending = query.order_by(ChatMessage.id).all()
+        to_fold = pending[:-settings.AGENT_HISTORY_MIN_MESSAGES] if settings.AGENT_HISTORY_MIN_MESSAGES else pending
+        if not to_fold:
+            return
+
+        transcript = "\n".join(
+            f"[{m.role}] {truncate_to_tokens(m.content or '', settings.AGENT_HISTORY_MESSAGE_MAX_TOKENS * 2)}"
+            for m in to_fold
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=settings.AGENT_SUMMARY_MAX_TOKENS)},
+            {"role": "user", "content": f"既有摘要：\n{chat_session.summary or '(無)'}\n\n新增對話：\n{transcript}"}
+        ]
+
+        from app.services.gateway import LLMGateway
+        response = await LLMGateway(db).chat(messages, temperature=0.2)
+        choices = response.get("choices") or [{}]
+        summary = (choices[0].get("message", {}).get("content") or "").strip()
+        if not summary:
+            return
+
+        chat_session.summary = truncate_to_tokens(summary, settings.AGENT_SUMMARY_MAX_TOKENS * 2)
+        chat_session.summary_until_id = to_fold[-1].id
+        chat_session.summary_updated_at = datetime.utcnow()
+        _log_summary_usage(db, chat_session, response)
+        db.commit()
+        metrics.inc("agent_summary_refreshes")
+    except Exception as e:
+        db.rollback()
+        metrics.inc("agent_summary_errors")
+        print(f"Failed to refresh summary for session {session_id}: {e}")
+    finally:
+        db.close()
+
+def _log_summary_usage(db: Session, chat_session: ChatSession, response: dict):
+    if not chat_session.user_id:
+        return
+    from app.models.stats import UsageLog
+    from app.core.cost_calculator import calculate_ai_cost
+    from app.services.usage_accounting import record_usage
+
+    usage = response.get("usage", {})
+    model_name = response.get("model", "gpt-4")
+    record_usage(db, UsageLog(
+        user_id=chat_session.user_id,
+        app_name="Agent-Summary",
+        model_name=model_name,
+        tokens_input=usage.get("prompt_tokens", 0),
+        tokens_output=usage.get("completion_tokens", 0),
+        total_tokens=usage.get("total_tokens", 0),
+        estimated_cost=calculate_ai_cost(model_name, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+    ), commit=False)
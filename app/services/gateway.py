@@ -1,33 +1,583 @@
+import os
+import asyncio
+import copy
+import json
+import weakref
+import time
+from functools import cache, partial
+from urllib.parse import urlparse
+import httpx
 from sqlalchemy.orm import Session
-from app.services.azure_integration import call_azure_openai
+from app.models.domain import AIModel
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.database import run_in_session
+from app.services.llm_cache import LLMResponseCache, get_llm_cache, canonical_request, cache_key, replayed_response
+from app.services.llm_limiter import DeploymentLimiter, llm_limiter, estimate_request_tokens, retry_after_seconds
+from app.services.llm_resilience import LLMUpstreamError, TRANSIENT_STATUS, backoff_delay, deployment_health, deployment_key, deployment_endpoint
+from app.services.llm_router import llm_router
+
+try:
+    import h2  # noqa: F401 - httpx needs the h2 package to negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# First httpcore trace events after a connection has been handed out by the pool.
+# Time from request start to one of these = time spent waiting for a pool slot.
+_CONNECTION_ACQUIRED_EVENTS = {
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+}
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+class _PoolWaitTrace:
+    """httpx trace hook measuring how long a request waited for a pooled connection."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.acquired_at = None
+
+    async def __call__(self, event_name: str, info: dict):
+        if self.acquired_at is None and event_name in _CONNECTION_ACQUIRED_EVENTS:
+            self.acquired_at = time.perf_counter()
+
+    def wait_ms(self) -> float:
+        return ((self.acquired_at or self.start) - self.start) * 1000
 
 class LLMGateway:
     """
     Central Gateway for AI Model interactions.
     Currently delegates to Azure OpenAI, but designed to support multiple providers (Local, Anthropic, etc.) in the future.
+
+    Owns one long-lived httpx.AsyncClient (keep-alive + HTTP/2) per endpoint.
+    Pools are created by startup() on the app event loop and closed by shutdown().
     """
+    _clients: dict[str, httpx.AsyncClient] = {}
+    _loop: asyncio.AbstractEventLoop | None = None
+    _inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
     def __init__(self, db: Session):
         self.db = db
 
-    async def chat(self, messages: list[dict], temperature: float = 0.7, model_id: str = None) -> dict:
+    # ------------------------------------------------------------------
+    # Pool Lifecycle
+    # ------------------------------------------------------------------
+
+    @classmethod
+    async def startup(cls):
+        """Binds the gateway to the running app loop and pre-opens the default endpoint pool."""
+        cls._loop = asyncio.get_running_loop()
+        if settings.AZURE_OPENAI_ENDPOINT:
+            cls._get_client(settings.AZURE_OPENAI_ENDPOINT.rstrip('/'))
+
+    @classmethod
+    async def shutdown(cls):
+        clients = list(cls._clients.values())
+        cls._clients = {}
+        cls._loop = None
+        for client in clients:
+            await client.aclose()
+
+    @classmethod
+    def _new_client(cls) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY
+            ),
+            timeout=settings.LLM_TIMEOUT
+        )
+
+    @classmethod
+    def _get_client(cls, endpoint: str) -> httpx.AsyncClient | None:
+        """
+        Returns the pooled client for an endpoint.
+        Pools belong to the app loop; callers on any other loop (CLI scripts, tests) get None
+        and fall back to a short-lived client.
+        """
+        if cls._loop is None or _running_loop() is not cls._loop:
+            return None
+
+        client = cls._clients.get(endpoint)
+        if client is None or client.is_closed:
+            client = cls._new_client()
+            cls._clients[endpoint] = client
+        return client
+
+    # ------------------------------------------------------------------
+    # Chat
+    # ------------------------------------------------------------------
+
+    def resolve_model(self, model_id: str | None = None) -> AIModel:
+        ai_model = None
+        if model_id:
+            ai_model = self.db.query(AIModel).filter(AIModel.id == model_id).first()
+
+        if not ai_model:
+            # Fallback to default active
+            ai_model = self.db.query(AIModel).filter(AIModel.is_active == True).first()
+
+        if not ai_model:
+            raise ValueError("No active AIModel configuration found.")
+        return ai_model
+
+    async def chat(self, messages: list[dict], temperature: float = 0.7, model_id: str = None, ai_model: AIModel | None = None, max_tokens: int | None = None,
+                   cache: bool | None = None, tenant_id: str | None = None, user_id: int | None = None) -> dict:
         """
         Unified Chat Interface.
-        
+
         Args:
             messages: List of message dicts [{"role": "user", "content": "..."}]
             temperature: Randomness (0.0 to 1.0)
             model_id: Optional ID to select specific model config from DB
-            
+            ai_model: Optional already-loaded AIModel (skips the DB lookup)
+            max_tokens: Optional completion length cap
+            cache: Response cache opt-in/out (None = cache when temperature <= LLM_CACHE_MAX_TEMPERATURE)
+            tenant_id / user_id: Tenant for the cache namespace and deployment pinning (tenant_id wins; otherwise the user's tenant)
+
         Returns:
-            Dict containing 'choices', 'usage', etc. (Standard OpenAI format)
+            Dict containing 'choices', 'usage', etc. (Standard OpenAI format).
+            Cache hits (cache_hit=True) and calls coalesced onto an identical in-flight one (coalesced=True)
+            carry zero usage, with the upstream usage in cached_usage.
         """
         # In the future, logic here can check:
         # if settings.AI_PROVIDER == "ollama": return await call_ollama(...)
-        
-        return await call_azure_openai(
-            db=self.db,
-            input_text="", # Legacy param, ignored by call_azure_openai when messages is provided
-            messages=messages,
-            model_id=model_id,
-            temperature=temperature
-        )
+        # DB lookups (model, tenant, route group, fallback) run in a worker thread: chat() is called from the event loop
+        if ai_model is None:
+            ai_model = await run_in_session(self.db, self.resolve_model, model_id)
+        endpoint, url, payload, headers = self._prepare_request(messages, temperature, model_id, ai_model, max_tokens)
+
+        response_cache = self._response_cache(cache, temperature)
+        coalesce = self._coalesce(cache, temperature)
+        canonical = canonical_request(ai_model, endpoint, messages, temperature, max_tokens) if response_cache or coalesce else None
+        # Cache entries and shared in-flight calls are both per tenant (pinned deployments, no cross-tenant replay)
+        resolve_tenant = self._tenant_resolver(tenant_id, user_id)
+        tenant = await run_in_session(self.db, resolve_tenant) if canonical is not None else None
+        key = None
+        if response_cache is not None:
+            key = cache_key(tenant, canonical)
+            cached = await self._cache_call(response_cache, response_cache.get, key)
+            if cached is not None:
+                usage = cached.get("usage", {})
+                metrics.inc("llm_cache_saved_tokens", usage.get("total_tokens", 0), tenant=tenant)
+                return replayed_response(cached, "cache_hit")
+
+        fetch = self._fetch(ai_model, endpoint, resolve_tenant, payload, headers, response_cache, key)
+        if not coalesce:
+            return await fetch
+
+        # Single-flight: identical concurrent requests share one upstream call
+        response, leader = await self._single_flight(cache_key(f"flight:{tenant}", canonical), fetch)
+        return copy.deepcopy(response) if leader else replayed_response(response, "coalesced")
+
+    async def _fetch(self, ai_model: AIModel, endpoint: str, resolve_tenant, payload: dict, headers: dict, response_cache: LLMResponseCache | None, key: str | None) -> dict:
+        # Routing runs here so coalesced followers (whose fetch never starts) skip the router / fallback queries
+        candidates = await run_in_session(self.db, self._deployment_candidates, ai_model, endpoint, resolve_tenant)
+        response = await self._send_with_retries(candidates, endpoint, payload, headers)
+        if key is not None:
+            await self._cache_call(response_cache, response_cache.put, key, response)
+        return response
+
+    def _deployment_candidates(self, ai_model: AIModel, endpoint: str, resolve_tenant=None) -> list[AIModel]:
+        """
+        Deployments to try, best first: the routed pick within the model's route group (or the
+        model itself), the rest of the group, then its fallback (AIModel.fallback_model_id).
+        resolve_tenant (see _tenant_resolver) is called only if the group pins tenants.
+        """
+        candidates = llm_router.route(self.db, ai_model, endpoint, resolve_tenant)
+        fallback_id = getattr(ai_model, "fallback_model_id", None)
+        if fallback_id and fallback_id != ai_model.id and all(str(c.id) != str(fallback_id) for c in candidates):
+            fallback = self.db.query(AIModel).filter(AIModel.id == fallback_id, AIModel.is_active.is_(True)).first()
+            if fallback is not None:
+                candidates.append(fallback)
+        return candidates
+
+    async def _send_with_retries(self, candidates: list[AIModel], endpoint: str, payload: dict, headers: dict) -> dict:
+        """
+        Retries transient failures (429 / 5xx / timeouts / connection errors) up to LLM_RETRY_MAX_ATTEMPTS
+        with jittered exponential backoff, honoring Retry-After. Deployments with an open circuit are
+        skipped and the one that just failed goes to the back, so retries fail over when a fallback exists.
+        """
+        attempts = max(settings.LLM_RETRY_MAX_ATTEMPTS, 1)
+        failed: list[str] = []
+        for attempt in range(attempts):
+            available = self._available_candidates(candidates, endpoint, failed)
+            try:
+                return await self._send_hedged(available[0], available[1] if len(available) > 1 else None, endpoint, payload, headers)
+            except LLMUpstreamError as e:
+                await self._retry_backoff(e, attempt, attempts, failed)
+
+    @staticmethod
+    def _available_candidates(candidates: list[AIModel], endpoint: str, failed: list[str]) -> list[AIModel]:
+        """Candidates whose circuit is not open, the ones that already failed this call last."""
+        available = [m for m in candidates if not deployment_health.get(deployment_key(endpoint, m)).breaker.is_open()]
+        if not available:
+            metrics.inc("llm_breaker_rejections", deployment=deployment_key(endpoint, candidates[0]))
+            raise LLMUpstreamError(f"Azure OpenAI deployment unavailable (circuit open): {', '.join(deployment_key(endpoint, m) for m in candidates)}", reason="circuit_open")
+        available.sort(key=lambda m: deployment_key(endpoint, m) in failed)
+        return available
+
+    @staticmethod
+    async def _retry_backoff(e: LLMUpstreamError, attempt: int, attempts: int, failed: list[str]):
+        """Re-raises e unless it is worth another attempt; otherwise waits out the backoff."""
+        if not e.transient or attempt + 1 >= attempts:
+            raise e
+        if e.retry_after is not None and e.retry_after > settings.LLM_RETRY_MAX_DELAY:
+            raise e # Asked to wait longer than we are willing to
+        if e.deployment:
+            failed.append(e.deployment)
+        delay = backoff_delay(attempt, e.retry_after)
+        metrics.inc("llm_retries", reason=e.reason)
+        await asyncio.sleep(delay)
+
+    async def _send_hedged(self, primary: AIModel, alternate: AIModel | None, endpoint: str, payload: dict, headers: dict) -> dict:
+        """
+        Sends to primary; when LLM_HEDGE_ENABLED and it has not answered within its p95 latency
+        (LLM_HEDGE_PERCENTILE), a duplicate goes to the alternate deployment and the first success wins.
+        """
+        threshold_ms = None
+        if alternate is not None and settings.LLM_HEDGE_ENABLED:
+            threshold_ms = deployment_health.get(deployment_key(endpoint, primary)).percentile(settings.LLM_HEDGE_PERCENTILE)
+        if threshold_ms is None:
+            return await self._send_once(primary, endpoint, payload, headers)
+
+        tasks = [asyncio.ensure_future(self._send_once(primary, endpoint, payload, headers))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold_ms / 1000)
+            if not done:
+                metrics.inc("llm_hedged_requests", deployment=deployment_key(endpoint, primary))
+                tasks.append(asyncio.ensure_future(self._send_once(alternate, endpoint, payload, headers)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks: # Primary first if both finished together
+                    if task in done and task.exception() is None:
+                        if task is not tasks[0]:
+                            metrics.inc("llm_hedge_wins", deployment=deployment_key(endpoint, alternate))
+                        return task.result()
+                for task in done:
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel() # The loser's limiter slot is released by its finally block
+
+    async def _send_once(self, ai_model: AIModel, endpoint: str, payload: dict, headers: dict) -> dict:
+        """One upstream call: breaker check, rate-limit queue, POST, health bookkeeping."""
+        endpoint, headers = self._deployment_target(ai_model, endpoint, headers)
+        name = deployment_key(endpoint, ai_model)
+        health = deployment_health.get(name)
+        if not health.breaker.allow():
+            raise LLMUpstreamError(f"Azure OpenAI deployment unavailable (circuit open): {name}", transient=True, reason="circuit_open", deployment=name)
+
+        url = self._deployment_url(endpoint, ai_model)
+        limiter = llm_limiter.for_model(endpoint, ai_model)
+        reserved = await self._acquire(limiter, payload)
+        used = None
+        start = time.perf_counter()
+        try:
+            client = self._get_client(endpoint)
+            if client is None:
+                async with self._new_client() as temp_client:
+                    response = await self._post(temp_client, endpoint, url, payload, headers, limiter)
+            else:
+                response = await self._post(client, endpoint, url, payload, headers, limiter)
+            used = response.get("usage", {}).get("total_tokens")
+        except LLMUpstreamError as e:
+            self._record_failure(health, e, name)
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release(reserved, used)
+
+        health.record_success((time.perf_counter() - start) * 1000)
+        return response
+
+    @staticmethod
+    def _record_failure(health, e: LLMUpstreamError, name: str):
+        e.deployment = name
+        if e.transient and e.status_code != 429:
+            health.record_failure()
+        else:
+            health.breaker.record_success() # Throttled / rejected, but the deployment is up
+
+    @staticmethod
+    async def _acquire(limiter: DeploymentLimiter | None, payload: dict) -> int:
+        """Queues for the deployment's RPM/TPM/in-flight budget; returns the tokens reserved."""
+        if limiter is None:
+            return 0
+        reserved = estimate_request_tokens(payload)
+        try:
+            await asyncio.wait_for(limiter.acquire(reserved), timeout=settings.LLM_LIMITER_QUEUE_TIMEOUT_SECONDS or None)
+        except asyncio.TimeoutError:
+            metrics.inc("llm_limiter_timeouts", deployment=limiter.name)
+            raise ValueError(f"LLM deployment {limiter.name} is saturated (no rate-limit budget within {settings.LLM_LIMITER_QUEUE_TIMEOUT_SECONDS:g}s)")
+        return reserved
+
+    @staticmethod
+    def _coalesce(cache: bool | None, temperature: float) -> bool:
+        # cache=False asks for a fresh upstream answer, so it also opts out of sharing an in-flight one
+        return settings.LLM_COALESCE_ENABLED and cache is not False and temperature <= settings.LLM_COALESCE_MAX_TEMPERATURE
+
+    @classmethod
+    async def _single_flight(cls, key: str, fetch) -> tuple[dict, bool]:
+        """
+        Awaits the in-flight call for key, or starts it. Returns (response, leader).
+        The upstream call runs as its own task, so a cancelled caller (client disconnect)
+        does not cancel it for the others; errors are raised to every waiter.
+        """
+        inflight = cls._inflight.setdefault(asyncio.get_running_loop(), {})
+        task = inflight.get(key)
+        if task is not None:
+            fetch.close() # Never started
+            metrics.inc("llm_coalesced_requests")
+            return await asyncio.shield(task), False
+
+        task = asyncio.ensure_future(fetch)
+        inflight[key] = task
+
+        def _done(t: asyncio.Task):
+            if inflight.get(key) is t:
+                del inflight[key]
+            if not t.cancelled():
+                t.exception() # Mark retrieved even if every waiter was cancelled
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task), True
+
+    @staticmethod
+    def _response_cache(cache: bool | None, temperature: float) -> LLMResponseCache | None:
+        if cache is False:
+            return None
+        response_cache = get_llm_cache()
+        if response_cache is None:
+            return None
+        if cache is None and temperature > settings.LLM_CACHE_MAX_TEMPERATURE:
+            return None # Sampled output: a replayed answer would hide the intended randomness
+        return response_cache
+
+    def _tenant(self, tenant_id: str | None, user_id: int | None) -> str:
+        """Tenant of the call (response cache namespace, deployment pinning): tenant_id, else the user's tenant."""
+        if tenant_id:
+            return tenant_id
+        if user_id:
+            from app.models.user import User
+            tenant = self.db.query(User.tenant_id).filter(User.id == user_id).scalar()
+            if tenant:
+                return tenant
+        return "default"
+
+    def _tenant_resolver(self, tenant_id: str | None, user_id: int | None):
+        """Lazy, memoized _tenant(): the user lookup runs at most once, and only if the cache or routing needs it. Call it off the loop."""
+        return cache(partial(self._tenant, tenant_id, user_id))
+
+    @staticmethod
+    async def _cache_call(response_cache: LLMResponseCache, fn, *args):
+        # The SQLite tier does file I/O; keep it off the event loop
+        if response_cache.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def chat_stream(self, messages: list[dict], temperature: float = 0.7, model_id: str = None, ai_model: AIModel | None = None, max_tokens: int | None = None,
+                          tenant_id: str | None = None, user_id: int | None = None):
+        """
+        Streaming variant of chat(). Async generator yielding content deltas (str) as Azure produces them.
+        Routing, circuit breakers and rate limits apply as for chat(); transient failures are retried
+        (failing over to the next deployment) only until the first delta, as a restart would repeat output.
+        """
+        if ai_model is None:
+            ai_model = await run_in_session(self.db, self.resolve_model, model_id)
+        endpoint, _, payload, headers = self._prepare_request(messages, temperature, model_id, ai_model, max_tokens)
+        payload["stream"] = True
+        candidates = await run_in_session(self.db, self._deployment_candidates, ai_model, endpoint, self._tenant_resolver(tenant_id, user_id))
+
+        attempts = max(settings.LLM_RETRY_MAX_ATTEMPTS, 1)
+        failed: list[str] = []
+        for attempt in range(attempts):
+            available = self._available_candidates(candidates, endpoint, failed)
+            started = False
+            try:
+                async for delta in self._stream_once(available[0], endpoint, payload, headers):
+                    started = True
+                    yield delta
+                return
+            except LLMUpstreamError as e:
+                if started:
+                    raise
+                await self._retry_backoff(e, attempt, attempts, failed)
+
+    async def _stream_once(self, ai_model: AIModel, endpoint: str, payload: dict, headers: dict):
+        """One streaming upstream call: breaker check, rate-limit queue, SSE parsing, health bookkeeping."""
+        endpoint, headers = self._deployment_target(ai_model, endpoint, headers)
+        name = deployment_key(endpoint, ai_model)
+        health = deployment_health.get(name)
+        if not health.breaker.allow():
+            raise LLMUpstreamError(f"Azure OpenAI deployment unavailable (circuit open): {name}", transient=True, reason="circuit_open", deployment=name)
+
+        url = self._deployment_url(endpoint, ai_model)
+        limiter = llm_limiter.for_model(endpoint, ai_model)
+        reserved = await self._acquire(limiter, payload)
+
+        client = self._get_client(endpoint)
+        owns_client = client is None
+        if owns_client:
+            client = self._new_client()
+
+        host = urlparse(endpoint).netloc or endpoint
+        trace = _PoolWaitTrace()
+        first_token_at = None
+        try:
+            try:
+                async with client.stream("POST", url, json=payload, headers=headers, extensions={"trace": trace}) as response:
+                    metrics.observe("llm_pool_wait_ms", trace.wait_ms(), endpoint=host)
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        metrics.inc("llm_request_errors", endpoint=host, status=response.status_code)
+                        retry_after = retry_after_seconds(response, None)
+                        if response.status_code == 429 and limiter is not None:
+                            limiter.pause(retry_after if retry_after is not None else settings.LLM_LIMITER_429_PAUSE_SECONDS)
+                        raise LLMUpstreamError(
+                            f"Azure OpenAI Error ({response.status_code}): {body.decode(errors='replace')}",
+                            status_code=response.status_code,
+                            transient=response.status_code in TRANSIENT_STATUS,
+                            retry_after=retry_after
+                        )
+
+                    async for line in response.aiter_lines():
+                        # SSE frames: "data: {json}" ... "data: [DONE]"
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+
+                        chunk = json.loads(data)
+                        for choice in chunk.get("choices", []):
+                            delta = (choice.get("delta") or {}).get("content")
+                            if delta:
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                    metrics.observe("llm_ttft_ms", (first_token_at - trace.start) * 1000, endpoint=host)
+                                yield delta
+            except httpx.TimeoutException as e:
+                metrics.inc("llm_request_errors", endpoint=host, status="timeout")
+                raise LLMUpstreamError(f"Azure OpenAI request timed out: {e!r}", transient=True, reason="timeout") from e
+            except httpx.TransportError as e:
+                metrics.inc("llm_request_errors", endpoint=host, status="transport")
+                raise LLMUpstreamError(f"Azure OpenAI connection error: {e!r}", transient=True, reason="transport") from e
+        except LLMUpstreamError as e:
+            self._record_failure(health, e, name)
+            raise
+        finally:
+            metrics.observe("llm_request_ms", (time.perf_counter() - trace.start) * 1000, endpoint=host)
+            if limiter is not None:
+                limiter.release(reserved) # Streams report no usage: the estimate stands
+            if owns_client:
+                await client.aclose()
+
+        health.record_success((time.perf_counter() - trace.start) * 1000)
+
+    def _prepare_request(self, messages: list[dict], temperature: float, model_id: str | None, ai_model: AIModel | None, max_tokens: int | None = None) -> tuple[str, str, dict, dict]:
+        if ai_model is None:
+            ai_model = self.resolve_model(model_id)
+
+        endpoint = deployment_endpoint(ai_model, settings.AZURE_OPENAI_ENDPOINT)
+        api_key = self._api_key(ai_model)
+
+        if not api_key or not endpoint:
+            raise ValueError("Missing Azure OpenAI Credentials (AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT) in settings.")
+
+        url = self._deployment_url(endpoint, ai_model)
+
+        payload = {
+            "messages": messages,
+            "temperature": temperature
+        }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        headers = {
+            "Content-Type": "application/json",
+            "api-key": api_key
+        }
+        return endpoint, url, payload, headers
+
+    @staticmethod
+    def _deployment_url(endpoint: str, ai_model: AIModel) -> str:
+        endpoint = deployment_endpoint(ai_model, endpoint)
+        return f"{endpoint}/openai/deployments/{ai_model.deployment_name}/chat/completions?api-version={ai_model.api_version}"
+
+    @staticmethod
+    def _api_key(ai_model: AIModel) -> str | None:
+        """A deployment on its own Azure resource names the environment variable holding its key (AIModel.api_key_env)."""
+        key_env = getattr(ai_model, "api_key_env", None)
+        if key_env:
+            return os.getenv(key_env) or getattr(settings, key_env, None)
+        return settings.AZURE_OPENAI_API_KEY or settings.AZURE_OPENAI_KEY
+
+    def _deployment_target(self, ai_model: AIModel, endpoint: str, headers: dict) -> tuple[str, dict]:
+        """Endpoint and headers for one candidate: route-group members and fallbacks may live on other Azure resources."""
+        endpoint = deployment_endpoint(ai_model, endpoint)
+        if getattr(ai_model, "api_key_env", None):
+            api_key = self._api_key(ai_model)
+            if not api_key:
+                raise LLMUpstreamError(f"Missing API key {ai_model.api_key_env} for deployment {deployment_key(endpoint, ai_model)}", reason="config")
+            headers = {**headers, "api-key": api_key}
+        return endpoint, headers
+
+    def chat_sync(self, messages: list[dict], temperature: float = 0.7, model_id: str = None, ai_model: AIModel | None = None, max_tokens: int | None = None,
+                  cache: bool | None = None, tenant_id: str | None = None, user_id: int | None = None) -> dict:
+        """
+        Blocking variant of chat() for sync callers (e.g. WorkflowEngine running in a worker thread).
+        The call is scheduled on the app loop so it shares the pooled connections.
+        Must not be called from the app loop thread itself.
+        """
+        if _running_loop() is not None:
+            raise RuntimeError("chat_sync() called from a running event loop; use 'await chat()' instead")
+
+        coro = self.chat(messages, temperature=temperature, model_id=model_id, ai_model=ai_model, max_tokens=max_tokens,
+                         cache=cache, tenant_id=tenant_id, user_id=user_id)
+        loop = LLMGateway._loop
+        if loop is not None and loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+        return asyncio.run(coro)
+
+    async def _post(self, client: httpx.AsyncClient, endpoint: str, url: str, payload: dict, headers: dict, limiter: DeploymentLimiter | None = None) -> dict:
+        host = urlparse(endpoint).netloc or endpoint
+        trace = _PoolWaitTrace()
+
+        try:
+            response = await client.post(url, json=payload, headers=headers, extensions={"trace": trace})
+        except httpx.TimeoutException as e:
+            metrics.inc("llm_request_errors", endpoint=host, status="timeout")
+            raise LLMUpstreamError(f"Azure OpenAI request timed out: {e!r}", transient=True, reason="timeout") from e
+        except httpx.TransportError as e:
+            metrics.inc("llm_request_errors", endpoint=host, status="transport")
+            raise LLMUpstreamError(f"Azure OpenAI connection error: {e!r}", transient=True, reason="transport") from e
+        finally:
+            metrics.observe("llm_pool_wait_ms", trace.wait_ms(), endpoint=host)
+            metrics.observe("llm_request_ms", (time.perf_counter() - trace.start) * 1000, endpoint=host)
+
+        if response.status_code != 200:
+            metrics.inc("llm_request_errors", endpoint=host, status=response.status_code)
+            retry_after = retry_after_seconds(response, None)
+            if response.status_code == 429 and limiter is not None:
+                limiter.pause(retry_after if retry_after is not None else settings.LLM_LIMITER_429_PAUSE_SECONDS)
+            raise LLMUpstreamError(
+                f"Azure OpenAI Error ({response.status_code}): {response.text}",
+                status_code=response.status_code,
+                transient=response.status_code in TRANSIENT_STATUS,
+                retry_after=retry_after
+            )
+
+        return response.json()
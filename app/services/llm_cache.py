@@ -0,0 +1,174 @@
+import os
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.metrics import metrics
+
+def canonical_request(ai_model, endpoint: str, messages: list[dict], temperature: float, max_tokens: int | None) -> str:
+    return json.dumps({
+        "endpoint": endpoint,
+        "model": ai_model.name,
+        "deployment": ai_model.deployment_name,
+        "api_version": ai_model.api_version,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+def cache_key(namespace: str, canonical: str) -> str:
+    # Tenant namespace prefix: identical prompts from different tenants never share an entry
+    return f"{namespace}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+def replayed_response(response: dict, marker: str) -> dict:
+    """
+    What callers get when no upstream call was made for them (cache hit / coalesced):
+    a copy of the response with zero usage, so every caller's UsageLog entry for it is
+    zero-cost. The original usage is kept under cached_usage, and response[marker] is True.
+    """
+    hit = copy.deepcopy(response)
+    hit["cached_usage"] = hit.get("usage", {})
+    hit["usage"] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    hit[marker] = True
+    return hit
+
+class LLMResponseCache:
+    """
+    Exact-match chat completion cache.
+    Tier 1: in-process LRU of LLM_CACHE_MAX_ENTRIES responses.
+    Tier 2 (optional, LLM_CACHE_PATH): SQLite file shared by all workers on the host,
+    size-bounded (LLM_CACHE_MAX_MB) with LRU eviction. Both tiers honor the TTL.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: int | None = None, path: str | None = None, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None
+        self.path = path or None
+        self.max_bytes = max_bytes
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict() # key -> (created_at, JSON)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.path:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+
+    @property
+    def shared(self) -> bool:
+        return self._conn is not None
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and self._expired(entry[0], now):
+                del self._memory[key]
+                entry = None
+            if entry:
+                self._memory.move_to_end(key)
+                metrics.inc("llm_cache_hits", tier="memory")
+                return json.loads(entry[1])
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and self._expired(row[1], now):
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    row = None
+                if row:
+                    self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0]) # Promote to the in-process tier
+                    metrics.inc("llm_cache_hits", tier="sqlite")
+                    return json.loads(row[0])
+
+        metrics.inc("llm_cache_misses")
+        return None
+
+    def put(self, key: str, response: dict):
+        value = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._conn is not None:
+                size = len(value.encode("utf-8"))
+                if self.max_bytes and size > self.max_bytes:
+                    return
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now)
+                )
+                self._evict()
+
+    def _remember(self, key: str, created_at: float, value: str):
+        # Caller holds self._lock
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            metrics.inc("llm_cache_evictions", tier="memory")
+
+    def _evict(self):
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC LIMIT 1").fetchone()
+            if not oldest:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (oldest[0],))
+            total -= oldest[1]
+            metrics.inc("llm_cache_evictions", tier="sqlite")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._memory)
+            shared_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] if self._conn else None
+        return {
+            "memory_entries": entries,
+            "shared_entries": shared_entries,
+            "hits": metrics.get_counter("llm_cache_hits", tier="memory") + metrics.get_counter("llm_cache_hits", tier="sqlite"),
+            "misses": metrics.get_counter("llm_cache_misses")
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+
+_cache: LLMResponseCache | None = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """Process-wide cache instance, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                path=settings.LLM_CACHE_PATH,
+                max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024
+            )
+        return _cache
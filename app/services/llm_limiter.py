@@ -0,0 +1,253 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.conversation_memory import estimate_tokens
+from app.services.llm_resilience import deployment_key
+
+class TokenBucket:
+    """
+    Budget refilled continuously at rate_per_minute, holding at most burst_seconds worth
+    (Azure enforces RPM/TPM over short windows, not per whole minute).
+    """
+    def __init__(self, rate_per_minute: int, burst_seconds: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate_per_minute: int, burst_seconds: float):
+        """New limit; the current level carries over (capped), so a change never grants a fresh burst."""
+        self._refill(time.monotonic())
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity) # A request bigger than the burst waits for a full bucket
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        # May go negative (oversized request, under-estimate): later callers wait it off.
+        # A negative amount refunds an over-estimate.
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+class _Waiter:
+    """A queued acquire(): woken from any thread via its own event loop."""
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass # Loop already closed: the waiter is gone
+
+class DeploymentLimiter:
+    """
+    RPM / TPM token buckets plus a max in-flight cap for one deployment.
+    Callers queue in arrival order; only the head of the queue waits for budget, so a
+    large request is not starved by small ones.
+    State is guarded by a threading.Lock and waiters are woken on their own loop, so one
+    limiter is shared by every event loop in the process (app loop, asyncio.run in worker threads).
+    """
+    def __init__(self, name: str, rpm: int, tpm: int, max_inflight: int):
+        self.name = name
+        self.limits = (rpm, tpm, max_inflight)
+        self.requests = TokenBucket(rpm, settings.LLM_LIMITER_BURST_SECONDS) if rpm else None
+        self.tokens = TokenBucket(tpm, settings.LLM_LIMITER_BURST_SECONDS) if tpm else None
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+        self._queue: deque[_Waiter] = deque()
+
+    def update_limits(self, rpm: int, tpm: int, max_inflight: int):
+        """
+        Applies changed AIModel limits in place: in-flight calls, the queue and the spent budget are kept
+        (a replacement limiter would start empty and briefly admit up to twice the cap).
+        """
+        with self._lock:
+            self.limits = (rpm, tpm, max_inflight)
+            self.requests = self._updated_bucket(self.requests, rpm)
+            self.tokens = self._updated_bucket(self.tokens, tpm)
+            self.max_inflight = max_inflight
+            self._wake_head() # Raised limits may admit the head right away
+
+    @staticmethod
+    def _updated_bucket(bucket: TokenBucket | None, rate_per_minute: int) -> TokenBucket | None:
+        if not rate_per_minute:
+            return None
+        if bucket is None:
+            bucket = TokenBucket(rate_per_minute, settings.LLM_LIMITER_BURST_SECONDS)
+            bucket.level = 0.0 # Newly limited: fill up from empty rather than granting a burst
+            return bucket
+        bucket.set_rate(rate_per_minute, settings.LLM_LIMITER_BURST_SECONDS)
+        return bucket
+
+    def _wake_head(self):
+        # Caller holds self._lock
+        if self._queue:
+            self._queue[0].wake()
+
+    def _try_take(self, waiter: _Waiter, tokens: int) -> tuple[str | None, float | None]:
+        """
+        Takes budget if waiter is at the head and it is available.
+        Returns (None, 0) on success, else (reason, delay); delay None = wait to be woken.
+        """
+        with self._lock:
+            if self._queue[0] is not waiter:
+                return None, None
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                return "inflight", None
+
+            now = time.monotonic()
+            delays = {
+                "retry_after": self.paused_until - now,
+                "rpm": self.requests.wait_time(1, now) if self.requests else 0.0,
+                "tpm": self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+            }
+            reason, delay = max(delays.items(), key=lambda item: item[1])
+            if delay > 0:
+                return reason, delay
+
+            if self.requests:
+                self.requests.take(1, now)
+            if self.tokens:
+                self.tokens.take(tokens, now)
+            self.inflight += 1
+            self._queue.popleft()
+            self._wake_head()
+            return None, 0.0
+
+    async def acquire(self, tokens: int):
+        """Waits for an in-flight slot and RPM/TPM budget for a request of ~tokens tokens."""
+        start = time.perf_counter()
+        throttled = set()
+        waiter = _Waiter()
+        with self._lock:
+            self._queue.append(waiter)
+            self.waiting += 1
+            waiting = self.waiting
+        metrics.set_gauge("llm_limiter_queue_depth", waiting, deployment=self.name)
+        try:
+            while True:
+                waiter.event.clear()
+                reason, delay = self._try_take(waiter, tokens)
+                if reason is None and delay == 0.0:
+                    break
+                if reason:
+                    throttled.add(reason)
+                if delay is None:
+                    await waiter.event.wait() # Woken when we reach the head or a slot frees up
+                else:
+                    await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled / timed out while queued: leave the queue and let the next caller go
+            with self._lock:
+                if waiter in self._queue:
+                    head = self._queue[0] is waiter
+                    self._queue.remove(waiter)
+                    if head:
+                        self._wake_head()
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                waiting = self.waiting
+            metrics.set_gauge("llm_limiter_queue_depth", waiting, deployment=self.name)
+
+        for reason in throttled:
+            metrics.inc("llm_throttled", deployment=self.name, reason=reason)
+        metrics.observe("llm_limiter_wait_ms", (time.perf_counter() - start) * 1000, deployment=self.name)
+        metrics.set_gauge("llm_inflight", self.inflight, deployment=self.name)
+
+    def release(self, reserved: int, used: int | None = None):
+        """Frees the in-flight slot and corrects the TPM bucket by the actual usage (when known)."""
+        with self._lock:
+            self.inflight -= 1
+            if self.tokens and used is not None:
+                self.tokens.take(used - reserved, time.monotonic())
+            inflight = self.inflight
+            self._wake_head()
+        metrics.set_gauge("llm_inflight", inflight, deployment=self.name)
+
+    def pause(self, seconds: float):
+        """Upstream said 429: hold the whole queue for Retry-After."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        metrics.inc("llm_throttled", deployment=self.name, reason="upstream_429")
+
+class LLMLimiter:
+    """
+    One DeploymentLimiter per endpoint + deployment, shared by all threads and event loops
+    of the process. Limits come from the AIModel row (rpm_limit / tpm_limit / max_inflight;
+    NULL = LLM_DEFAULT_* setting, 0 = unlimited). A limiter is updated in place when its limits change.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: dict[str, DeploymentLimiter] = {}
+
+    @staticmethod
+    def limits(ai_model) -> tuple[int, int, int]:
+        def pick(value, default: int) -> int:
+            return default if value is None else value
+        return (
+            pick(getattr(ai_model, "rpm_limit", None), settings.LLM_DEFAULT_RPM_LIMIT),
+            pick(getattr(ai_model, "tpm_limit", None), settings.LLM_DEFAULT_TPM_LIMIT),
+            pick(getattr(ai_model, "max_inflight", None), settings.LLM_DEFAULT_MAX_INFLIGHT),
+        )
+
+    def for_model(self, endpoint: str, ai_model) -> DeploymentLimiter | None:
+        limits = self.limits(ai_model)
+        if not any(limits):
+            return None
+
+        name = deployment_key(endpoint, ai_model)
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = DeploymentLimiter(name, *limits)
+                self._limiters[name] = limiter
+            elif limiter.limits != limits:
+                limiter.update_limits(*limits)
+            return limiter
+
+    def get(self, name: str) -> DeploymentLimiter | None:
+        with self._lock:
+            return self._limiters.get(name)
+
+    def reset(self):
+        with self._lock:
+            self._limiters.clear()
+
+llm_limiter = LLMLimiter()
+
+def estimate_request_tokens(payload: dict) -> int:
+    """TPM reservation for a request: prompt estimate + max_tokens (or the default completion estimate)."""
+    prompt = 0
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        prompt += 4 + estimate_tokens(content if isinstance(content, str) else str(content or ""))
+    return prompt + (payload.get("max_tokens") or settings.LLM_LIMITER_COMPLETION_TOKENS)
+
+def retry_after_seconds(response, default: float | None) -> float | None:
+    """Azure sends retry-after-ms and/or Retry-After (seconds)."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return max(float(value) * scale, 0.0)
+            except ValueError:
+                pass # HTTP-date form: fall back to the default
+    return default
@@ -0,0 +1,175 @@
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from app.core.config import settings
+from app.core.metrics import metrics
+
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+def deployment_endpoint(ai_model, default: str) -> str:
+    """Base URL of a deployment: its own AIModel.endpoint (another Azure resource / region), else the default."""
+    return (getattr(ai_model, "endpoint", None) or default or "").rstrip('/')
+
+def deployment_key(endpoint: str, ai_model) -> str:
+    endpoint = deployment_endpoint(ai_model, endpoint)
+    return f"{urlparse(endpoint).netloc or endpoint}/{ai_model.deployment_name}"
+
+class LLMUpstreamError(ValueError):
+    """
+    Failed Azure OpenAI call. transient = worth retrying (429 / 5xx / timeout / connection error);
+    retry_after = server-requested delay in seconds, if any.
+    """
+    def __init__(self, message: str, status_code: int | None = None, transient: bool = False, retry_after: float | None = None,
+                 reason: str | None = None, deployment: str | None = None):
+        super().__init__(message)
+        self.deployment = deployment
+        self.status_code = status_code
+        self.transient = transient
+        self.retry_after = retry_after
+        self.reason = reason or (str(status_code) if status_code else "error")
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff; a server Retry-After is honored (plus a little jitter)."""
+    base = settings.LLM_RETRY_BASE_DELAY
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    closed -> open after LLM_BREAKER_FAILURE_THRESHOLD consecutive failures
+    open -> half-open after LLM_BREAKER_OPEN_SECONDS: one probe request is let through
+    half-open -> closed on success, open again on failure
+    Shared by every thread (sync skills run in workers): state changes happen under a lock,
+    so only one caller can claim the half-open probe.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+
+    def _cooled_down(self, now: float) -> bool:
+        return now - self.opened_at >= settings.LLM_BREAKER_OPEN_SECONDS
+
+    def _probe_free(self, now: float) -> bool:
+        # A probe that never reported back (cancelled hedge) frees up after another cool-down
+        return not self.probe_started or now - self.probe_started >= settings.LLM_BREAKER_OPEN_SECONDS
+
+    def is_open(self) -> bool:
+        """True while requests would be rejected (used to order failover candidates)."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "closed":
+                return False
+            return not (self._cooled_down(now) and self._probe_free(now))
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self._cooled_down(now) and self._probe_free(now):
+                self._set_state("half_open")
+                self.probe_started = now
+                return True
+        metrics.inc("llm_breaker_rejections", deployment=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.probe_started = 0.0
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_started = 0.0
+            if self.state == "half_open" or self.failures >= settings.LLM_BREAKER_FAILURE_THRESHOLD:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    self._set_state("open") # llm_breaker_open / llm_breaker_transitions{state=open}
+
+    def _set_state(self, state: str):
+        # Caller holds self._lock
+        self.state = state
+        metrics.set_gauge("llm_breaker_open", 1 if state == "open" else 0, deployment=self.name)
+        metrics.inc("llm_breaker_transitions", deployment=self.name, state=state)
+
+class DeploymentHealth:
+    """
+    Rolling window of recent outcomes (last LLM_LATENCY_WINDOW calls within LLM_HEALTH_WINDOW_SECONDS)
+    and the circuit breaker for one deployment. Feeds hedging (latency percentile) and routing.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: deque[tuple[float, float | None]] = deque(maxlen=settings.LLM_LATENCY_WINDOW) # (time, latency ms | None = failed)
+        self.breaker = CircuitBreaker(name)
+        self._lock = threading.Lock() # guards samples (iterating a deque while another thread appends raises)
+
+    def record_success(self, latency_ms: float):
+        with self._lock:
+            self.samples.append((time.monotonic(), latency_ms))
+        self.breaker.record_success()
+
+    def record_failure(self):
+        with self._lock:
+            self.samples.append((time.monotonic(), None))
+        self.breaker.record_failure()
+
+    def _recent(self) -> list[float | None]:
+        cutoff = time.monotonic() - settings.LLM_HEALTH_WINDOW_SECONDS
+        with self._lock:
+            return [latency for at, latency in self.samples if at >= cutoff]
+
+    def percentile(self, p: float, min_samples: int | None = None) -> float | None:
+        """Latency percentile in ms over recent successes, or None below min_samples (LLM_HEDGE_MIN_SAMPLES)."""
+        window = sorted(latency for latency in self._recent() if latency is not None)
+        if len(window) < max(settings.LLM_HEDGE_MIN_SAMPLES if min_samples is None else min_samples, 1):
+            return None
+        return window[min(len(window) - 1, int(p / 100 * len(window)))]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if len(recent) < max(settings.LLM_ROUTING_MIN_SAMPLES, 1):
+            return 0.0
+        return sum(1 for latency in recent if latency is None) / len(recent)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "samples": len(self._recent()),
+            "p50_ms": self.percentile(50, min_samples=1),
+            "p95_ms": self.percentile(95, min_samples=1),
+            "error_rate": round(self.error_rate(), 3)
+        }
+
+class HealthRegistry:
+    def __init__(self):
+        self._deployments: dict[str, DeploymentHealth] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> DeploymentHealth:
+        with self._lock:
+            health = self._deployments.get(name)
+            if health is None:
+                health = DeploymentHealth(name)
+                self._deployments[name] = health
+            return health
+
+    def reset(self):
+        with self._lock:
+            self._deployments.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            deployments = list(self._deployments.items())
+        return {name: health.snapshot() for name, health in deployments}
+
+deployment_health = HealthRegistry()
@@ -0,0 +1,130 @@
+import time
+import random
+import threading
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.domain import AIModel
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_resilience import deployment_health, deployment_key
+
+class Deployment:
+    """Detached snapshot of an AIModel row: safe to cache and share across sessions and threads."""
+    FIELDS = (
+        "id", "name", "deployment_name", "api_version", "endpoint", "api_key_env", "is_active", "route_group", "route_weight",
+        "pinned_tenants", "fallback_model_id", "rpm_limit", "tpm_limit", "max_inflight",
+    )
+
+    def __init__(self, row):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(row, field, None))
+
+    @property
+    def weight(self) -> int:
+        return 1 if self.route_weight is None else max(self.route_weight, 0)
+
+class LLMRouter:
+    """
+    Spreads calls for a route group (AIModel rows sharing route_group) across its deployments.
+
+    Each call picks one deployment at random, proportionally to
+        route_weight x latency factor (fastest p50 / own p50) x (1 - error rate)^2 / (1 + queued callers)
+    so healthy, fast deployments take most traffic while slower ones still absorb load and
+    keep being measured. Deployments with an open circuit or paused by a 429 are not picked;
+    route_weight 0 keeps a deployment as standby (failover / hedging only).
+    pinned_tenants restricts a deployment to those tenants; a pinned tenant is routed only to
+    its deployments, everyone else only to unpinned ones.
+    """
+    def __init__(self):
+        self._groups: dict[str, tuple[float, list[Deployment]]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._groups.clear()
+
+    def group(self, db, route_group: str) -> list[Deployment]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._groups.get(route_group)
+        if cached and now - cached[0] < settings.LLM_ROUTING_GROUP_TTL_SECONDS:
+            return cached[1]
+        # Deactivated rows (is_active = false) drop out of rotation; the TTL / invalidate() picks up the change
+        rows = db.query(AIModel).filter(AIModel.route_group == route_group, AIModel.is_active.is_(True)).order_by(AIModel.name).all()
+        deployments = [Deployment(row) for row in rows]
+        with self._lock:
+            self._groups[route_group] = (now, deployments)
+        return deployments
+
+    @staticmethod
+    def eligible(deployments: list[Deployment], tenant: str | None) -> list[Deployment]:
+        pinned = [d for d in deployments if tenant and tenant in (d.pinned_tenants or [])]
+        return pinned or [d for d in deployments if not d.pinned_tenants]
+
+    @staticmethod
+    def scores(endpoint: str, deployments: list[Deployment]) -> dict[str, float]:
+        health = {str(d.id): deployment_health.get(deployment_key(endpoint, d)) for d in deployments}
+        p50 = {key: h.percentile(50, min_samples=settings.LLM_ROUTING_MIN_SAMPLES) for key, h in health.items()}
+        known = [latency for latency in p50.values() if latency]
+        fastest = min(known) if known else None
+
+        scores = {}
+        now = time.monotonic()
+        for d in deployments:
+            key = str(d.id)
+            limiter = llm_limiter.get(deployment_key(endpoint, d))
+            if health[key].breaker.is_open() or (limiter and limiter.paused_until > now):
+                scores[key] = 0.0
+                continue
+            latency_factor = fastest / p50[key] if fastest and p50[key] else 1.0 # Unmeasured: explore at full weight
+            error_factor = (1 - health[key].error_rate()) ** 2
+            queued = limiter.waiting if limiter else 0
+            scores[key] = d.weight * latency_factor * error_factor / (1 + queued)
+        return scores
+
+    def route(self, db, ai_model, endpoint: str, tenant=None) -> list:
+        """
+        Candidates for one call, best first: the routed pick, then the rest of the group by score
+        (failover / hedging order). tenant may be a callable, resolved only if the group pins tenants.
+        """
+        route_group = getattr(ai_model, "route_group", None)
+        if not route_group or not settings.LLM_ROUTING_ENABLED:
+            return [ai_model]
+
+        members = self.group(db, route_group)
+        if any(d.pinned_tenants for d in members):
+            tenant = tenant() if callable(tenant) else tenant
+        else:
+            tenant = None
+        candidates = self.eligible(members, tenant)
+        if not candidates:
+            return [ai_model]
+
+        scores = self.scores(endpoint, candidates)
+        ranked = sorted(candidates, key=lambda d: scores[str(d.id)], reverse=True)
+        pool = [d for d in ranked if scores[str(d.id)] > 0]
+        if pool:
+            chosen = random.choices(pool, weights=[scores[str(d.id)] for d in pool])[0]
+            ranked.remove(chosen)
+            ranked.insert(0, chosen)
+        metrics.inc("llm_routed_requests", group=route_group, deployment=ranked[0].deployment_name)
+        return ranked
+
+    def snapshot(self, endpoint: str) -> dict:
+        with self._lock:
+            groups = {name: deployments for name, (_, deployments) in self._groups.items()}
+        result = {}
+        for name, deployments in groups.items():
+            scores = self.scores(endpoint, deployments)
+            result[name] = [{
+                "name": d.name,
+                "deployment": d.deployment_name,
+                "endpoint": d.endpoint,
+                "weight": d.weight,
+                "is_active": d.is_active,
+                "pinned_tenants": d.pinned_tenants or [],
+                "score": round(scores[str(d.id)], 4),
+                **deployment_health.get(deployment_key(endpoint, d)).snapshot()
+            } for d in deployments]
+        return result
+
+llm_router = LLMRouter()
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from app.core.config import settings
+from app.core.metrics import metrics
+
+class OCRCache:
+    """
+    Content-addressed OCR result cache.
+    Key: SHA-256 of the file bytes. Value: format_ocr_result() output (JSON).
+    Backed by a local SQLite file with size-bounded LRU eviction and optional TTL.
+    """
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: int | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or None
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_access ON ocr_cache (last_access)")
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                row = None
+            if row:
+                self._conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (now, key))
+
+        if not row:
+            metrics.inc("ocr_cache_misses")
+            return None
+        metrics.inc("ocr_cache_hits")
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        value = json.dumps(result, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return # Never cache a single entry larger than the whole budget
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        # Drop expired entries, then least-recently-used ones until under budget
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM ocr_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access ASC LIMIT 1").fetchone()
+            if not oldest:
+                break
+            self._conn.execute("DELETE FROM ocr_cache WHERE key = ?", (oldest[0],))
+            total -= oldest[1]
+            metrics.inc("ocr_cache_evictions")
+
+        metrics.set_gauge("ocr_cache_bytes", total)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": metrics.get_counter("ocr_cache_hits"),
+            "misses": metrics.get_counter("ocr_cache_misses")
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_cache")
+
+_cache: OCRCache | None = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache() -> OCRCache | None:
+    """Process-wide cache instance, or None when OCR_CACHE_ENABLED is off."""
+    global _cache
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache(
+                settings.OCR_CACHE_PATH,
+                max_bytes=settings.OCR_CACHE_MAX_MB * 1024 * 1024,
+                ttl_seconds=settings.OCR_CACHE_TTL_SECONDS
+            )
+        return _cache
@@ -0,0 +1,169 @@
+import io
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.config import settings
+
+ENGINES = ("pdfplumber", "pypdf")
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+def is_pdf(content: bytes) -> bool:
+    return content[:1024].lstrip().startswith(b"%PDF")
+
+def _open(source):
+    # Sources are file paths or raw bytes (uploads)
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def page_count(source) -> int:
+    import pypdf
+    return len(pypdf.PdfReader(_open(source)).pages)
+
+def parse_page_range(pages, total: int) -> list[int]:
+    """
+    1-based, inclusive page selection -> 0-based page indexes.
+    Accepts "3", "1-10", "1-3,8,20-" (open end), [1, 2, 5] or None (all pages).
+    """
+    if pages is None or pages == "" or pages == []:
+        return list(range(total))
+    if isinstance(pages, int):
+        pages = [pages]
+
+    selected = []
+    if isinstance(pages, (list, tuple)):
+        selected = [int(p) - 1 for p in pages]
+    else:
+        for part in str(pages).replace(" ", "").split(","):
+            if not part:
+                continue
+            if "-" in part:
+                start, _, end = part.partition("-")
+                first = int(start) if start else 1
+                last = int(end) if end else total
+                selected.extend(range(first - 1, min(last, total)))
+            else:
+                selected.append(int(part) - 1)
+
+    seen = set()
+    indexes = []
+    for index in selected:
+        if index < 0 or index >= total:
+            raise ValueError(f"Page {index + 1} is out of range (document has {total} pages)")
+        if index not in seen:
+            seen.add(index)
+            indexes.append(index)
+    return indexes
+
+def extract_pages(source, indexes: list[int], engine: str = "pdfplumber") -> list[str]:
+    """Text of the given 0-based pages, in order ('' for pages without text)."""
+    if engine == "pypdf":
+        # Fast mode: no layout analysis, good enough for simple text PDFs
+        import pypdf
+        reader = pypdf.PdfReader(_open(source))
+        return [reader.pages[i].extract_text() or "" for i in indexes]
+
+    import pdfplumber
+    texts = []
+    with pdfplumber.open(_open(source)) as pdf:
+        for i in indexes:
+            page = pdf.pages[i]
+            texts.append(page.extract_text() or "")
+            page.close() # Drop the page's cached layout objects
+    return texts
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: safe to use from a threaded server process as well as from a sandbox worker
+            _executor = ProcessPoolExecutor(
+                max_workers=max(settings.PDF_EXTRACT_WORKERS, 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _shards(indexes: list[int], count: int) -> list[list[int]]:
+    size = -(-len(indexes) // count)
+    return [indexes[i:i + size] for i in range(0, len(indexes), size)]
+
+def iter_page_text(file_path, pages=None, engine: str = "pdfplumber", parallel: bool | None = None, chunk_pages: int | None = None):
+    """
+    Yields (page_number, text) in page order, one chunk of pages at a time, so a large PDF
+    can be consumed incrementally. file_path may also be the PDF's bytes. Chunks are extracted in worker processes when the
+    selection has at least PDF_PARALLEL_MIN_PAGES pages (parallel=None) or parallel=True.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine} (expected one of {', '.join(ENGINES)})")
+
+    indexes = parse_page_range(pages, page_count(file_path))
+    workers = max(settings.PDF_EXTRACT_WORKERS, 1)
+    if parallel is None:
+        parallel = workers > 1 and len(indexes) >= settings.PDF_PARALLEL_MIN_PAGES
+    chunk_pages = chunk_pages or settings.PDF_EXTRACT_CHUNK_PAGES
+
+    if not parallel:
+        for start in range(0, len(indexes), chunk_pages):
+            chunk = indexes[start:start + chunk_pages]
+            for index, text in zip(chunk, extract_pages(file_path, chunk, engine)):
+                yield index + 1, text
+        return
+
+    # Enough shards to keep every worker busy, but at most chunk_pages pages per shard
+    shards = _shards(indexes, max(workers, -(-len(indexes) // chunk_pages)))
+    done = 0
+    try:
+        results = _get_executor().map(extract_pages, [file_path] * len(shards), shards, [engine] * len(shards))
+        for chunk, texts in zip(shards, results):
+            for index, text in zip(chunk, texts):
+                yield index + 1, text
+            done += 1
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory): rebuild the pool next time, finish this file serially
+        print("PDF extraction pool broke; continuing serially")
+        _reset_executor()
+        for chunk in shards[done:]:
+            for index, text in zip(chunk, extract_pages(file_path, chunk, engine)):
+                yield index + 1, text
+
+def extract_text(file_path, pages=None, engine: str = "pdfplumber", parallel: bool | None = None) -> str:
+    """Whole text of the selected pages; same layout as before (each non-empty page + newline)."""
+    return "".join(f"{text}\n" for _, text in iter_page_text(file_path, pages, engine, parallel) if text)
+
+class TextLayer:
+    """Per-page text of a PDF and which pages have a usable text layer (born-digital)."""
+    def __init__(self, pages: list[str], min_chars: int):
+        self.pages = pages
+        self.text_pages = [i + 1 for i, text in enumerate(pages) if len(text.strip()) >= min_chars]
+        self.scanned_pages = [i + 1 for i, text in enumerate(pages) if len(text.strip()) < min_chars]
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.pages) and not self.scanned_pages
+
+def read_text_layer(source, min_chars: int | None = None) -> TextLayer:
+    """
+    Fast text-layer check (pypdf, no layout analysis). Pages with fewer than
+    PDF_TEXT_LAYER_MIN_CHARS characters are treated as scanned and need OCR.
+    """
+    min_chars = settings.PDF_TEXT_LAYER_MIN_CHARS if min_chars is None else min_chars
+    return TextLayer([text for _, text in iter_page_text(source, engine="pypdf")], min_chars)
+
+def select_pages(source, page_numbers: list[int]) -> bytes:
+    """New PDF containing only the given 1-based pages (e.g. the scanned ones, for OCR)."""
+    import pypdf
+    reader = pypdf.PdfReader(_open(source))
+    writer = pypdf.PdfWriter()
+    for number in page_numbers:
+        writer.add_page(reader.pages[number - 1])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,157 @@
+import time
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.domain import RunExecution, RunStatus
+
+def claim_next_run(db: Session, worker_name: str = "worker") -> RunExecution | None:
+    """
+    Claims the oldest PENDING run (PENDING -> RUNNING).
+    The conditional UPDATE makes the claim safe across threads and processes:
+    only the worker whose UPDATE matched the row gets it.
+    """
+    candidates = db.execute(
+        select(RunExecution.id)
+        .where(RunExecution.status == RunStatus.PENDING)
+        .order_by(RunExecution.started_at)
+        .limit(5)
+    ).scalars().all()
+
+    for run_id in candidates:
+        now = datetime.utcnow()
+        result = db.execute(
+            update(RunExecution)
+            .where(RunExecution.id == run_id, RunExecution.status == RunStatus.PENDING)
+            .values(status=RunStatus.RUNNING, heartbeat_at=now, attempts=func.coalesce(RunExecution.attempts, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            run = db.get(RunExecution, run_id)
+            submitted = run.started_at or now
+            metrics.observe("run_queue_wait_ms", max((now - submitted).total_seconds() * 1000, 0.0))
+            print(f"[{worker_name}] Claimed run {run_id}")
+            return run
+    return None
+
+def recover_stale_runs(db: Session, stale_minutes: int | None = None, max_attempts: int | None = None) -> int:
+    """
+    Requeues RUNNING runs whose worker stopped heartbeating (crash / restart).
+    Runs that already used max_attempts are failed instead. Returns the number of rows touched.
+    """
+    stale_minutes = stale_minutes or settings.RUN_QUEUE_STALE_MINUTES
+    max_attempts = max_attempts or settings.RUN_QUEUE_MAX_ATTEMPTS
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    stale = (RunExecution.status == RunStatus.RUNNING) & (
+        (RunExecution.heartbeat_at < cutoff) | (RunExecution.heartbeat_at.is_(None))
+    )
+    attempts = func.coalesce(RunExecution.attempts, 0)
+
+    failed = db.execute(
+        update(RunExecution)
+        .where(stale, attempts >= max_attempts)
+        .values(status=RunStatus.FAILED, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requeued = db.execute(
+        update(RunExecution)
+        .where(stale, attempts < max_attempts)
+        .values(status=RunStatus.PENDING, heartbeat_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+
+    if failed or requeued:
+        print(f"Recovered stale runs: {requeued} requeued, {failed} failed")
+    return (failed or 0) + (requeued or 0)
+
+def pending_run_count(db: Session) -> int:
+    return db.query(func.count(RunExecution.id)).filter(RunExecution.status == RunStatus.PENDING).scalar() or 0
+
+class RunWorkerPool:
+    """
+    Background workers that drain PENDING rows of run_executions.
+    The table is the queue, so submitted runs survive restarts and can be
+    drained by in-process workers (app startup) or `python -m app.run_worker`.
+    """
+    def __init__(self, session_factory=None, workers: int | None = None, poll_interval: float | None = None):
+        self.session_factory = session_factory
+        self.workers = settings.RUN_QUEUE_WORKERS if workers is None else workers
+        self.poll_interval = poll_interval or settings.RUN_QUEUE_POLL_SECONDS
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running or self.workers <= 0:
+            return
+        if self.session_factory is None:
+            from app.core.database import SessionLocal
+            self.session_factory = SessionLocal
+
+        db = self.session_factory()
+        try:
+            recover_stale_runs(db)
+        except Exception as e:
+            print(f"Stale run recovery failed: {e}")
+        finally:
+            db.close()
+
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._worker_loop, args=(f"run-worker-{i}",), name=f"run-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 30.0):
+        # Runs in flight finish their current step sequence; unclaimed runs stay PENDING
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wakes idle workers right away (called after submit)."""
+        self._wakeup.set()
+
+    def _worker_loop(self, name: str):
+        while not self._stop.is_set():
+            try:
+                processed = self._process_one(name)
+            except Exception as e:
+                print(f"[{name}] Queue error: {e}")
+                processed = False
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _process_one(self, name: str) -> bool:
+        from app.services.workflow_engine import WorkflowEngine
+
+        db = self.session_factory()
+        try:
+            run = claim_next_run(db, name)
+            if not run:
+                return False
+
+            start = time.perf_counter()
+            run = WorkflowEngine(db).execute_run(run)
+            metrics.observe("run_execution_ms", (time.perf_counter() - start) * 1000)
+            metrics.inc("runs_completed", status=run.status.value)
+            metrics.set_gauge("run_queue_depth", pending_run_count(db))
+            return True
+        finally:
+            db.close()
+
+run_workers = RunWorkerPool()
@@ -0,0 +1,145 @@
+import re
+import math
+import threading
+from collections import Counter
+from sqlalchemy.orm import Session
+from app.models.skill import Skill
+
+# Field weights: a term in the name counts more than one buried in the instructions
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 2
+INSTRUCTIONS_WEIGHT = 1
+# Long SOP bodies would otherwise dominate document length
+MAX_INSTRUCTION_CHARS = 4000
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased ASCII words (snake_case split, whole identifier kept) plus CJK unigrams and
+    bigrams, so Chinese queries match Chinese skill descriptions without a segmenter.
+    """
+    if not text:
+        return []
+    text = text.lower()
+    tokens = []
+    for word in re.findall(r"[a-z0-9_]+", text):
+        parts = _WORD_RE.findall(word)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append(word)
+    for run in _CJK_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def skill_document(skill: Skill) -> list[str]:
+    config = skill.configuration or {}
+    schema = skill.input_schema or {}
+    schema_text = " ".join(f"{k} {v}" for k, v in schema.items()) if isinstance(schema, dict) else str(schema)
+    return (
+        tokenize(skill.name) * NAME_WEIGHT
+        + tokenize(f"{skill.description or ''} {skill.category or ''}") * DESCRIPTION_WEIGHT
+        + tokenize(f"{schema_text} {(config.get('instructions') or '')[:MAX_INSTRUCTION_CHARS]}") * INSTRUCTIONS_WEIGHT
+    )
+
+class SkillIndex:
+    """
+    In-memory BM25 index over active skills (name, description, input_schema, skill.md instructions).
+    sync() only re-tokenizes skills whose indexed fields changed; corpus statistics are
+    recomputed lazily on the next search.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs: dict[str, tuple[int, Counter, int]] = {} # name -> (fingerprint, term freqs, length)
+        self._idf: dict[str, float] = {}
+        self._avgdl = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _fingerprint(skill: Skill) -> int:
+        config = skill.configuration or {}
+        return hash((skill.name, skill.description, skill.category, repr(skill.input_schema), config.get("instructions")))
+
+    def sync(self, skills: list[Skill]) -> int:
+        """Makes the index match this set of skills. Returns how many documents were (re)built or dropped."""
+        changed = 0
+        with self._lock:
+            seen = set()
+            for skill in skills:
+                seen.add(skill.name)
+                fingerprint = self._fingerprint(skill)
+                current = self._docs.get(skill.name)
+                if current and current[0] == fingerprint:
+                    continue
+                terms = skill_document(skill)
+                self._docs[skill.name] = (fingerprint, Counter(terms), len(terms))
+                changed += 1
+
+            for name in list(self._docs):
+                if name not in seen:
+                    del self._docs[name]
+                    changed += 1
+
+            if changed:
+                self._dirty = True
+        return changed
+
+    def sync_from_db(self, db: Session) -> int:
+        return self.sync(db.query(Skill).filter(Skill.is_active == True).all())
+
+    def _refresh_stats(self):
+        n = len(self._docs)
+        df = Counter()
+        total = 0
+        for _, freqs, length in self._docs.values():
+            df.update(freqs.keys())
+            total += length
+        self._idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+        self._avgdl = total / n if n else 0.0
+        self._dirty = False
+
+    def search(self, query: str, names: set[str] | None = None) -> list[tuple[str, float]]:
+        """BM25 scores for the query, best first, optionally restricted to `names`."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if self._dirty:
+                self._refresh_stats()
+            scores = []
+            for name, (_, freqs, length) in self._docs.items():
+                if names is not None and name not in names:
+                    continue
+                score = 0.0
+                for term in terms:
+                    tf = freqs.get(term)
+                    if not tf:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self._avgdl or 1))
+                    score += self._idf.get(term, 0.0) * tf * (self.k1 + 1) / norm
+                scores.append((name, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def shortlist(self, query: str, skills: list[Skill], k: int) -> list[Skill]:
+        """
+        Top-k of `skills` for the query. Skills without any match keep their original order
+        and fill the remaining slots, so the planner always sees at most k tools.
+        """
+        by_name = {s.name: s for s in skills}
+        return [by_name[name] for name in self.shortlist_names(query, [s.name for s in skills], k)]
+
+    def shortlist_names(self, query: str, names: list[str], k: int) -> list[str]:
+        if k <= 0 or len(names) <= k:
+            return list(names)
+        ranked = self.search(query, names=set(names))
+        rank = {name: i for i, (name, score) in enumerate(ranked) if score > 0}
+        ordered = sorted(range(len(names)), key=lambda i: rank.get(names[i], len(rank) + i))
+        return [names[i] for i in ordered[:k]]
+
+skill_index = SkillIndex()
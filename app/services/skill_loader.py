@@ -1,13 +1,30 @@
 import os
+import time
+import asyncio
+import inspect
+import threading
 import importlib.util
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 from app.models.skill import Skill, SkillType
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.database import run_in_session
+from app.services.skill_sandbox import skill_sandbox, uses_sandbox, sandbox_limits
 
 SKILLS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "skills")
 
 import yaml
 
+# Hot skill modules: skill name -> ((run.py path, mtime_ns, size), module)
+# Avoids re-reading/re-compiling run.py (and re-importing its heavy deps) on every call.
+_module_cache: dict[str, tuple[tuple, object]] = {}
+_module_cache_lock = threading.Lock()
+
+# skill.md frontmatter keys that control how a skill runs (copied into Skill.configuration)
+SKILL_RUNTIME_KEYS = ("max_concurrency", "execution", "timeout_seconds", "memory_limit_mb")
+
 def parse_skill_md(file_path: str) -> dict:
     """
     Parses a skill.md file using PyYAML for the frontmatter.
@@ -60,6 +77,19 @@ def parse_skill_md(file_path: str) -> dict:
         
     return metadata
 
+def skill_configuration(skill_dir: str, meta: dict) -> dict:
+    configuration = {
+        "folder_path": skill_dir,
+        "instructions": meta.get("instructions", "")
+    }
+    # Optional response settings (response_mode: direct / response_template / synthesis_max_chars)
+    # and runtime settings (max_concurrency, process sandbox)
+    from app.services.tool_response import RESPONSE_KEYS
+    for key in (*RESPONSE_KEYS, *SKILL_RUNTIME_KEYS):
+        if meta.get(key) is not None:
+            configuration[key] = meta[key]
+    return configuration
+
 def load_skills(db: Session):
     """
     Scans the skills directory and updates the database.
@@ -94,10 +124,7 @@ def load_skills(db: Session):
                             category=category,
                             skill_type=SkillType.PYTHON_FUNC,
                             input_schema=meta.get("input_schema", {}), # ADDED
-                            configuration={
-                                "folder_path": skill_dir,
-                                "instructions": meta.get("instructions", "")
-                            },
+                            configuration=skill_configuration(skill_dir, meta),
                             is_active=True
                         )
                         db.add(new_skill)
@@ -106,10 +133,7 @@ def load_skills(db: Session):
                         existing.description = meta.get("description", "")
                         existing.category = category
                         existing.input_schema = meta.get("input_schema", {}) # ADDED
-                        existing.configuration = {
-                            "folder_path": skill_dir,
-                            "instructions": meta.get("instructions", "")
-                        }
+                        existing.configuration = skill_configuration(skill_dir, meta)
                         existing.is_active = True
                         db.add(existing)
                         
@@ -118,10 +142,55 @@ def load_skills(db: Session):
                     print(f"Failed to load skill {entry.name}: {e}")
                     db.rollback()
 
-def execute_skill(skill_name: str, input_data: dict, db: Session, trace_id: str = None):
+    # Incrementally refresh the planner's tool index (only changed skills are re-tokenized)
+    # and drop cached tool catalogs / planning prompts
+    from app.services.skill_index import skill_index
+    from app.services.tool_catalog import tool_catalog_cache
+    skill_index.sync_from_db(db)
+    tool_catalog_cache.invalidate()
+
+def _file_fingerprint(run_script: str) -> tuple | None:
+    try:
+        stat = os.stat(run_script)
+    except OSError:
+        return None
+    return (run_script, stat.st_mtime_ns, stat.st_size)
+
+def load_skill_module(skill_name: str, run_script: str):
     """
-    Executes a skill by name.
+    Returns the loaded run.py module for a skill, reusing the cached module
+    until the file changes (path, mtime or size differ).
     """
+    fingerprint = _file_fingerprint(run_script)
+
+    with _module_cache_lock:
+        cached = _module_cache.get(skill_name)
+        if cached and fingerprint is not None and cached[0] == fingerprint:
+            return cached[1]
+
+    # Import outside the lock: a slow run.py (heavy deps) must not block loads of other skills
+    spec = importlib.util.spec_from_file_location(f"skill_{skill_name}", run_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if fingerprint is None:
+        return module
+    with _module_cache_lock:
+        cached = _module_cache.get(skill_name)
+        if cached and cached[0] == fingerprint:
+            return cached[1] # Another thread loaded the same file first: share its module
+        _module_cache[skill_name] = (fingerprint, module)
+    return module
+
+def invalidate_skill_module(skill_name: str | None = None):
+    """Drops one cached skill module (or all of them)."""
+    with _module_cache_lock:
+        if skill_name is None:
+            _module_cache.clear()
+        else:
+            _module_cache.pop(skill_name, None)
+
+def _resolve_run_script(skill_name: str, db: Session) -> tuple[Skill, str]:
     skill = db.query(Skill).filter(Skill.name == skill_name).first()
     if not skill or not skill.is_active:
         raise ValueError(f"Skill {skill_name} not found or inactive")
@@ -132,12 +201,12 @@ def execute_skill(skill_name: str, input_data: dict, db: Session, trace_id: str
         if not os.path.exists(folder_path):
              raise ValueError(f"Skill code not found at {folder_path}")
 
-    run_script = os.path.join(folder_path, "run.py")
-    
+    return skill, os.path.join(folder_path, "run.py")
+
+def _start_execution(skill_name: str, input_data: dict, db: Session, trace_id: str | None):
     # --- Logging Start ---
     from app.models.skill import SkillExecution
-    import time
-    
+
     execution_record = SkillExecution(
         skill_name=skill_name,
         input_data=input_data,
@@ -147,6 +216,68 @@ def execute_skill(skill_name: str, input_data: dict, db: Session, trace_id: str
     db.add(execution_record)
     db.commit()
     db.refresh(execution_record)
+    return execution_record
+
+def _error_result(skill_name: str, trace_id: str | None, e: Exception, error_code: str = "SKILL_EXECUTION_FAILED") -> tuple[dict, str]:
+    import traceback
+    logs = f"Error: {str(e)}\n\nTraceback:\n{traceback.format_exc()}"
+    remote_traceback = getattr(e, "remote_traceback", None)
+    if remote_traceback:
+        logs += f"\n\nSandbox worker traceback:\n{remote_traceback}"
+    error_code = getattr(e, "error_code", error_code) # SkillSandboxError: SKILL_TIMEOUT, SKILL_CRASHED, ...
+
+    # Guardrails: Standardized Error Return
+    result = {
+        "status": "error",
+        "error_code": error_code,
+        "message": f"Skill execution failed: {str(e)}",
+        "details": {
+            "skill": skill_name,
+            "trace_id": trace_id
+        }
+    }
+    # Do not raise e, return the structured error so Agent can handle it gracefully
+    return result, logs
+
+def _finish_execution(db: Session, execution_record, status: str, result, logs: str, error_detail: str | None, start_time: float):
+    duration_ms = int((time.time() - start_time) * 1000)
+
+    execution_record.output_data = result if status == "SUCCESS" else {"error": error_detail}
+    execution_record.status = status
+    execution_record.logs = logs
+    execution_record.execution_time_ms = duration_ms # JSON column; an int is valid JSON
+
+    db.add(execution_record)
+    db.commit()
+
+def _execute_function(module):
+    if not hasattr(module, "execute"):
+        raise ValueError("run.py must contain an 'execute(input_data)' function")
+    return module.execute
+
+def _run_coroutine(coro):
+    """
+    Runs an async skill's execute() for a sync caller (worker thread / script).
+    Like LLMGateway.chat_sync, it is scheduled on the app loop when one is running so
+    gateway calls share the pooled connections. Must not be called from the loop thread.
+    """
+    from app.services.gateway import LLMGateway, _running_loop
+
+    if _running_loop() is not None:
+        coro.close()
+        raise RuntimeError("Async skill called via execute_skill() from a running event loop; use 'await execute_skill_async()' instead")
+
+    loop = LLMGateway._loop
+    if loop is not None and loop.is_running():
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    return asyncio.run(coro)
+
+def execute_skill(skill_name: str, input_data: dict, db: Session, trace_id: str = None):
+    """
+    Executes a skill by name (blocking). Async code should use execute_skill_async().
+    """
+    skill, run_script = _resolve_run_script(skill_name, db)
+    execution_record = _start_execution(skill_name, input_data, db, trace_id)
     
     start_time = time.time()
     result = None
@@ -155,46 +286,150 @@ def execute_skill(skill_name: str, input_data: dict, db: Session, trace_id: str
     error_detail = None
 
     try:
-        # Dynamic import
-        spec = importlib.util.spec_from_file_location("skill_module", run_script)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        if hasattr(module, "execute"):
-            result = module.execute(input_data)
+        if uses_sandbox(skill):
+            # CPU-heavy skill: separate process, timeout and memory cap
+            result = skill_sandbox.run(skill_name, run_script, input_data, **sandbox_limits(skill))
         else:
-            raise ValueError("run.py must contain an 'execute(input_data)' function")
+            # Dynamic import (cached until run.py changes)
+            module = load_skill_module(skill_name, run_script)
+            execute = _execute_function(module)
+
+            if inspect.iscoroutinefunction(execute):
+                result = _run_coroutine(execute(input_data))
+            else:
+                result = execute(input_data)
             
     except Exception as e:
         status = "ERROR"
         error_detail = str(e)
-        import traceback
-        logs = f"Error: {str(e)}\n\nTraceback:\n{traceback.format_exc()}"
-        
-        # Guardrails: Standardized Error Return
-        result = {
-            "status": "error",
-            "error_code": "SKILL_EXECUTION_FAILED",
-            "message": f"Skill execution failed: {str(e)}",
-            "details": {
-                "skill": skill_name,
-                "trace_id": trace_id
-            }
-        }
-        # Do not raise e, return the structured error so Agent can handle it gracefully
+        result, logs = _error_result(skill_name, trace_id, e)
     finally:
-        end_time = time.time()
-        duration_ms = int((end_time - start_time) * 1000)
-        
-        execution_record.output_data = result if status == "SUCCESS" else {"error": error_detail}
-        execution_record.status = status
-        execution_record.logs = logs
-        execution_record.execution_time_ms = duration_ms # Mapped as JSON in model but int is fine? Wait, I defined it as JSON in model error.
-        # Fix model first or cast? I defined it as JSON in the previous tool call, which is weird for int. 
-        # Actually I check the previous tool call, I set execution_time_ms: Mapped[int] = mapped_column(JSON... 
-        # Wait, if I say mapped_column(JSON) it expects valid JSON. Integer is valid JSON.
-        
-        db.add(execution_record)
-        db.commit()
+        _finish_execution(db, execution_record, status, result, logs, error_detail, start_time)
     
     return result
+
+# ----------------------------------------------------------------------
+# Async execution: async def execute() is awaited on the loop, sync execute()
+# runs in a bounded thread pool, and every skill has its own in-flight limit.
+# ----------------------------------------------------------------------
+
+_skill_executor: ThreadPoolExecutor | None = None
+_skill_executor_lock = threading.Lock()
+
+def get_skill_executor() -> ThreadPoolExecutor:
+    global _skill_executor
+    with _skill_executor_lock:
+        if _skill_executor is None:
+            _skill_executor = ThreadPoolExecutor(
+                max_workers=max(settings.SKILL_THREAD_POOL_SIZE, 1),
+                thread_name_prefix="skill"
+            )
+        return _skill_executor
+
+def shutdown_skill_executor(wait: bool = True):
+    global _skill_executor
+    with _skill_executor_lock:
+        executor, _skill_executor = _skill_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+def skill_concurrency_limit(skill: Skill) -> int:
+    configured = (skill.configuration or {}).get("max_concurrency")
+    return int(configured) if configured is not None else settings.SKILL_MAX_CONCURRENCY
+
+class SkillConcurrency:
+    """
+    One asyncio.Semaphore per skill, so a slow skill can only occupy its own slots
+    (and at most that many threads of the skill pool). Semaphores are re-created when
+    the limit changes or the event loop is replaced (tests, reloads).
+    """
+    def __init__(self):
+        self._loop = None
+        self._semaphores: dict[str, tuple[int, asyncio.Semaphore]] = {}
+        self._inflight: dict[str, int] = {}
+
+    def semaphore(self, skill_name: str, limit: int) -> asyncio.Semaphore | None:
+        if limit <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores.clear()
+        current = self._semaphores.get(skill_name)
+        if current is None or current[0] != limit:
+            current = (limit, asyncio.Semaphore(limit))
+            self._semaphores[skill_name] = current
+        return current[1]
+
+    def inflight(self, skill_name: str) -> int:
+        return self._inflight.get(skill_name, 0)
+
+    def _track(self, skill_name: str, delta: int):
+        self._inflight[skill_name] = self._inflight.get(skill_name, 0) + delta
+        metrics.set_gauge("skill_inflight", self._inflight[skill_name], skill=skill_name)
+
+skill_concurrency = SkillConcurrency()
+
+async def execute_skill_async(skill_name: str, input_data: dict, db: Session, trace_id: str = None):
+    """
+    Executes a skill by name without blocking the event loop.
+    Waits up to SKILL_QUEUE_TIMEOUT_SECONDS for a free slot, then returns a SKILL_BUSY error.
+    """
+    skill, run_script = await run_in_session(db, _resolve_run_script, skill_name, db)
+    # Read the configuration now: the execution commit expires the row (re-loading it would query on the loop)
+    limit = skill_concurrency_limit(skill)
+    sandbox = sandbox_limits(skill) if uses_sandbox(skill) else None
+    semaphore = skill_concurrency.semaphore(skill_name, limit)
+
+    if semaphore is not None:
+        wait_start = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=settings.SKILL_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            metrics.inc("skill_busy_rejections", skill=skill_name)
+            result, _ = _error_result(skill_name, trace_id, TimeoutError(f"Skill {skill_name} is busy, try again later"), "SKILL_BUSY")
+            return result
+        finally:
+            metrics.observe("skill_queue_wait_ms", (time.perf_counter() - wait_start) * 1000, skill=skill_name)
+
+    skill_concurrency._track(skill_name, 1)
+    try:
+        execution_record = await run_in_session(db, _start_execution, skill_name, input_data, db, trace_id)
+
+        start_time = time.time()
+        result = None
+        status = "SUCCESS"
+        logs = ""
+        error_detail = None
+
+        try:
+            loop = asyncio.get_running_loop()
+            if sandbox is not None:
+                # The pool thread only waits on the worker's pipe; the work runs in another process
+                result = await loop.run_in_executor(
+                    get_skill_executor(),
+                    partial(skill_sandbox.run, skill_name, run_script, input_data, **sandbox)
+                )
+            else:
+                # First load / reload imports run.py (file I/O, module-level code): keep it off the loop
+                module = await asyncio.to_thread(load_skill_module, skill_name, run_script)
+                execute = _execute_function(module)
+
+                if inspect.iscoroutinefunction(execute):
+                    result = await execute(input_data)
+                else:
+                    result = await loop.run_in_executor(get_skill_executor(), execute, input_data)
+
+        except Exception as e:
+            status = "ERROR"
+            error_detail = str(e)
+            result, logs = _error_result(skill_name, trace_id, e)
+        finally:
+            metrics.observe("skill_execution_ms", (time.time() - start_time) * 1000, skill=skill_name)
+            await run_in_session(db, _finish_execution, db, execution_record, status, result, logs, error_detail, start_time)
+
+        return result
+    finally:
+        skill_concurrency._track(skill_name, -1)
+        if semaphore is not None:
+            semaphore.release()
@@ -0,0 +1,265 @@
+import time
+import queue
+import signal
+import asyncio
+import inspect
+import importlib
+import threading
+import traceback
+import multiprocessing
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Seconds a fresh worker may take to import its preloads
+WORKER_STARTUP_TIMEOUT = 60
+
+class SkillSandboxError(RuntimeError):
+    """Sandboxed call failed; error_code is used in the skill's structured error result."""
+    def __init__(self, message: str, error_code: str = "SKILL_EXECUTION_FAILED", remote_traceback: str | None = None):
+        super().__init__(message)
+        self.error_code = error_code
+        self.remote_traceback = remote_traceback
+
+def uses_sandbox(skill) -> bool:
+    """Skills opt in with `execution: process` in skill.md (SKILL_SANDBOX_WORKERS=0 disables the pool)."""
+    return (skill.configuration or {}).get("execution") == "process" and settings.SKILL_SANDBOX_WORKERS > 0
+
+def sandbox_limits(skill) -> dict:
+    config = skill.configuration or {}
+    return {
+        "timeout": config.get("timeout_seconds") or settings.SKILL_SANDBOX_TIMEOUT_SECONDS,
+        "memory_mb": config.get("memory_limit_mb") or settings.SKILL_SANDBOX_MEMORY_MB,
+    }
+
+def preload_modules() -> list[str]:
+    return [name.strip() for name in (settings.SKILL_SANDBOX_PRELOAD or "").split(",") if name.strip()]
+
+# ----------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------
+
+def _set_memory_limit(memory_mb: int | None):
+    try:
+        import resource
+    except ImportError:
+        return # Windows: no RLIMIT_AS; timeouts and crash isolation still apply
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = int(memory_mb) * 1024 * 1024 if memory_mb else resource.RLIM_INFINITY
+    if hard != resource.RLIM_INFINITY and (limit == resource.RLIM_INFINITY or limit > hard):
+        limit = hard
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KB
+
+def _worker_main(conn, preload: list[str]):
+    # The parent owns shutdown; Ctrl+C on the server must not kill a skill mid-call
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Pre-warm: heavy imports are paid once per worker, not per call
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Sandbox preload of {name} failed: {e}")
+
+    from app.services.skill_loader import load_skill_module
+    conn.send("ready")
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        skill_name, run_script, input_data, memory_mb = message
+        _set_memory_limit(memory_mb)
+        try:
+            module = load_skill_module(skill_name, run_script)
+            execute = module.execute
+            if inspect.iscoroutinefunction(execute):
+                result = asyncio.run(execute(input_data))
+            else:
+                result = execute(input_data)
+            reply = ("ok", result, None, None)
+        except MemoryError:
+            reply = ("error", "SKILL_MEMORY_LIMIT", f"Memory limit of {memory_mb} MB exceeded", traceback.format_exc())
+        except Exception as e:
+            reply = ("error", "SKILL_EXECUTION_FAILED", str(e), traceback.format_exc())
+        finally:
+            _set_memory_limit(None)
+
+        try:
+            conn.send((*reply, _peak_rss_mb()))
+        except Exception as e:
+            # e.g. a result that cannot be pickled
+            conn.send(("error", "SKILL_EXECUTION_FAILED", f"Could not return skill result: {e}", traceback.format_exc(), _peak_rss_mb()))
+
+# ----------------------------------------------------------------------
+# Parent side
+# ----------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, ctx, preload: list[str], index: int):
+        self.conn, child_conn = ctx.Pipe()
+        # Not daemonic: skills may start their own worker processes (e.g. pdf page sharding)
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, preload), name=f"skill-sandbox-{index}")
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.ready = False
+
+    def wait_ready(self) -> bool:
+        """Waits for the worker's imports to finish, so warm-up does not count against a call's timeout."""
+        if not self.ready and self.conn.poll(WORKER_STARTUP_TIMEOUT):
+            try:
+                self.ready = self.conn.recv() == "ready"
+            except (EOFError, OSError):
+                pass
+        return self.ready
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+    def close(self, timeout: float = 5.0):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        self.conn.close()
+
+class SkillSandbox:
+    """
+    Pool of pre-warmed worker processes for CPU-heavy skills (pdf, excel_handler, docx_writer).
+    Each call runs in a separate process with its own GIL, under an address-space cap
+    (memory_mb) and a per-call timeout. A worker that times out or dies is killed and
+    replaced; the caller gets a SkillSandboxError instead of losing the API process.
+    Workers are recycled after SKILL_SANDBOX_MAX_TASKS_PER_WORKER calls to bound leaks.
+    """
+    def __init__(self, workers: int | None = None, preload: list[str] | None = None, max_tasks: int | None = None):
+        self.workers = workers
+        self.preload = preload
+        self.max_tasks = max_tasks
+        self._ctx = multiprocessing.get_context("spawn") # No forked DB connections / threads
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._spawned = 0
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            if self.workers is None:
+                self.workers = settings.SKILL_SANDBOX_WORKERS
+            if self.preload is None:
+                self.preload = preload_modules()
+            if self.max_tasks is None:
+                self.max_tasks = settings.SKILL_SANDBOX_MAX_TASKS_PER_WORKER
+            if self.workers <= 0:
+                return
+            for _ in range(self.workers):
+                self._idle.put(self._spawn())
+            self._started = True
+        print(f"Skill sandbox started with {self.workers} workers (preload: {', '.join(self.preload) or 'none'})")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            self._started = False
+            workers = list(self._all)
+            self._all.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for worker in workers:
+            worker.close(timeout)
+
+    def _spawn(self) -> _Worker:
+        # Caller holds self._lock
+        self._spawned += 1
+        worker = _Worker(self._ctx, self.preload, self._spawned)
+        self._all.add(worker)
+        metrics.inc("skill_sandbox_spawned")
+        return worker
+
+    def _release(self, worker: _Worker, reusable: bool):
+        with self._lock:
+            if reusable and self._started and worker.alive and worker.tasks < self.max_tasks:
+                self._idle.put(worker)
+                return
+            self._all.discard(worker)
+            replacement = self._spawn() if self._started else None
+        if reusable:
+            worker.close() # Recycled or pool stopping
+        else:
+            worker.kill() # Timed out / crashed: may be stuck in C code
+        if replacement is not None:
+            self._idle.put(replacement)
+
+    def run(self, skill_name: str, run_script: str, input_data: dict, timeout: float | None = None, memory_mb: int | None = None):
+        """Runs run.py's execute(input_data) in a worker process (blocking). Returns the skill result."""
+        if not self._started:
+            self.start()
+        if not self._started:
+            raise SkillSandboxError("Skill sandbox is disabled (SKILL_SANDBOX_WORKERS=0)")
+        timeout = timeout or settings.SKILL_SANDBOX_TIMEOUT_SECONDS
+
+        try:
+            worker = self._idle.get(timeout=settings.SKILL_QUEUE_TIMEOUT_SECONDS)
+        except queue.Empty:
+            metrics.inc("skill_busy_rejections", skill=skill_name)
+            raise SkillSandboxError("All sandbox workers are busy, try again later", "SKILL_BUSY")
+
+        reusable = False
+        start = time.perf_counter()
+        try:
+            if not worker.wait_ready():
+                metrics.inc("skill_sandbox_crashes", skill=skill_name)
+                raise SkillSandboxError(f"Skill worker failed to start (exit code {worker.process.exitcode})", "SKILL_CRASHED")
+            worker.tasks += 1
+            worker.conn.send((skill_name, run_script, input_data, memory_mb))
+            if not worker.conn.poll(timeout):
+                metrics.inc("skill_sandbox_timeouts", skill=skill_name)
+                raise SkillSandboxError(f"Skill {skill_name} timed out after {timeout}s", "SKILL_TIMEOUT")
+            try:
+                status, payload, message, remote_tb, peak_rss_mb = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(1)
+                metrics.inc("skill_sandbox_crashes", skill=skill_name)
+                raise SkillSandboxError(f"Skill worker crashed (exit code {worker.process.exitcode})", "SKILL_CRASHED")
+
+            reusable = True
+            if peak_rss_mb is not None:
+                metrics.observe("skill_sandbox_peak_rss_mb", peak_rss_mb, skill=skill_name)
+            if status != "ok":
+                raise SkillSandboxError(message, payload, remote_tb)
+            return payload
+        finally:
+            metrics.observe("skill_sandbox_ms", (time.perf_counter() - start) * 1000, skill=skill_name)
+            self._release(worker, reusable)
+
+skill_sandbox = SkillSandbox()
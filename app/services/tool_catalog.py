@@ -0,0 +1,121 @@
+import json
+import time
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.skill import Skill
+from app.models.assistant import Assistant
+from app.services.tool_response import response_spec
+
+# Rendered prompts kept per catalog (one per distinct shortlist)
+MAX_PROMPTS_PER_CATALOG = 64
+
+class ToolCatalog:
+    """
+    Immutable snapshot of what the planner can use for one assistant (or the General Bot):
+    tool names in prompt order, their pre-rendered description lines and the persona.
+    Planning prompts are rendered once per distinct tool set and reused.
+    """
+    def __init__(self, version: int, tool_lines: dict[str, str], base_system_prompt: str | None, render, tool_specs: dict[str, dict] | None = None):
+        self.version = version
+        self.tool_names = list(tool_lines)
+        self.tool_lines = tool_lines
+        self.tool_specs = tool_specs or {} # name -> response settings (tool_response.response_spec)
+        self.base_system_prompt = base_system_prompt
+        self.built_at = time.monotonic()
+        self._render = render
+        self._prompts: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def system_prompt(self, tool_names: list[str] | None = None) -> str:
+        key = tuple(self.tool_names if tool_names is None else tool_names)
+        with self._lock:
+            prompt = self._prompts.get(key)
+            if prompt is None:
+                tools_str = "\n".join(self.tool_lines[name] for name in key if name in self.tool_lines)
+                prompt = self._render(self.base_system_prompt, tools_str)
+                if len(self._prompts) >= MAX_PROMPTS_PER_CATALOG:
+                    self._prompts.pop(next(iter(self._prompts)))
+                self._prompts[key] = prompt
+        return prompt
+
+def render_tool_line(skill: Skill) -> str:
+    # 格式： - name: description (Args: {schema})
+    schema_str = json.dumps(skill.input_schema) if skill.input_schema else "{}"
+    return f"- {skill.name}: {skill.description} (Args: {schema_str})"
+
+class ToolCatalogCache:
+    """
+    Tool catalogs keyed by assistant id (None = General Bot), tagged with a global version.
+    Any committed change to a Skill or Assistant row in this process bumps the version
+    (see the Session hooks below); AGENT_TOOL_CATALOG_TTL_SECONDS bounds staleness for
+    changes made by other processes.
+    """
+    def __init__(self):
+        self._version = 0
+        self._catalogs: dict[str | None, ToolCatalog] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._catalogs.clear()
+
+    def get(self, db: Session, assistant: Assistant | None, render) -> ToolCatalog:
+        key = assistant.id if assistant else None
+        ttl = settings.AGENT_TOOL_CATALOG_TTL_SECONDS
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            version = self._version
+        if catalog and catalog.version == version and (not ttl or time.monotonic() - catalog.built_at < ttl):
+            metrics.inc("tool_catalog_hits")
+            return catalog
+
+        metrics.inc("tool_catalog_misses")
+        catalog = self._build(db, assistant, render, version)
+        with self._lock:
+            if self._version == version:
+                self._catalogs[key] = catalog
+        return catalog
+
+    def _build(self, db: Session, assistant: Assistant | None, render, version: int) -> ToolCatalog:
+        from app.services.skill_index import skill_index
+
+        if assistant and assistant.skills:
+            # If assistant has specific skills assigned, use ONLY those
+            skills = assistant.skills
+            if not len(skill_index):
+                skill_index.sync_from_db(db)
+        else:
+            # Fallback: All active skills (General Bot)
+            skills = db.query(Skill).filter(Skill.is_active == True).all()
+            skill_index.sync(skills) # Only changed skills are re-tokenized
+
+        tool_lines = {s.name: render_tool_line(s) for s in skills}
+        tool_specs = {s.name: response_spec(s.configuration) for s in skills}
+        base_system_prompt = assistant.instruction if assistant and assistant.instruction else None
+        return ToolCatalog(version, tool_lines, base_system_prompt, render, tool_specs)
+
+tool_catalog_cache = ToolCatalogCache()
+
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_change(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Skill, Assistant)):
+            session.info["tool_catalog_dirty"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog_on_commit(session):
+    if session.info.pop("tool_catalog_dirty", False):
+        tool_catalog_cache.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_change(session):
+    session.info.pop("tool_catalog_dirty", None)
@@ -0,0 +1,76 @@
+import json
+from app.core.config import settings
+
+# skill.md frontmatter keys copied into Skill.configuration by load_skills()
+RESPONSE_KEYS = ("response_mode", "response_template", "response_items", "synthesis_max_chars")
+
+# Projection limits for synthesis input
+MAX_STRING_CHARS = 2000
+MAX_LIST_ITEMS = 20
+
+class _Blank(dict):
+    # format_map helper: unknown placeholders render as empty strings
+    def __missing__(self, key):
+        return ""
+
+def response_spec(configuration: dict | None) -> dict:
+    configuration = configuration or {}
+    return {key: configuration[key] for key in RESPONSE_KEYS if configuration.get(key) is not None}
+
+def render_direct(result, spec: dict) -> str | None:
+    """
+    Formats a tool result locally for skills declaring `response_mode: direct`.
+    response_template: str.format-style template over the result's top-level fields;
+    response_items: {"field": <list field>, "template": <per-item template>} rendered into {items}.
+    Returns None when the result cannot be rendered (caller falls back to synthesis).
+    """
+    if isinstance(result, dict) and result.get("error"):
+        return None
+
+    template = spec.get("response_template")
+    if not template:
+        if isinstance(result, str):
+            return result
+        return f"```json\n{json.dumps(project_result(result, settings.AGENT_SYNTHESIS_MAX_RESULT_CHARS), ensure_ascii=False, indent=2)}\n```"
+
+    if not isinstance(result, dict):
+        result = {"result": result}
+    try:
+        fields = _Blank(result)
+        items_spec = spec.get("response_items")
+        if items_spec:
+            items = result.get(items_spec.get("field"), []) or []
+            fields["items"] = "\n".join(
+                items_spec.get("template", "- {value}").format_map(_Blank(item if isinstance(item, dict) else {"value": item}))
+                for item in items
+            )
+        return template.format_map(fields)
+    except (ValueError, AttributeError, IndexError, TypeError) as e:
+        print(f"Response template failed, falling back to synthesis: {e}")
+        return None
+
+def project_result(result, max_chars: int | None = None):
+    """
+    Compact projection of a tool result for the synthesis prompt: long strings are cut,
+    long lists keep their head plus a count, and the whole JSON is capped at max_chars.
+    """
+    max_chars = max_chars or settings.AGENT_SYNTHESIS_MAX_RESULT_CHARS
+    projected = _project(result)
+    text = json.dumps(projected, ensure_ascii=False)
+    if len(text) <= max_chars:
+        return projected
+    return text[:max_chars] + f"…(已截斷，原始長度 {len(text)} 字元)"
+
+def _project(value):
+    if isinstance(value, str):
+        if len(value) > MAX_STRING_CHARS:
+            return value[:MAX_STRING_CHARS] + f"…(已截斷，共 {len(value)} 字元)"
+        return value
+    if isinstance(value, dict):
+        return {k: _project(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        head = [_project(v) for v in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            head.append(f"…(另有 {len(value) - MAX_LIST_ITEMS} 筆)")
+        return head
+    return value
@@ -0,0 +1,143 @@
+import io
+import os
+import asyncio
+import hashlib
+import tempfile
+from app.core.config import settings
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit_bytes: int):
+        super().__init__(f"Upload exceeds the {limit_bytes // (1024 * 1024)} MB limit")
+        self.limit_bytes = limit_bytes
+
+class SpooledUpload:
+    """
+    Upload body kept in memory up to UPLOAD_SPOOL_MEMORY_BYTES, then spooled to a temp file.
+    The SHA-256 (OCR cache key) and size are computed while the body is written, and the
+    content is streamed back out in chunks, so a 50 MB scan never sits in memory as one bytes object.
+    """
+    def __init__(self, memory_limit: int | None = None, max_bytes: int | None = None):
+        self.memory_limit = settings.UPLOAD_SPOOL_MEMORY_BYTES if memory_limit is None else memory_limit
+        self.max_bytes = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self.path: str | None = None
+        self._owns_path = True
+        self._buffer: io.BytesIO | None = io.BytesIO()
+        self._file = None
+        self._hash = hashlib.sha256()
+        self._digest: str | None = None
+
+    @classmethod
+    def from_path(cls, path: str) -> "SpooledUpload":
+        """Wraps an existing local file (hashed in chunks, never copied or deleted)."""
+        upload = cls(memory_limit=0, max_bytes=0)
+        upload.path = path
+        upload._owns_path = False
+        upload._buffer = None
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_BYTES), b""):
+                upload._hash.update(chunk)
+                upload.size += len(chunk)
+        upload._digest = upload._hash.hexdigest()
+        return upload
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self._hash.update(chunk)
+        if self._file is None and self.size > self.memory_limit:
+            fd, self.path = tempfile.mkstemp(prefix="upload-", dir=settings.UPLOAD_SPOOL_DIR or None)
+            self._file = os.fdopen(fd, "w+b")
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        (self._file or self._buffer).write(chunk)
+
+    def finish(self) -> "SpooledUpload":
+        if self._file is not None:
+            self._file.flush()
+        self._digest = self._hash.hexdigest()
+        return self
+
+    @property
+    def sha256(self) -> str:
+        return self._digest or self._hash.hexdigest()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._buffer is not None
+
+    @property
+    def source(self):
+        """bytes (small uploads) or a file path, as accepted by pdf_text."""
+        return self._buffer.getvalue() if self.in_memory else self.path
+
+    def head(self, size: int = 1024) -> bytes:
+        if self.in_memory:
+            return self._buffer.getvalue()[:size]
+        with open(self.path, "rb") as f:
+            return f.read(size)
+
+    def read(self) -> bytes:
+        """Whole body (only for consumers that cannot stream)."""
+        if self.in_memory:
+            return self._buffer.getvalue()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    async def aiter_chunks(self, chunk_size: int | None = None):
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_BYTES
+        if self.in_memory:
+            view = self._buffer.getbuffer()
+            try:
+                for start in range(0, len(view), chunk_size):
+                    yield bytes(view[start:start + chunk_size])
+            finally:
+                view.release()
+            return
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path and self._owns_path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+async def spool_upload(upload, max_bytes: int | None = None) -> SpooledUpload:
+    """
+    Copies a FastAPI UploadFile into a SpooledUpload in UPLOAD_CHUNK_BYTES chunks,
+    rejecting it with UploadTooLarge as soon as it passes max_bytes (UPLOAD_MAX_BYTES).
+    """
+    spooled = SpooledUpload(max_bytes=max_bytes)
+    limit = spooled.max_bytes
+    if limit and upload.size is not None and upload.size > limit:
+        raise UploadTooLarge(limit)
+    try:
+        while True:
+            chunk = await upload.read(settings.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            if spooled.in_memory and spooled.size + len(chunk) <= spooled.memory_limit:
+                spooled.write(chunk)
+            else:
+                await asyncio.to_thread(spooled.write, chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    return spooled.finish()
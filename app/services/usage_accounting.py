@@ -0,0 +1,273 @@
+import time
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, select, insert, delete
+from sqlalchemy.orm import Session
+from app.models.stats import UsageLog, UsageDailyRollup
+from app.models.user import User
+from app.core.config import settings
+from app.core.metrics import metrics
+
+ROLLUP_KEY = ("tenant_id", "user_id", "app_name", "model_name", "day")
+ROLLUP_SUMS = ("request_count", "tokens_input", "tokens_output", "total_tokens", "estimated_cost")
+USAGE_FIELDS = (
+    "user_id", "trace_id", "tenant_id", "app_name", "model_name",
+    "tokens_input", "tokens_output", "total_tokens", "estimated_cost", "timestamp"
+)
+
+def record_usage(db: Session, entry: UsageLog, commit: bool = True):
+    """
+    Single write path for UsageLog rows (Agent, Chat, Workflow).
+    With the background UsageWriter running (app startup), the record is queued and
+    bulk-inserted off the request path. Otherwise (scripts, tests) it is written
+    synchronously: raw log + usage_daily_rollup in the same transaction.
+    """
+    record = {field: getattr(entry, field) for field in USAGE_FIELDS}
+    if record["timestamp"] is None:
+        record["timestamp"] = datetime.utcnow()
+
+    writer = usage_writer
+    if writer.running and writer.enqueue(record):
+        return
+
+    write_usage_batch(db, [record], commit=commit)
+
+def write_usage_batch(db: Session, records: list[dict], commit: bool = True):
+    """Bulk-inserts usage records and folds them into the daily rollup."""
+    _resolve_tenants(db, records)
+    db.execute(insert(UsageLog), records)
+    apply_to_rollup(db, records)
+    if commit:
+        db.commit()
+
+def _resolve_tenants(db: Session, records: list[dict]):
+    # Callers only know the user; attribute usage to the user's tenant (one query per batch)
+    missing = {r["user_id"] for r in records if not r.get("tenant_id") and r.get("user_id")}
+    tenants = {}
+    if missing:
+        tenants = dict(db.query(User.id, User.tenant_id).filter(User.id.in_(missing)).all())
+    for r in records:
+        if not r.get("tenant_id"):
+            r["tenant_id"] = tenants.get(r.get("user_id")) or "default"
+
+def apply_to_rollup(db: Session, records: list[dict]):
+    """Increments the daily rollup rows touched by these usage records (one upsert per key)."""
+    deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_SUMS, 0))
+    for r in records:
+        key = (r.get("tenant_id") or "default", r["user_id"], r["app_name"], r["model_name"], r["timestamp"].date())
+        delta = deltas[key]
+        delta["request_count"] += 1
+        delta["tokens_input"] += r.get("tokens_input") or 0
+        delta["tokens_output"] += r.get("tokens_output") or 0
+        delta["total_tokens"] += r.get("total_tokens") or 0
+        delta["estimated_cost"] += r.get("estimated_cost") or 0.0
+
+    rows = [{**dict(zip(ROLLUP_KEY, key)), **delta} for key, delta in deltas.items()]
+    if rows:
+        _upsert_rollup(db, rows)
+
+def _upsert_rollup(db: Session, rows: list[dict]):
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        table = UsageDailyRollup.__table__
+        for row in rows:
+            stmt = dialect_insert(table).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(ROLLUP_KEY),
+                set_={col: table.c[col] + stmt.excluded[col] for col in ROLLUP_SUMS}
+            )
+            db.execute(stmt)
+        return
+
+    # Generic fallback: read-modify-write
+    for row in rows:
+        existing = db.query(UsageDailyRollup).filter_by(**{k: row[k] for k in ROLLUP_KEY}).first()
+        if existing:
+            for col in ROLLUP_SUMS:
+                setattr(existing, col, (getattr(existing, col) or 0) + row[col])
+        else:
+            db.add(UsageDailyRollup(**row))
+    db.flush()
+
+def backfill_rollup(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """
+    Rebuilds usage_daily_rollup from raw usage_logs for [start, end] (whole history if omitted).
+    Returns the number of rollup rows written.
+    """
+    day = func.date(UsageLog.timestamp)
+
+    delete_stmt = delete(UsageDailyRollup)
+    source = select(
+        func.coalesce(UsageLog.tenant_id, "default"),
+        UsageLog.user_id,
+        UsageLog.app_name,
+        UsageLog.model_name,
+        day,
+        func.count(UsageLog.id),
+        func.coalesce(func.sum(UsageLog.tokens_input), 0),
+        func.coalesce(func.sum(UsageLog.tokens_output), 0),
+        func.coalesce(func.sum(UsageLog.total_tokens), 0),
+        func.coalesce(func.sum(UsageLog.estimated_cost), 0.0)
+    )
+
+    if start:
+        delete_stmt = delete_stmt.where(UsageDailyRollup.day >= start)
+        source = source.where(UsageLog.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end:
+        delete_stmt = delete_stmt.where(UsageDailyRollup.day <= end)
+        source = source.where(UsageLog.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    source = source.group_by(
+        func.coalesce(UsageLog.tenant_id, "default"), UsageLog.user_id, UsageLog.app_name, UsageLog.model_name, day
+    )
+
+    db.execute(delete_stmt)
+    result = db.execute(insert(UsageDailyRollup).from_select(list(ROLLUP_KEY + ROLLUP_SUMS), source))
+    db.commit()
+    return result.rowcount or 0
+
+def ensure_rollup(db: Session):
+    """
+    Backfills raw usage_logs history the rollup does not cover yet (run at startup).
+    The rollup is maintained incrementally from its first deploy on, so any gap is the raw history
+    before its earliest day: rebuild up to that day (or everything, if the rollup is still empty).
+    A rollup wiped or edited by hand mid-range needs app/backfill_usage_rollup.py.
+    """
+    first_log = db.query(func.min(UsageLog.timestamp)).scalar()
+    if first_log is None:
+        return
+    first_rollup_day = db.query(func.min(UsageDailyRollup.day)).scalar()
+    if first_rollup_day is None:
+        rows = backfill_rollup(db)
+    elif first_log.date() < first_rollup_day:
+        rows = backfill_rollup(db, start=first_log.date(), end=first_rollup_day - timedelta(days=1))
+    else:
+        return
+    print(f"Backfilled usage_daily_rollup ({rows} rows)")
+
+class UsageWriter:
+    """
+    Buffers usage records in memory and bulk-inserts them from a background thread,
+    flushing every USAGE_WRITER_BATCH_SIZE records or USAGE_WRITER_FLUSH_MS milliseconds.
+    Started/stopped with the app; stop() drains the queue before returning.
+    """
+    def __init__(self, session_factory=None, batch_size: int | None = None, flush_interval_ms: int | None = None, max_queue: int | None = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.USAGE_WRITER_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.USAGE_WRITER_FLUSH_MS) / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue or settings.USAGE_WRITER_MAX_QUEUE)
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        if self.session_factory is None:
+            from app.core.database import SessionLocal
+            self.session_factory = SessionLocal
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        if not self.running:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def enqueue(self, record: dict) -> bool:
+        """Queues a record; returns False when the buffer is full (caller writes synchronously)."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("usage_writer_overflow")
+            return False
+        depth = self._queue.qsize()
+        metrics.set_gauge("usage_writer_queue_depth", depth)
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            while batch:
+                self._flush(batch)
+                batch = self._drain(self.batch_size) if len(batch) == self.batch_size else []
+
+        # Shutdown: drain everything that is left
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _collect_batch(self) -> list[dict]:
+        # Sleep until the interval elapses, a full batch is queued, or stop() is called
+        self._wakeup.wait(self.flush_interval)
+        self._wakeup.clear()
+        return self._drain(self.batch_size)
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list[dict]):
+        """
+        Writes a batch, retrying with backoff (DB restart, lock timeout). If it still fails,
+        records are written one by one so a single bad record does not drop the whole batch.
+        """
+        start = time.perf_counter()
+        try:
+            attempts = max(settings.USAGE_WRITER_RETRY_ATTEMPTS, 1)
+            for attempt in range(attempts):
+                if attempt:
+                    metrics.inc("usage_writer_flush_retries")
+                    time.sleep(settings.USAGE_WRITER_RETRY_DELAY * (2 ** (attempt - 1)))
+                error = self._write(batch)
+                if error is None:
+                    metrics.inc("usage_writer_flushed_records", len(batch))
+                    return
+                print(f"Failed to flush {len(batch)} usage records (attempt {attempt + 1}/{attempts}): {error}")
+
+            written = sum(1 for record in batch if self._write([record]) is None)
+            metrics.inc("usage_writer_flushed_records", written)
+            if written < len(batch):
+                metrics.inc("usage_writer_dropped_records", len(batch) - written)
+                print(f"Dropped {len(batch) - written} of {len(batch)} usage records")
+        finally:
+            metrics.observe("usage_writer_flush_ms", (time.perf_counter() - start) * 1000)
+            metrics.set_gauge("usage_writer_queue_depth", self._queue.qsize())
+
+    def _write(self, records: list[dict]) -> Exception | None:
+        db = self.session_factory()
+        try:
+            write_usage_batch(db, records)
+            return None
+        except Exception as e:
+            db.rollback()
+            return e
+        finally:
+            db.close()
+
+usage_writer = UsageWriter()
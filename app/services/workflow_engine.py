@@ -1,141 +1,366 @@
 from datetime import datetime, timezone
 from uuid import UUID
-from sqlalchemy.orm import Session
-from app.models.domain import Workflow, RunExecution, RunStatus, Component
+from sqlalchemy.orm import Session, selectinload
+from app.models.domain import Workflow, RunExecution, RunStatus, Component, AIModel
 from app.models.skill import Skill, SkillType
 from app.schemas.all import RunExecutionCreate
 import json
 
+class RunPlan:
+    """
+    Everything a run needs from the DB (components, their skills, AIModels), loaded up front
+    in a few IN queries and detached from the Session, so steps (and DAG worker threads)
+    execute from memory.
+    """
+    def __init__(self, components: dict, models: dict, default_model: AIModel | None):
+        self.components = components
+        self.models = models
+        self.default_model = default_model
+
+    def component(self, comp_id) -> Component | None:
+        return self.components.get(str(comp_id))
+
+    def model(self, model_id: str | None = None) -> AIModel:
+        # Same resolution as LLMGateway.resolve_model: explicit id, else the active model
+        ai_model = self.models.get(str(model_id)) if model_id else None
+        ai_model = ai_model or self.default_model
+        if not ai_model:
+            raise ValueError("No active AIModel configuration found.")
+        return ai_model
+
 class WorkflowEngine:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, plan: RunPlan | None = None):
         self.db = db
+        self.plan = plan
 
     def run_workflow(self, workflow_id: UUID, input_payload: dict, user_id: int | None = None, task_package_id: UUID | None = None) -> RunExecution:
+        # Inline execution: create the run and execute it in this thread
+        run_record = self.create_run(workflow_id, input_payload, user_id, task_package_id, status=RunStatus.RUNNING)
+        return self.execute_run(run_record)
+
+    def submit_run(self, workflow_id: UUID, input_payload: dict, user_id: int | None = None, task_package_id: UUID | None = None) -> RunExecution:
+        # Queued execution: the run stays PENDING until a run_queue worker claims it
+        return self.create_run(workflow_id, input_payload, user_id, task_package_id, status=RunStatus.PENDING)
+
+    def create_run(self, workflow_id: UUID, input_payload: dict, user_id: int | None = None, task_package_id: UUID | None = None, status: RunStatus = RunStatus.PENDING) -> RunExecution:
         # 1. Fetch workflow
         workflow = self.db.query(Workflow).filter(Workflow.id == workflow_id).first()
         if not workflow:
             raise ValueError(f"Workflow {workflow_id} not found")
 
-        # 1.1 Fetch TaskPackage (Business Context) if provided
-        manual_context = None
-        task_package_name = None
-        
-        if task_package_id:
-            from app.models.task import TaskPackage
-            tp = self.db.query(TaskPackage).filter(TaskPackage.id == task_package_id).first()
-            if tp and tp.manual_content:
-                manual_context = tp.manual_content
-                task_package_name = tp.name
-
-        # 2. Create RunExecution record
+        # 2. Create RunExecution record (everything a worker needs to execute it later)
         run_record = RunExecution(
             workflow_id=workflow_id,
-            status=RunStatus.RUNNING,
+            status=status,
             input_payload=input_payload,
+            user_id=user_id,
+            task_package_id=task_package_id,
             log=[],
-            started_at=datetime.now(timezone.utc)
+            started_at=datetime.utcnow(), # run_executions timestamps are naive UTC (DateTime columns), like the queue cutoffs
+            heartbeat_at=datetime.utcnow() if status == RunStatus.RUNNING else None
         )
         self.db.add(run_record)
         self.db.commit()
         self.db.refresh(run_record)
+        return run_record
+
+    def execute_run(self, run_record: RunExecution) -> RunExecution:
+        workflow = self.db.query(Workflow).filter(Workflow.id == run_record.workflow_id).first()
+        input_payload = run_record.input_payload
+        user_id = run_record.user_id
+        logs = []
+
+        # Fetch TaskPackage (Business Context) if provided
+        manual_context = None
+        task_package_name = None
+        
+        if run_record.task_package_id:
+            from app.models.task import TaskPackage
+            tp = self.db.query(TaskPackage).filter(TaskPackage.id == run_record.task_package_id).first()
+            if tp and tp.manual_content:
+                manual_context = tp.manual_content
+                task_package_name = tp.name
 
         try:
+            if not workflow:
+                raise ValueError(f"Workflow {run_record.workflow_id} not found")
+
             # 3. Dynamic Execution
             current_data = input_payload
-            previous_step_output = {}
-            logs = []
             
             # Map steps for random access
             # Valid steps format: list of dicts. We assume step_id is unique int.
             steps_map = {s.get('step_id'): s for s in workflow.steps}
             sorted_step_ids = sorted(steps_map.keys())
+            self.plan = self._plan_run(steps_map.values())
             
             if not sorted_step_ids:
                  pass # Empty workflow
             
-            current_step_id = sorted_step_ids[0] if sorted_step_ids else None
-            steps_run_count = 0
-            MAX_STEPS = 50 # Prevent infinite loops
-
-            while current_step_id is not None:
-                if steps_run_count > MAX_STEPS:
-                    raise RuntimeError("Workflow exceeded maximum step limit (infinite loop detection)")
-                
-                step = steps_map.get(current_step_id)
-                if not step:
-                    break # Should not happen if logic is correct
-
-                steps_run_count += 1
-                comp_id = step.get('component_id')
-                
-                # Fetch component
-                component = self.db.query(Component).filter(Component.id == comp_id).first()
-                if not component:
-                    raise ValueError(f"Component {comp_id} not found")
-
-                comp_name = component.name
-                
-                # Resolve Inputs
-                step_input = {
-                    "original_input": input_payload,
-                    "prev_output": previous_step_output
-                }
-
-                # Resolve Effective Input
-                effective_input = {}
-                effective_input.update(input_payload)
-                if isinstance(previous_step_output, dict):
-                    effective_input.update(previous_step_output)
-
-                # Execution
-                start_time = datetime.now(timezone.utc)
-                try:
-                    output_data = self.execute_step(component, effective_input, user_id, manual_context)
-                    status = "success"
-                    error_msg = None
-                except Exception as step_e:
-                    output_data = None
-                    status = "failed"
-                    error_msg = str(step_e)
-                    # For MVP, stop on failure
-                    # In future, we could have failure handlers in 'next_step_selector'
-                    raise step_e
-
-                step_log = {
-                    "step_id": current_step_id,
-                    "component": comp_name,
-                    "status": status,
-                    "input": step_input,
-                    "output": output_data,
-                    "error": error_msg,
-                    "timestamp": start_time.isoformat(),
-                    "duration_ms": (datetime.now(timezone.utc) - start_time).total_seconds() * 1000,
-                    "used_manual": task_package_name if manual_context else None,
-                }
-                logs.append(step_log)
-                
-                # Update context
-                previous_step_output = output_data
-
-                # Determine Next Step
-                current_step_id = self._determine_next_step(step, output_data, sorted_step_ids)
+            if any(step.get('depends_on') for step in steps_map.values()):
+                # DAG mode: independent steps run concurrently
+                previous_step_output = self._run_dag(run_record, steps_map, input_payload, user_id, manual_context, task_package_name, logs)
+            else:
+                previous_step_output = self._run_linear(run_record, steps_map, sorted_step_ids, input_payload, user_id, manual_context, task_package_name, logs)
 
             # 4. Finalize Success
             run_record.status = RunStatus.SUCCESS
             run_record.output_payload = previous_step_output
             run_record.log = logs
-            run_record.finished_at = datetime.now(timezone.utc)
+            run_record.finished_at = datetime.utcnow()
 
         except Exception as e:
             # Handle Failure
             run_record.status = RunStatus.FAILED
             run_record.log = logs + [{"error": str(e), "timestamp": datetime.now(timezone.utc).isoformat()}]
-            run_record.finished_at = datetime.now(timezone.utc)
+            run_record.finished_at = datetime.utcnow()
         
         self.db.commit()
         self.db.refresh(run_record)
         return run_record
 
+    def _run_linear(self, run_record: RunExecution, steps_map: dict, sorted_step_ids: list, input_payload: dict, user_id: int | None, manual_context: str | None, task_package_name: str | None, logs: list[dict]):
+        # Sequential mode: one step at a time, next_step_id / condition / sequential fallback
+        previous_step_output = {}
+        current_step_id = sorted_step_ids[0] if sorted_step_ids else None
+        steps_run_count = 0
+        MAX_STEPS = 50 # Prevent infinite loops
+
+        while current_step_id is not None:
+            if steps_run_count > MAX_STEPS:
+                raise RuntimeError("Workflow exceeded maximum step limit (infinite loop detection)")
+            
+            step = steps_map.get(current_step_id)
+            if not step:
+                break # Should not happen if logic is correct
+
+            steps_run_count += 1
+            comp_id = step.get('component_id')
+            
+            # Component (+ skill) from the run plan
+            component = self.plan.component(comp_id)
+            if not component:
+                raise ValueError(f"Component {comp_id} not found")
+
+            comp_name = component.name
+            
+            # Resolve Inputs
+            step_input = {
+                "original_input": input_payload,
+                "prev_output": previous_step_output
+            }
+
+            # Resolve Effective Input
+            effective_input = {}
+            effective_input.update(input_payload)
+            if isinstance(previous_step_output, dict):
+                effective_input.update(previous_step_output)
+
+            # Execution
+            start_time = datetime.now(timezone.utc)
+            try:
+                output_data = self.execute_step(component, effective_input, user_id, manual_context)
+                status = "success"
+                error_msg = None
+            except Exception as step_e:
+                output_data = None
+                status = "failed"
+                error_msg = str(step_e)
+                # For MVP, stop on failure
+                # In future, we could have failure handlers in 'next_step_selector'
+                raise step_e
+
+            step_log = {
+                "step_id": current_step_id,
+                "component": comp_name,
+                "status": status,
+                "input": step_input,
+                "output": output_data,
+                "error": error_msg,
+                "timestamp": start_time.isoformat(),
+                "duration_ms": (datetime.now(timezone.utc) - start_time).total_seconds() * 1000,
+                "used_manual": task_package_name if manual_context else None,
+            }
+            logs.append(step_log)
+            self._save_progress(run_record, logs)
+            
+            # Update context
+            previous_step_output = output_data
+
+            # Determine Next Step
+            current_step_id = self._determine_next_step(step, output_data, sorted_step_ids)
+
+        return previous_step_output
+
+    def _run_dag(self, run_record: RunExecution, steps_map: dict, input_payload: dict, user_id: int | None, manual_context: str | None, task_package_name: str | None, logs: list[dict]):
+        """
+        DAG mode (any step declares "depends_on": [step_id, ...]).
+        A step becomes ready once all of its dependencies succeeded; ready steps run concurrently
+        (up to WORKFLOW_MAX_PARALLEL_STEPS), each in its own DB session. A step's input is the run
+        input merged with its dependencies' outputs (in depends_on order). The run output is the
+        output of the single sink step, or the merged outputs of all sinks.
+        next_step_id / condition are not used in this mode.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        from app.core.config import settings
+
+        deps = self._dag_dependencies(steps_map)
+        sinks = [step_id for step_id in sorted(steps_map) if not any(step_id in d for d in deps.values())]
+        outputs = {}
+        running = {}
+        failure = None
+
+        with ThreadPoolExecutor(max_workers=max(1, settings.WORKFLOW_MAX_PARALLEL_STEPS), thread_name_prefix="workflow-step") as pool:
+            while True:
+                if failure is None:
+                    for step_id in sorted(steps_map):
+                        if step_id in outputs or step_id in running.values():
+                            continue
+                        if all(d in outputs for d in deps[step_id]):
+                            dep_outputs = {d: outputs[d] for d in deps[step_id]}
+                            future = pool.submit(self._run_step_isolated, steps_map[step_id], input_payload, dep_outputs, user_id, manual_context)
+                            running[future] = step_id
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: running[f]):
+                    step_id = running.pop(future)
+                    step_log, output_data, error = future.result()
+                    step_log["used_manual"] = task_package_name if manual_context else None
+                    logs.append(step_log)
+                    if error is not None:
+                        # Stop scheduling; steps already in flight are allowed to finish
+                        failure = failure or error
+                    else:
+                        outputs[step_id] = output_data
+                self._save_progress(run_record, logs)
+
+        if failure is not None:
+            raise failure
+
+        if len(sinks) == 1:
+            return outputs[sinks[0]]
+        merged = {}
+        for step_id in sinks:
+            if isinstance(outputs[step_id], dict):
+                merged.update(outputs[step_id])
+        return merged
+
+    def _dag_dependencies(self, steps_map: dict) -> dict:
+        # Validates depends_on references and rejects cycles (Kahn's algorithm)
+        deps = {}
+        for step_id, step in steps_map.items():
+            deps[step_id] = list(step.get('depends_on') or [])
+            for d in deps[step_id]:
+                if d not in steps_map:
+                    raise ValueError(f"Step {step_id} depends on unknown step {d}")
+
+        remaining = {step_id: set(d) for step_id, d in deps.items()}
+        while remaining:
+            ready = [step_id for step_id, d in remaining.items() if not d]
+            if not ready:
+                raise ValueError(f"Workflow steps have a dependency cycle: {sorted(remaining)}")
+            for step_id in ready:
+                del remaining[step_id]
+            for d in remaining.values():
+                d.difference_update(ready)
+        return deps
+
+    def _run_step_isolated(self, step: dict, input_payload: dict, dep_outputs: dict, user_id: int | None, manual_context: str | None):
+        """
+        Runs one DAG step on a worker thread with its own Session (Sessions are not thread-safe).
+        Returns (step_log, output, error) instead of raising so the scheduler can record the failure.
+        """
+        from sqlalchemy.orm import sessionmaker
+
+        db = sessionmaker(bind=self.db.get_bind(), autoflush=False)()
+        start_time = datetime.now(timezone.utc)
+        output_data = None
+        error = None
+        comp_name = None
+        try:
+            comp_id = step.get('component_id')
+            component = self.plan.component(comp_id)
+            if not component:
+                raise ValueError(f"Component {comp_id} not found")
+            comp_name = component.name
+
+            effective_input = {}
+            effective_input.update(input_payload)
+            for output in dep_outputs.values():
+                if isinstance(output, dict):
+                    effective_input.update(output)
+
+            output_data = WorkflowEngine(db, plan=self.plan).execute_step(component, effective_input, user_id, manual_context)
+        except Exception as step_e:
+            error = step_e
+        finally:
+            db.close()
+
+        step_log = {
+            "step_id": step.get('step_id'),
+            "component": comp_name,
+            "status": "failed" if error else "success",
+            "input": {
+                "original_input": input_payload,
+                "dep_outputs": {str(k): v for k, v in dep_outputs.items()}
+            },
+            "output": output_data,
+            "error": str(error) if error else None,
+            "timestamp": start_time.isoformat(),
+            "duration_ms": (datetime.now(timezone.utc) - start_time).total_seconds() * 1000,
+        }
+        return step_log, output_data, error
+
+    def _plan_run(self, steps) -> RunPlan:
+        """
+        Loads all referenced components with their skills (2 queries) and every AIModel
+        the LLM steps can use plus the active default (1 query), then detaches them.
+        """
+        comp_ids = {UUID(str(step.get('component_id'))) for step in steps if step.get('component_id')}
+        components = []
+        if comp_ids:
+            components = (
+                self.db.query(Component)
+                .options(selectinload(Component.skill))
+                .filter(Component.id.in_(comp_ids))
+                .all()
+            )
+
+        model_ids = set()
+        for component in components:
+            for config in (component.configuration, component.skill.configuration if component.skill else None):
+                if config and config.get("model_id"):
+                    try:
+                        model_ids.add(UUID(str(config["model_id"])))
+                    except ValueError:
+                        pass # Unknown id format: falls back to the active model, like resolve_model
+
+        model_filter = AIModel.is_active == True
+        if model_ids:
+            model_filter = model_filter | AIModel.id.in_(model_ids)
+        models = self.db.query(AIModel).filter(model_filter).all()
+        default_model = next((m for m in models if m.is_active), None)
+
+        # Detach so commits (progress saves) don't expire them and threads can read them safely
+        skills = {id(c.skill): c.skill for c in components if c.skill}
+        for obj in [*components, *skills.values(), *models]:
+            self.db.expunge(obj)
+
+        return RunPlan(
+            components={str(c.id): c for c in components},
+            models={str(m.id): m for m in models},
+            default_model=default_model
+        )
+
+    def _save_progress(self, run_record: RunExecution, logs: list[dict]):
+        # Persist per-step logs so GET /runs/{id} reflects progress; also the worker heartbeat
+        run_record.log = list(logs)
+        run_record.heartbeat_at = datetime.utcnow()
+        self.db.commit()
+
     def execute_step(self, component: Component, input_data: dict, user_id: int | None = None, manual_context: str | None = None) -> dict:
         # Priority: Skill-based execution
         if component.skill_id and component.skill:
@@ -207,67 +432,34 @@ class WorkflowEngine:
             raise ValueError(f"Unsupported method {method}")
 
     def _run_azure_openai(self, config: dict, input_data: dict, user_id: int | None, app_name: str) -> dict:
-        import httpx
-        import os
-        from app.models.domain import AIModel
         from app.models.stats import UsageLog
+        from app.services.gateway import LLMGateway
+        from app.services.usage_accounting import record_usage
 
-        # 1. Determine Model Info
-        target_model_id = config.get("model_id")
-        ai_model = None
-        
-        if target_model_id:
-            ai_model = self.db.query(AIModel).filter(AIModel.id == target_model_id).first()
-        
-        if not ai_model:
-            ai_model = self.db.query(AIModel).filter(AIModel.is_active == True).first()
-        
-        if not ai_model:
-            raise ValueError("No AIModel configuration found (active or specified)")
+        gateway = LLMGateway(self.db)
 
-        # 2. Get Credentials
-        api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        
-        if not api_key or not endpoint:
-            raise ValueError("Missing AZURE_OPENAI_API_KEY or AZURE_OPENAI_ENDPOINT in environment")
-
-        # 3. Construct URL
-        endpoint = endpoint.rstrip('/')
-        deployment = ai_model.deployment_name
-        api_version = ai_model.api_version
-        url = f"{endpoint}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
-        
-        # 4. Prepare Payload
-        req_payload = {}
+        # 1. Determine Model Info (prefetched by the run plan when available)
+        ai_model = self.plan.model(config.get("model_id")) if self.plan else gateway.resolve_model(config.get("model_id"))
+
+        # 2. Prepare Messages
         if "messages" in input_data:
-            req_payload = input_data
+            messages = input_data["messages"]
+            temperature = input_data.get("temperature", config.get("temperature", 0.7))
         else:
             user_content = input_data.get("prompt") or json.dumps(input_data)
             # Support template from config
             system_prompt = config.get("system_template") or config.get("system_prompt") or "You are a helpful AI assistant."
-            
-            req_payload = {
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                "temperature": config.get("temperature", 0.7)
-            }
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ]
+            temperature = config.get("temperature", 0.7)
 
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": api_key
-        }
-
-        response = httpx.post(url, json=req_payload, headers=headers, timeout=60.0)
-        
-        if response.status_code != 200:
-                raise ValueError(f"Azure API Error: {response.text}")
-        
-        json_response = response.json()
+        # 3. Call via the shared gateway pool (blocking: this engine runs in a worker thread)
+        # Step config "cache": true/false forces the response cache on/off (default: deterministic calls only)
+        json_response = gateway.chat_sync(messages, temperature=temperature, ai_model=ai_model, cache=config.get("cache"), user_id=user_id)
 
-        # 5. Log Token Usage
+        # 4. Log Token Usage
         if user_id:
             usage = json_response.get("usage", {})
             prompt_tokens = usage.get("prompt_tokens", 0)
@@ -286,8 +478,7 @@ class WorkflowEngine:
                 total_tokens=total_tokens,
                 estimated_cost=estimated_cost
             )
-            self.db.add(log_entry)
-            self.db.commit()
+            record_usage(self.db, log_entry)
 
         return json_response
 
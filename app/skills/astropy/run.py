@@ -1,8 +1,9 @@
 import json
-import httpx
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.gateway import LLMGateway
 
-def execute(input_data: dict) -> dict:
+async def execute(input_data: dict) -> dict:
     """
     Executes an Astropy task.
     Input: {"query": "..."}
@@ -22,46 +23,28 @@ def execute(input_data: dict) -> dict:
     
     user_prompt = f"Question: {query}\n\nPlease provide a solution:"
 
-    # Call LLM
-    api_key = settings.AZURE_OPENAI_API_KEY
-    endpoint = settings.AZURE_OPENAI_ENDPOINT
-    deployment = getattr(settings, "AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4.1")
-    api_version = getattr(settings, "AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
-
-    if not api_key:
+    if not (settings.AZURE_OPENAI_API_KEY or settings.AZURE_OPENAI_KEY):
          return {"error": "No Azure API Key"}
 
-    url = f"{endpoint}openai/deployments/{deployment}/chat/completions?api-version={api_version}"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": api_key
-    }
-    
-    payload = {
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": 0.2,
-        "max_tokens": 1000
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
+    # Call LLM through the shared gateway (pooled async client, does not block the event loop)
+    db = SessionLocal()
     try:
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(url, headers=headers, json=payload)
-            if resp.status_code != 200:
-                raise ValueError(f"LLM Error: {resp.text}")
-            
-            result = resp.json()
-            content = result['choices'][0]['message']['content']
-            
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-                
-            return json.loads(content)
-            
+        result = await LLMGateway(db).chat(messages, temperature=0.2, max_tokens=1000)
+        content = result['choices'][0]['message']['content']
+
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        return json.loads(content)
+
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        db.close()
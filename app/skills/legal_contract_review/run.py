@@ -1,13 +1,12 @@
 import json
-import asyncio
-from app.services.azure_integration import call_azure_openai, call_azure_ocr
 from app.core.database import SessionLocal
+from app.services.gateway import LLMGateway
 # We might need to handle file reading if file_url is actually a local path or we need to download it.
 # For simplicity, assuming 'text' is provided OR we simulate OCR call if we had a file handling logic here.
 # Since we don't have a standardized "download" tool yet, we will focus on 'text' input 
 # BUT we will check if 'file_url' is passed to simulate the orchestration.
 
-def execute(input_data: dict) -> dict:
+async def execute(input_data: dict) -> dict:
     """
     Reviews a contract.
     Input: {"text": "..."} OR {"file_url": "..."}
@@ -23,7 +22,7 @@ def execute(input_data: dict) -> dict:
         import os
         if os.path.exists(file_url):
             # It's a local file, let's OCR it!
-            # Since call_azure_ocr is async, we need the async/sync hack again or just read text if it's txt.
+            # execute() is async, so call_azure_ocr could be awaited here directly.
             # Assuming PDF/Image -> OCR.
              pass 
         else:
@@ -77,51 +76,31 @@ def execute(input_data: dict) -> dict:
     
     user_prompt = f"合約內容:\n{text}\n\n請分析:"
 
-    # 3. Call LLM (Sync Wrapper)
+    # 3. Call LLM (async, through the shared gateway)
     from app.core.config import settings
-    import httpx
 
-    api_key = settings.AZURE_OPENAI_API_KEY
-    endpoint = settings.AZURE_OPENAI_ENDPOINT
-    # Use getattr to avoid AttributeError if server config is stale (not reloaded)
-    deployment = getattr(settings, "AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4.1")
-    api_version = getattr(settings, "AZURE_OPENAI_API_VERSION", "2024-12-01-preview")
-
-    if not api_key:
+    if not (settings.AZURE_OPENAI_API_KEY or settings.AZURE_OPENAI_KEY):
          return {"error": "No Azure API Key", "text": text}
 
-    url = f"{endpoint}openai/deployments/{deployment}/chat/completions?api-version={api_version}"
-    
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": api_key
-    }
-    
-    payload = {
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "temperature": 0.1,
-        "max_tokens": 1500
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
+    db = SessionLocal()
     try:
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(url, headers=headers, json=payload)
-            if resp.status_code != 200:
-                raise ValueError(f"LLM Error: {resp.text}")
-            
-            result = resp.json()
-            content = result['choices'][0]['message']['content']
-            
-            # Cleanup JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-                
-            return json.loads(content)
-            
+        result = await LLMGateway(db).chat(messages, temperature=0.1, max_tokens=1500)
+        content = result['choices'][0]['message']['content']
+
+        # Cleanup JSON
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        return json.loads(content)
+
     except Exception as e:
         return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
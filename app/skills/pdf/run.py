@@ -1,7 +1,7 @@
 import os
 import pypdf
-import pdfplumber
 import logging
+from app.services.pdf_text import extract_text, iter_page_text, page_count
 
 def execute(input_data: dict) -> dict:
     """
@@ -10,7 +10,10 @@ def execute(input_data: dict) -> dict:
     {
         "operation": "extract_text" | "get_metadata" | "merge",
         "files": ["/path/to/a.pdf", ...],
-        "output_path": "/path/to/merged.pdf" (optional)
+        "output_path": "/path/to/merged.pdf" (optional),
+        "pages": "1-10,15" (optional, extract_text),
+        "engine": "pdfplumber" | "pypdf" (optional, extract_text; pypdf = fast mode),
+        "output": "text" | "pages" (optional, extract_text; pages = per-page list)
     }
     """
     operation = input_data.get("operation")
@@ -27,7 +30,12 @@ def execute(input_data: dict) -> dict:
 
     try:
         if operation == "extract_text":
-            return _extract_text(files)
+            return _extract_text(
+                files,
+                pages=input_data.get("pages"),
+                engine=input_data.get("engine", "pdfplumber"),
+                output=input_data.get("output", "text")
+            )
         elif operation == "get_metadata":
             return _get_metadata(files)
         elif operation == "merge":
@@ -37,18 +45,18 @@ def execute(input_data: dict) -> dict:
     except Exception as e:
         return {"error": str(e)}
 
-def _extract_text(files):
+def _extract_text(files, pages=None, engine="pdfplumber", output="text"):
+    # Pages are extracted in order (sharded across processes for big selections) and joined once
     results = {}
     for file_path in files:
-        text_content = ""
         try:
-            # pdfplumber is often better for layout preservation
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text_content += page_text + "\n"
-            results[file_path] = text_content
+            if output == "pages":
+                results[file_path] = {
+                    "total_pages": page_count(file_path),
+                    "pages": [{"page": number, "text": text} for number, text in iter_page_text(file_path, pages, engine)]
+                }
+            else:
+                results[file_path] = extract_text(file_path, pages, engine)
         except Exception as e:
              results[file_path] = f"Error extracting text: {e}"
     return results
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import importlib.util
+
+# Add project root to path so we can import app
+sys.path.append(os.getcwd())
+
+from app.services.skill_loader import SKILLS_DIR, load_skill_module, invalidate_skill_module
+
+ITERATIONS = 2000
+
+def load_uncached(run_script: str):
+    # Previous behaviour: re-read and re-compile run.py on every call
+    spec = importlib.util.spec_from_file_location("skill_module", run_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench(label: str, loader, skill_name: str, run_script: str):
+    input_data = {"name": "Bench"}
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        module = loader(skill_name, run_script)
+        module.execute(input_data)
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / ITERATIONS * 1_000_000
+    print(f"{label:<28} {per_call_us:>10.1f} us/call  ({ITERATIONS} calls, {elapsed:.3f}s)")
+    return per_call_us
+
+def main():
+    skill_name = sys.argv[1] if len(sys.argv) > 1 else "hello_world"
+    run_script = os.path.join(SKILLS_DIR, skill_name, "run.py")
+    if not os.path.exists(run_script):
+        print(f"Skill not found: {run_script}")
+        sys.exit(1)
+
+    print(f"Skill load + execute overhead for '{skill_name}'")
+    before = bench("before (exec_module/call)", lambda name, path: load_uncached(path), skill_name, run_script)
+
+    invalidate_skill_module(skill_name)
+    after = bench("after (cached module)", load_skill_module, skill_name, run_script)
+
+    print(f"Speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
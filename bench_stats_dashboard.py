@@ -0,0 +1,111 @@
+"""
+Benchmark for GET /stats/dashboard.
+Seeds usage_logs for a bench user (default 1,000,000 rows spread over 90 days,
+~7.5% in the last 7 days) and compares the legacy Python-side bucketing with the
+current implementation (SQL aggregation over usage_daily_rollup).
+
+Usage: python bench_stats_dashboard.py [rows] [--reseed]
+"""
+
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+# Add project root to path so we can import app
+sys.path.append(os.getcwd())
+
+from sqlalchemy import func, insert
+import app.main  # noqa: F401 - registers all models / creates tables
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.models.stats import UsageLog
+from app.routers.stats import get_dashboard_stats
+from app.services.usage_accounting import backfill_rollup
+
+BENCH_EMAIL = "bench-stats@example.com"
+BATCH_SIZE = 10_000
+REPEATS = 5
+
+def get_bench_user(db) -> User:
+    user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+    if not user:
+        user = User(email=BENCH_EMAIL, hashed_password="!", full_name="Stats Bench")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    return user
+
+def seed(db, user_id: int, rows: int):
+    existing = db.query(func.count(UsageLog.id)).filter(UsageLog.user_id == user_id).scalar()
+    if existing >= rows:
+        print(f"Using {existing} existing rows")
+        return
+
+    print(f"Seeding {rows - existing} rows...")
+    now = datetime.utcnow()
+    apps = ["Agent-General", "Enterprise Chat", "Contract Helper", "Receipt Flow"]
+    remaining = rows - existing
+    while remaining > 0:
+        batch = []
+        for _ in range(min(BATCH_SIZE, remaining)):
+            tokens_in = random.randint(50, 4000)
+            tokens_out = random.randint(10, 1000)
+            batch.append({
+                "user_id": user_id,
+                "app_name": random.choice(apps),
+                "model_name": "gpt-4o",
+                "tokens_input": tokens_in,
+                "tokens_output": tokens_out,
+                "total_tokens": tokens_in + tokens_out,
+                "estimated_cost": (tokens_in * 5 + tokens_out * 15) / 1_000_000,
+                "timestamp": now - timedelta(seconds=random.randint(0, 90 * 86400)),
+                "tenant_id": "default"
+            })
+        db.execute(insert(UsageLog), batch)
+        db.commit()
+        remaining -= len(batch)
+
+def legacy_dashboard(db, user_id: int):
+    # Pre-optimization implementation: five queries + Python-side bucketing
+    db.query(func.sum(UsageLog.total_tokens)).filter(UsageLog.user_id == user_id).scalar()
+    db.query(func.sum(UsageLog.estimated_cost)).filter(UsageLog.user_id == user_id).scalar()
+    start_date = datetime.utcnow().date() - timedelta(days=6)
+    daily = {}
+    for log in db.query(UsageLog).filter(UsageLog.user_id == user_id, UsageLog.timestamp >= start_date).all():
+        bucket = daily.setdefault(log.timestamp.date(), {"tokens": 0, "cost": 0.0})
+        bucket["tokens"] += log.total_tokens
+        bucket["cost"] += log.estimated_cost
+    db.query(UsageLog).filter(UsageLog.user_id == user_id).order_by(UsageLog.timestamp.desc()).limit(5).all()
+    from app.models.domain import AIModel
+    db.query(AIModel).filter(AIModel.is_active == True).first()
+
+def timed(label: str, fn):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{label:<20} median {samples[len(samples) // 2]:>9.1f} ms   best {samples[0]:>9.1f} ms")
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 1_000_000
+    db = SessionLocal()
+    try:
+        user = get_bench_user(db)
+        if "--reseed" in sys.argv:
+            db.query(UsageLog).filter(UsageLog.user_id == user.id).delete()
+            db.commit()
+        seed(db, user.id, rows)
+        # Raw inserts bypass record_usage(), so rebuild the rollup the dashboard reads
+        backfill_rollup(db)
+
+        timed("legacy (python)", lambda: (legacy_dashboard(db, user.id), db.expunge_all()))
+        timed("rollup (sql)", lambda: get_dashboard_stats(db=db, current_user=user))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
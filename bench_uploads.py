@@ -0,0 +1,79 @@
+import gc
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import tracemalloc
+from unittest.mock import patch
+
+import httpx
+from starlette.datastructures import UploadFile
+
+# Add project root to path so we can import app
+sys.path.append(os.getcwd())
+
+from app.core.config import settings
+from app.services import azure_integration
+from app.services.uploads import spool_upload
+
+UPLOADS = int(os.environ.get("BENCH_UPLOADS", 8))
+UPLOAD_MB = int(os.environ.get("BENCH_UPLOAD_MB", 50))
+CHUNK = os.urandom(1024 * 1024)
+
+class FakeAzure(httpx.AsyncBaseTransport):
+    """Drains request bodies chunk by chunk like a real server (httpx.MockTransport would buffer them)."""
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async for chunk in request.stream:
+            pass
+        if request.method == "POST":
+            return httpx.Response(202, headers={"Operation-Location": "https://bench/operations/1"})
+        return httpx.Response(200, json={"status": "succeeded", "analyzeResult": {"readResults": []}})
+
+def make_upload() -> UploadFile:
+    # Starlette spools multipart bodies to disk past 1 MB; the request body itself is never in memory
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    for _ in range(UPLOAD_MB):
+        spool.write(CHUNK)
+    spool.seek(0)
+    return UploadFile(file=spool, size=UPLOAD_MB * 1024 * 1024, filename="scan.pdf")
+
+async def whole_read(upload: UploadFile):
+    # Previous behaviour: await file.read() and post the bytes
+    content = await upload.read()
+    return await azure_integration.call_azure_ocr(content)
+
+async def spooled(upload: UploadFile):
+    with await spool_upload(upload) as body:
+        return await azure_integration.call_azure_ocr(body)
+
+async def bench(label: str, handler):
+    uploads = [make_upload() for _ in range(UPLOADS)]
+    gc.collect() # Drop the previous phase's buffers before measuring
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(u) for u in uploads))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    for u in uploads:
+        await u.close()
+    print(f"{label:<28} peak {peak / 1024 / 1024:>8.1f} MB  ({UPLOADS} x {UPLOAD_MB} MB concurrent, {elapsed:.2f}s)")
+    return peak
+
+async def main():
+    real_client = httpx.AsyncClient
+    with patch.object(azure_integration.httpx, "AsyncClient", lambda *a, **kw: real_client(transport=FakeAzure())), \
+         patch.object(azure_integration, "get_ocr_cache", return_value=None), \
+         patch.object(settings, "AZURE_VISION_ENDPOINT", "https://bench.cognitiveservices.azure.com/"), \
+         patch.object(settings, "AZURE_VISION_KEY", "bench-key"), \
+         patch.object(settings, "OCR_POLL_INITIAL_INTERVAL", 0.01), \
+         patch.object(settings, "UPLOAD_MAX_BYTES", 0):
+        tracemalloc.start()
+        before = await bench("before (whole read)", whole_read)
+        after = await bench("after (spooled + streamed)", spooled)
+        tracemalloc.stop()
+
+    print(f"Peak memory reduction: {before / max(after, 1):.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -18,3 +18,52 @@ export const runAgent = async (query: string, sessionId?: string, assistantId?:
     });
     return response as unknown as AgentResponse;
 };
+
+export interface AgentStreamEvent {
+    event: 'session' | 'thought' | 'tool_started' | 'tool_finished' | 'token' | 'done' | 'error';
+    data: any;
+}
+
+// Streams /agent/run/stream (Server-Sent Events). axios cannot read a streaming body, so use fetch.
+export const runAgentStream = async (
+    query: string,
+    onEvent: (evt: AgentStreamEvent) => void,
+    sessionId?: string,
+    assistantId?: string
+): Promise<void> => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${client.defaults.baseURL}/agent/run/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            ...(token ? { Authorization: `Bearer ${token}` } : {})
+        },
+        body: JSON.stringify({ query, session_id: sessionId, assistant_id: assistantId })
+    });
+    if (!response.ok || !response.body) {
+        throw new Error(`Agent stream failed (${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (data) onEvent({ event: event as AgentStreamEvent['event'], data: JSON.parse(data) });
+        }
+    }
+};
@@ -7,6 +7,15 @@ export interface AIModel {
     api_version: string;
     description?: string;
     is_active: boolean;
+    endpoint?: string | null;
+    api_key_env?: string | null;
+    rpm_limit?: number | null;
+    tpm_limit?: number | null;
+    max_inflight?: number | null;
+    fallback_model_id?: string | null;
+    route_group?: string | null;
+    route_weight?: number | null;
+    pinned_tenants?: string[] | null;
 }
 
 export interface AIModelCreate {
@@ -15,6 +24,15 @@ export interface AIModelCreate {
     api_version: string;
     description?: string;
     is_active?: boolean;
+    endpoint?: string | null;
+    api_key_env?: string | null;
+    rpm_limit?: number | null;
+    tpm_limit?: number | null;
+    max_inflight?: number | null;
+    fallback_model_id?: string | null;
+    route_group?: string | null;
+    route_weight?: number | null;
+    pinned_tenants?: string[] | null;
 }
 
 export interface AIModelUpdate {
@@ -23,6 +41,15 @@ export interface AIModelUpdate {
     api_version?: string;
     description?: string;
     is_active?: boolean;
+    endpoint?: string | null;
+    api_key_env?: string | null;
+    rpm_limit?: number | null;
+    tpm_limit?: number | null;
+    max_inflight?: number | null;
+    fallback_model_id?: string | null;
+    route_group?: string | null;
+    route_weight?: number | null;
+    pinned_tenants?: string[] | null;
 }
 
 export const getModels = (): Promise<AIModel[]> => {
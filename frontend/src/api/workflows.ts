@@ -26,3 +26,8 @@ export const deleteWorkflow = (id: string): Promise<void> => {
 export const runWorkflow = (id: string, payload: any): Promise<RunExecutionOut> => {
     return apiClient.post(`/workflows/${id}/run`, payload) as Promise<RunExecutionOut>;
 };
+
+// Queue the run and return immediately (status "pending"); poll getRun(id) for progress
+export const submitWorkflowRun = (id: string, payload: any): Promise<RunExecutionOut> => {
+    return apiClient.post(`/workflows/${id}/run`, payload, { params: { background: true } }) as Promise<RunExecutionOut>;
+};
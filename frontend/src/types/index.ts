@@ -32,6 +32,7 @@ export interface WorkflowStepConfig {
     component_id: string; // UUID
     config: Record<string, any>;
     input_mapping: Record<string, any>;
+    depends_on?: number[]; // DAG mode: run after these steps (independent steps run in parallel)
 }
 
 export interface WorkflowBase {
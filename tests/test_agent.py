@@ -2,6 +2,14 @@ import pytest
 from unittest.mock import AsyncMock, patch
 from app.services.agent_service import AgentService
 from app.models.skill import Skill, SkillType
+from app.models.feedback import Feedback # noqa: F401 - User.feedbacks relationship target
+
+def completion(content: str) -> dict:
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        "model": "gpt-4o"
+    }
 
 @pytest.mark.asyncio
 async def test_agent_run_hello_world(db_session):
@@ -11,28 +19,29 @@ async def test_agent_run_hello_world(db_session):
         description="Say Hello",
         category="test",
         skill_type=SkillType.PYTHON_FUNC,
-        configuration={"folder_path": "tests/mock_skills/hello_world"}, # Mock path, won't be used if we mock execute_skill
+        configuration={"folder_path": "tests/mock_skills/hello_world"}, # Mock path, won't be used if we mock execute_skill_async
         is_active=True
     )
     db_session.add(skill)
     db_session.commit()
 
     # 2. Mock LLM and Execute
-    # We mock call_azure_openai to return a specific JSON decision
-    # We mock execute_skill to avoid actual file system running
+    # We mock LLMGateway.chat to return a specific JSON decision, then the synthesized answer
+    # We mock execute_skill_async to avoid actual file system running
     
-    mock_llm_response = {
-        "content": '```json\n{"thought": "User wants a greeting", "tool": "hello_world", "args": {"name": "Tester"}}\n```'
-    }
+    mock_llm_responses = [
+        completion('```json\n{"thought": "User wants a greeting", "tool": "hello_world", "args": {"name": "Tester"}}\n```'),
+        completion("Hello, Tester!")
+    ]
 
-    with patch("app.services.agent_service.call_azure_openai", new_callable=AsyncMock) as mock_llm:
-        mock_llm.return_value = mock_llm_response
+    with patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = mock_llm_responses
         
-        with patch("app.services.agent_service.execute_skill") as mock_exec:
+        with patch("app.services.agent_service.execute_skill_async", new_callable=AsyncMock) as mock_exec:
             mock_exec.return_value = {"message": "Hello, Tester!"}
             
             service = AgentService(db_session)
-            result = await service.run("Say hello to Tester")
+            result = await service.run("Say hello to Tester", user_id=None)
             
             # 3. Verify
             assert result["tool_used"] == "hello_world"
@@ -42,15 +51,98 @@ async def test_agent_run_hello_world(db_session):
 @pytest.mark.asyncio
 async def test_agent_no_tool(db_session):
     # Mock LLM returning "none"
-    mock_llm_response = {
-        "content": '{"thought": "No tool needed", "tool": "none", "args": {}}'
-    }
+    mock_llm_response = completion('{"thought": "No tool needed", "tool": "none", "args": {}}')
 
-    with patch("app.services.agent_service.call_azure_openai", new_callable=AsyncMock) as mock_llm:
+    with patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_llm:
         mock_llm.return_value = mock_llm_response
         
         service = AgentService(db_session)
-        result = await service.run("What is the meaning of life?")
+        result = await service.run("What is the meaning of life?", user_id=None)
         
         assert "response" in result
-        assert "tool_used" not in result or result.get("tool_used") == "none"
+        assert result.get("tool_used") in (None, "none")
+
+def _hello_world_skill(db_session):
+    db_session.add(Skill(
+        name="hello_world",
+        description="Say Hello",
+        category="test",
+        skill_type=SkillType.PYTHON_FUNC,
+        configuration={"folder_path": "tests/mock_skills/hello_world"},
+        is_active=True
+    ))
+    db_session.commit()
+
+async def _fake_chat_stream(self, messages, **kwargs):
+    for delta in ("Hello, ", "Tester", "!"):
+        yield delta
+
+DECISION = completion('{"thought": "User wants a greeting", "tool": "hello_world", "args": {"name": "Tester"}}')
+
+@pytest.mark.asyncio
+async def test_agent_run_stream_event_order(db_session):
+    from app.models.chat import ChatMessage
+
+    _hello_world_skill(db_session)
+    with patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_llm, \
+         patch("app.services.gateway.LLMGateway.chat_stream", _fake_chat_stream), \
+         patch("app.services.agent_service.execute_skill_async", new_callable=AsyncMock) as mock_exec:
+        mock_llm.return_value = DECISION
+        mock_exec.return_value = {"message": "Hello, Tester!"}
+
+        service = AgentService(db_session)
+        events = [event async for event in service.run_stream("Say hello to Tester", user_id=None)]
+
+    names = [e["event"] for e in events]
+    assert names == ["session", "thought", "tool_started", "tool_finished", "token", "token", "token", "done"]
+    assert events[1]["data"]["tool"] == "hello_world"
+    assert events[3]["data"]["result"] == {"message": "Hello, Tester!"}
+    done = events[-1]["data"]
+    assert done["response"] == "Hello, Tester!"
+    assert done["session_id"] == events[0]["data"]["session_id"]
+
+    # One assistant message, holding the whole streamed reply
+    replies = db_session.query(ChatMessage).filter(ChatMessage.session_id == done["session_id"], ChatMessage.role == "assistant").all()
+    assert [m.content for m in replies] == ["Hello, Tester!"]
+
+@pytest.mark.asyncio
+async def test_agent_run_stream_reports_llm_errors(db_session):
+    from app.models.chat import ChatMessage
+
+    with patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = ValueError("Azure OpenAI Error (500): boom")
+
+        service = AgentService(db_session)
+        events = [event async for event in service.run_stream("Hi", user_id=None)]
+
+    assert [e["event"] for e in events] == ["session", "error"]
+    assert "boom" in events[1]["data"]["error"]
+    assert db_session.query(ChatMessage).filter(ChatMessage.role == "assistant").count() == 0
+
+def test_agent_run_stream_endpoint_emits_sse(db_session):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import deps
+    from app.models.chat import ChatMessage
+    from app.routers import agent as agent_router
+    from tests.conftest import TestingSessionLocal
+
+    _hello_world_skill(db_session)
+    app = FastAPI()
+    app.include_router(agent_router.router)
+    app.dependency_overrides[deps.get_current_user] = lambda: type("CurrentUser", (), {"id": None})()
+
+    with patch.object(agent_router, "SessionLocal", TestingSessionLocal), \
+         patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_llm, \
+         patch("app.services.gateway.LLMGateway.chat_stream", _fake_chat_stream), \
+         patch("app.services.agent_service.execute_skill_async", new_callable=AsyncMock) as mock_exec:
+        mock_llm.return_value = DECISION
+        mock_exec.return_value = {"message": "Hello, Tester!"}
+
+        response = TestClient(app).post("/agent/run/stream", json={"query": "Say hello to Tester"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    names = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert names == ["session", "thought", "tool_started", "tool_finished", "token", "token", "token", "done"]
+    assert db_session.query(ChatMessage).filter(ChatMessage.role == "assistant").count() == 1
@@ -0,0 +1,56 @@
+import pytest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.user import User # noqa: F401 - mapper registry for db_session
+from app.models.feedback import Feedback # noqa: F401 - User.feedbacks relationship target
+from app.models.assistant import Assistant # noqa: F401 - ChatSession.assistant_id target
+from app.models.chat import ChatSession, ChatMessage
+from app.services.conversation_memory import build_history, refresh_summary, estimate_tokens, TRUNCATION_MARK
+
+def make_session(db, contents):
+    chat_session = ChatSession(title="long chat")
+    db.add(chat_session)
+    db.commit()
+    for i, content in enumerate(contents):
+        db.add(ChatMessage(session_id=chat_session.id, role="user" if i % 2 == 0 else "assistant", content=content))
+    db.commit()
+    return chat_session
+
+def test_history_respects_token_budget(db_session):
+    contract = "合約條款" * 2000 # pasted document, far above the per-message cap
+    chat_session = make_session(db_session, [f"第 {i} 輪：" + "內容" * 100 for i in range(20)] + [contract, "請總結"])
+
+    payload, unsummarized = build_history(db_session, chat_session, token_budget=1500)
+
+    assert unsummarized > 8000
+    assert payload[-1]["content"] == "請總結"
+    assert payload[-2]["content"].endswith(TRUNCATION_MARK)
+    assert sum(estimate_tokens(m["content"]) for m in payload) <= 1500
+    assert len(payload) >= 4
+
+@pytest.mark.asyncio
+async def test_refresh_summary_folds_older_turns(db_session, monkeypatch):
+    from tests.conftest import TestingSessionLocal
+    from app.services.gateway import LLMGateway
+
+    async def fake_chat(self, messages, temperature=0.7, model_id=None, ai_model=None):
+        assert "第 0 輪" in messages[-1]["content"]
+        return {"choices": [{"message": {"content": "- 使用者在討論合約"}}], "usage": {}}
+
+    monkeypatch.setattr(LLMGateway, "chat", fake_chat)
+    chat_session = make_session(db_session, [f"第 {i} 輪" for i in range(10)])
+
+    await refresh_summary(chat_session.id, session_factory=TestingSessionLocal)
+
+    db_session.expire_all()
+    chat_session = db_session.get(ChatSession, chat_session.id)
+    assert chat_session.summary == "- 使用者在討論合約"
+    payload, _ = build_history(db_session, chat_session, token_budget=3000)
+    assert payload[0]["role"] == "system"
+    assert "使用者在討論合約" in payload[0]["content"]
+    # Only the unsummarized tail is sent verbatim
+    assert [m["content"] for m in payload[1:]] == [f"第 {i} 輪" for i in range(6, 10)]
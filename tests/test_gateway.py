@@ -0,0 +1,234 @@
+import sys
+import os
+import asyncio
+import pytest
+import httpx
+from unittest.mock import MagicMock, patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.gateway import LLMGateway
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_resilience import deployment_health
+from app.core.metrics import metrics
+
+def make_model(name="gpt-4o", deployment="gpt-4o-prod"):
+    model = MagicMock()
+    model.id = "model-1"
+    model.name = name
+    model.deployment_name = deployment
+    model.api_version = "2024-12-01-preview"
+    model.endpoint = None
+    model.api_key_env = None
+    model.rpm_limit = None
+    model.tpm_limit = None
+    model.max_inflight = None
+    model.fallback_model_id = None
+    model.route_group = None
+    return model
+
+def make_db(model):
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = model
+    return db
+
+def completion_response(content="ok"):
+    return {
+        "model": "gpt-4o",
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+@pytest.fixture
+def azure_settings():
+    with patch("app.services.gateway.settings") as mock_settings:
+        mock_settings.AZURE_OPENAI_API_KEY = "test-key"
+        mock_settings.AZURE_OPENAI_KEY = None
+        mock_settings.AZURE_OPENAI_ENDPOINT = "https://unit-test.openai.azure.com/"
+        mock_settings.LLM_CACHE_MAX_TEMPERATURE = 0.0
+        mock_settings.LLM_COALESCE_ENABLED = True
+        mock_settings.LLM_COALESCE_MAX_TEMPERATURE = 2.0
+        mock_settings.LLM_LIMITER_QUEUE_TIMEOUT_SECONDS = 5.0
+        mock_settings.LLM_LIMITER_429_PAUSE_SECONDS = 1.0
+        mock_settings.LLM_RETRY_MAX_ATTEMPTS = 1
+        mock_settings.LLM_RETRY_MAX_DELAY = 20.0
+        mock_settings.LLM_HEDGE_ENABLED = False
+        mock_settings.LLM_HEDGE_PERCENTILE = 95.0
+        deployment_health.reset()
+        llm_limiter.reset() # Limiters outlive event loops: start every test with fresh budgets
+        yield mock_settings
+
+@pytest.mark.asyncio
+async def test_chat_reuses_pooled_client(azure_settings):
+    """
+    All calls on the app loop must share one client per endpoint.
+    """
+    metrics.reset()
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(str(request.url))
+        return httpx.Response(200, json=completion_response())
+
+    created = []
+
+    def new_client():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        created.append(client)
+        return client
+
+    with patch.object(LLMGateway, "_new_client", side_effect=new_client):
+        await LLMGateway.startup()
+        try:
+            gateway = LLMGateway(make_db(make_model()))
+            await gateway.chat([{"role": "user", "content": "hi"}])
+            await gateway.chat([{"role": "user", "content": "hi again"}])
+        finally:
+            await LLMGateway.shutdown()
+
+    assert len(created) == 1
+    assert len(calls) == 2
+    assert "/openai/deployments/gpt-4o-prod/chat/completions" in calls[0]
+    assert metrics.get_summary("llm_pool_wait_ms", endpoint="unit-test.openai.azure.com")["count"] == 2
+
+@pytest.mark.asyncio
+async def test_model_lookups_run_off_the_event_loop(azure_settings):
+    """
+    Skills and the agent call chat() from the event loop: the sync Session queries must not block it.
+    """
+    import threading
+    loop_thread = threading.get_ident()
+    query_threads = []
+    db = make_db(make_model())
+    query = db.query
+
+    def tracking_query(*args):
+        query_threads.append(threading.get_ident())
+        return query(*args)
+
+    db.query = tracking_query
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=completion_response()))
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=transport)):
+        await LLMGateway(db).chat([{"role": "user", "content": "hi"}], model_id="model-1", user_id="user-1", cache=False)
+        await LLMGateway.shutdown()
+
+    assert query_threads
+    assert loop_thread not in query_threads
+
+@pytest.mark.asyncio
+async def test_chat_raises_on_azure_error(azure_settings):
+    def handler(request: httpx.Request):
+        return httpx.Response(500, text="boom")
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(make_model()))
+        with pytest.raises(ValueError) as excinfo:
+            await gateway.chat([{"role": "user", "content": "hi"}])
+
+    assert "500" in str(excinfo.value)
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_deltas(azure_settings):
+    sse_body = (
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+        'data: [DONE]\n\n'
+    )
+
+    def handler(request: httpx.Request):
+        assert b'"stream": true' in request.content or b'"stream":true' in request.content
+        return httpx.Response(200, content=sse_body.encode(), headers={"Content-Type": "text/event-stream"})
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(make_model()))
+        chunks = [c async for c in gateway.chat_stream([{"role": "user", "content": "hi"}])]
+
+    assert chunks == ["Hel", "lo"]
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_share_one_upstream_request(azure_settings):
+    metrics.reset()
+    calls = []
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await release.wait()
+        return httpx.Response(200, json=completion_response())
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(make_model()))
+        messages = [{"role": "user", "content": "same prompt"}]
+        tasks = [asyncio.create_task(gateway.chat(messages)) for _ in range(5)]
+        other = asyncio.create_task(gateway.chat([{"role": "user", "content": "different"}]))
+        await asyncio.sleep(0.05)
+        release.set()
+        responses = await asyncio.gather(*tasks)
+        await other
+
+    assert len(calls) == 2
+    assert metrics.get_counter("llm_coalesced_requests") == 4
+    leaders = [r for r in responses if not r.get("coalesced")]
+    assert len(leaders) == 1 and leaders[0]["usage"]["total_tokens"] == 15
+    for follower in (r for r in responses if r.get("coalesced")):
+        assert follower["usage"]["total_tokens"] == 0
+        assert follower["cached_usage"]["total_tokens"] == 15
+        assert follower["choices"] == leaders[0]["choices"]
+
+    # Nothing left in flight: a later identical call goes upstream again
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        await gateway.chat(messages)
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_coalescing_is_per_tenant_and_only_the_leader_routes(azure_settings):
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json=completion_response())
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))), \
+         patch.object(LLMGateway, "_deployment_candidates", autospec=True, side_effect=lambda self, m, e, t=None: [m]) as candidates:
+        gateway = LLMGateway(make_db(make_model()))
+        messages = [{"role": "user", "content": "same prompt"}]
+        responses = await asyncio.gather(*(gateway.chat(messages, tenant_id=tenant) for tenant in ("acme", "acme", "acme", "globex")))
+
+    # One upstream call (and one routing decision) per tenant
+    assert len(calls) == 2
+    assert candidates.call_count == 2
+    assert [bool(r.get("coalesced")) for r in responses].count(False) == 2
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_all_see_the_upstream_error(azure_settings):
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(500, text="boom")
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(make_model()))
+        results = await asyncio.gather(*(gateway.chat([{"role": "user", "content": "hi"}]) for _ in range(3)), return_exceptions=True)
+
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) and "500" in str(r) for r in results)
+
+@pytest.mark.asyncio
+async def test_cache_false_opts_out_of_coalescing(azure_settings):
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json=completion_response())
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(make_model()))
+        await asyncio.gather(*(gateway.chat([{"role": "user", "content": "hi"}], cache=False) for _ in range(3)))
+
+    assert len(calls) == 3
@@ -0,0 +1,112 @@
+import sys
+import os
+import pytest
+import httpx
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.gateway import LLMGateway
+from app.services.llm_cache import LLMResponseCache
+from app.core.metrics import metrics
+from tests.test_gateway import make_model, make_db, completion_response, azure_settings  # noqa: F401
+
+def test_lru_evicts_least_recently_used():
+    cache = LLMResponseCache(max_entries=2)
+    cache.put("t:a", {"n": 1})
+    cache.put("t:b", {"n": 2})
+    assert cache.get("t:a") == {"n": 1} # a is now most recent
+    cache.put("t:c", {"n": 3})
+
+    assert cache.get("t:b") is None
+    assert cache.get("t:a") == {"n": 1}
+    assert cache.get("t:c") == {"n": 3}
+
+def test_ttl_expires_entries():
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    with patch("app.services.llm_cache.time.time", return_value=1000.0):
+        cache.put("t:a", {"n": 1})
+    with patch("app.services.llm_cache.time.time", return_value=1030.0):
+        assert cache.get("t:a") == {"n": 1}
+    with patch("app.services.llm_cache.time.time", return_value=1061.0):
+        assert cache.get("t:a") is None
+
+def test_sqlite_tier_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    LLMResponseCache(max_entries=10, path=path).put("t:a", {"n": 1})
+
+    # A second process (fresh in-memory tier) sees the entry
+    other = LLMResponseCache(max_entries=10, path=path)
+    assert other.get("t:a") == {"n": 1}
+    assert other.stats()["memory_entries"] == 1 # Promoted
+
+def test_returned_responses_are_copies():
+    cache = LLMResponseCache(max_entries=10)
+    cache.put("t:a", {"choices": []})
+    cache.get("t:a")["choices"].append("mutated")
+    assert cache.get("t:a") == {"choices": []}
+
+@pytest.fixture
+def response_cache():
+    cache = LLMResponseCache(max_entries=100)
+    with patch("app.services.gateway.get_llm_cache", return_value=cache):
+        yield cache
+
+def counting_client(calls: list):
+    def handler(request: httpx.Request):
+        calls.append(request)
+        return httpx.Response(200, json=completion_response())
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+@pytest.mark.asyncio
+async def test_gateway_hit_skips_azure_and_reports_zero_usage(azure_settings, response_cache):
+    metrics.reset()
+    calls = []
+    messages = [{"role": "user", "content": "hi"}]
+
+    with patch.object(LLMGateway, "_new_client", side_effect=counting_client(calls)):
+        gateway = LLMGateway(make_db(make_model()))
+        first = await gateway.chat(messages, temperature=0.0, tenant_id="acme")
+        second = await gateway.chat(messages, temperature=0.0, tenant_id="acme")
+
+    assert len(calls) == 1
+    assert first["usage"]["total_tokens"] == 15
+    assert "cache_hit" not in first
+    assert second["cache_hit"] is True
+    assert second["usage"] == {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    assert second["cached_usage"]["total_tokens"] == 15
+    assert second["choices"] == first["choices"]
+    assert metrics.get_counter("llm_cache_saved_tokens", tenant="acme") == 15
+
+@pytest.mark.asyncio
+async def test_gateway_cache_is_namespaced_per_tenant(azure_settings, response_cache):
+    calls = []
+    messages = [{"role": "user", "content": "hi"}]
+
+    with patch.object(LLMGateway, "_new_client", side_effect=counting_client(calls)):
+        gateway = LLMGateway(make_db(make_model()))
+        await gateway.chat(messages, temperature=0.0, tenant_id="acme")
+        other = await gateway.chat(messages, temperature=0.0, tenant_id="globex")
+
+    assert len(calls) == 2
+    assert "cache_hit" not in other
+
+@pytest.mark.asyncio
+async def test_gateway_only_caches_deterministic_calls_by_default(azure_settings, response_cache):
+    calls = []
+    messages = [{"role": "user", "content": "hi"}]
+
+    with patch.object(LLMGateway, "_new_client", side_effect=counting_client(calls)):
+        gateway = LLMGateway(make_db(make_model()))
+        await gateway.chat(messages, temperature=0.7, tenant_id="acme")
+        await gateway.chat(messages, temperature=0.7, tenant_id="acme")
+        assert len(calls) == 2
+
+        # Explicit opt-in / opt-out override the temperature rule
+        await gateway.chat(messages, temperature=0.7, tenant_id="acme", cache=True)
+        await gateway.chat(messages, temperature=0.7, tenant_id="acme", cache=True)
+        assert len(calls) == 3
+        await gateway.chat(messages, temperature=0.0, tenant_id="acme", cache=False)
+        await gateway.chat(messages, temperature=0.0, tenant_id="acme", cache=False)
+        assert len(calls) == 5
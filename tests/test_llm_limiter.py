@@ -0,0 +1,193 @@
+import sys
+import os
+import time
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.gateway import LLMGateway
+from app.services.llm_limiter import TokenBucket, DeploymentLimiter, llm_limiter, estimate_request_tokens, retry_after_seconds
+from app.core.metrics import metrics
+from tests.test_gateway import make_model, make_db, completion_response, azure_settings  # noqa: F401
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate_per_minute=600, burst_seconds=1) # 10/s, capacity 10
+    now = bucket.updated
+    assert bucket.wait_time(10, now) == 0
+    bucket.take(10, now)
+    assert bucket.wait_time(5, now) == pytest.approx(0.5)
+    assert bucket.wait_time(5, now + 0.5) == 0
+
+def test_token_bucket_refund_is_capped_at_capacity():
+    bucket = TokenBucket(rate_per_minute=600, burst_seconds=1)
+    bucket.take(-100, bucket.updated)
+    assert bucket.level == bucket.capacity
+
+def test_estimate_request_tokens_reserves_completion():
+    payload = {"messages": [{"role": "user", "content": "abcd" * 10}], "max_tokens": 100}
+    assert estimate_request_tokens(payload) == 4 + 10 + 100
+
+def test_retry_after_prefers_milliseconds_header():
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after-ms": "250", "retry-after": "1"}), 5.0) == 0.25
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after": "3"}), 5.0) == 3.0
+    assert retry_after_seconds(httpx.Response(429), 5.0) == 5.0
+
+@pytest.mark.asyncio
+async def test_max_inflight_queues_callers_in_arrival_order():
+    limiter = DeploymentLimiter("test/gpt", rpm=0, tpm=0, max_inflight=1)
+    order = []
+
+    async def call(i):
+        await limiter.acquire(10)
+        order.append(i)
+        await asyncio.sleep(0.01)
+        limiter.release(10)
+
+    tasks = []
+    for i in range(5):
+        tasks.append(asyncio.create_task(call(i)))
+        await asyncio.sleep(0) # Arrive in order
+    await asyncio.gather(*tasks)
+
+    assert order == [0, 1, 2, 3, 4]
+    assert limiter.inflight == 0
+    assert metrics.get_counter("llm_throttled", deployment="test/gpt", reason="inflight") >= 4
+
+@pytest.mark.asyncio
+async def test_rpm_budget_delays_instead_of_failing():
+    with patch("app.services.llm_limiter.settings.LLM_LIMITER_BURST_SECONDS", 0.1):
+        limiter = DeploymentLimiter("test/rpm", rpm=600, tpm=0, max_inflight=0) # 10/s, burst 1
+
+    start = time.monotonic()
+    for _ in range(3):
+        await limiter.acquire(1)
+        limiter.release(1)
+    assert time.monotonic() - start >= 0.18 # 2nd and 3rd request wait ~0.1s each
+
+def test_budget_is_shared_across_event_loops_and_threads():
+    # Worker threads call chat_sync() -> asyncio.run() per call: budgets must survive the loop
+    import threading
+
+    model = make_model()
+    model.rpm_limit = 600 # 10/s
+    llm_limiter.reset()
+    with patch("app.services.llm_limiter.settings.LLM_LIMITER_BURST_SECONDS", 0.1): # Burst 1
+        limiter = llm_limiter.for_model("https://unit-test.openai.azure.com", model)
+
+    async def call():
+        current = llm_limiter.for_model("https://unit-test.openai.azure.com", model)
+        await current.acquire(1)
+        current.release(1)
+        return current
+
+    start = time.monotonic()
+    assert all(asyncio.run(call()) is limiter for _ in range(3))
+    assert time.monotonic() - start >= 0.18
+
+    threads = [threading.Thread(target=lambda: asyncio.run(call())) for _ in range(3)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.18
+    assert limiter.inflight == 0 and limiter.waiting == 0
+    llm_limiter.reset()
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = DeploymentLimiter("test/cancel", rpm=0, tpm=0, max_inflight=1)
+    await limiter.acquire(1)
+    blocked = asyncio.create_task(limiter.acquire(1))
+    await asyncio.sleep(0.01)
+    blocked.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await blocked
+
+    limiter.release(1)
+    await asyncio.wait_for(limiter.acquire(1), timeout=1) # Not stuck behind the cancelled caller
+    assert limiter.waiting == 0
+
+@pytest.mark.asyncio
+async def test_upstream_429_pauses_the_queue():
+    limiter = DeploymentLimiter("test/429", rpm=0, tpm=0, max_inflight=4)
+    limiter.pause(0.1)
+    start = time.monotonic()
+    await limiter.acquire(1)
+    assert time.monotonic() - start >= 0.09
+    assert metrics.get_counter("llm_throttled", deployment="test/429", reason="retry_after") == 1
+
+@pytest.mark.asyncio
+async def test_limits_change_updates_the_limiter_in_place():
+    # A fresh limiter would forget the in-flight calls and spent budget: up to twice the cap for a moment
+    model = make_model()
+    model.rpm_limit = 600
+    model.max_inflight = 2
+    llm_limiter.reset()
+    limiter = llm_limiter.for_model("https://unit-test.openai.azure.com", model)
+    await limiter.acquire(1)
+    await limiter.acquire(1)
+    level = limiter.requests.level
+
+    model.rpm_limit = 1200
+    model.max_inflight = 1
+    assert llm_limiter.for_model("https://unit-test.openai.azure.com", model) is limiter
+    assert limiter.limits == (1200, 0, 1)
+    assert limiter.inflight == 2
+    assert limiter.requests.level <= level + 1 # Spent budget carried over, not refilled
+
+    blocked = asyncio.create_task(limiter.acquire(1))
+    await asyncio.sleep(0.01)
+    assert not blocked.done() # Still over the new in-flight cap
+    limiter.release(1)
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    limiter.release(1)
+    await asyncio.wait_for(blocked, timeout=1)
+    limiter.release(1)
+    llm_limiter.reset()
+
+@pytest.mark.asyncio
+async def test_gateway_applies_per_model_limits(azure_settings):
+    active = 0
+    peak = 0
+
+    async def handler(request: httpx.Request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json=completion_response())
+
+    model = make_model()
+    model.max_inflight = 2
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(model))
+        await asyncio.gather(*(gateway.chat([{"role": "user", "content": f"q{i}"}], ai_model=model) for i in range(6)))
+
+    assert peak == 2
+    limiter = llm_limiter.get("unit-test.openai.azure.com/gpt-4o-prod")
+    assert limiter.inflight == 0
+    assert metrics.get_summary("llm_limiter_wait_ms", deployment=limiter.name)["count"] >= 6
+
+@pytest.mark.asyncio
+async def test_gateway_429_pauses_deployment_and_raises(azure_settings):
+    def handler(request: httpx.Request):
+        return httpx.Response(429, headers={"retry-after-ms": "50"}, text="Too Many Requests")
+
+    model = make_model()
+    model.rpm_limit = 600
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(make_db(model))
+        with pytest.raises(ValueError) as excinfo:
+            await gateway.chat([{"role": "user", "content": "hi"}], ai_model=model, cache=False)
+
+    assert "429" in str(excinfo.value)
+    limiter = llm_limiter.get("unit-test.openai.azure.com/gpt-4o-prod")
+    assert limiter.paused_until > time.monotonic()
+    assert limiter.inflight == 0
@@ -0,0 +1,243 @@
+import sys
+import os
+import time
+import asyncio
+import pytest
+import httpx
+from unittest.mock import MagicMock, patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.gateway import LLMGateway
+from app.services.llm_resilience import CircuitBreaker, LLMUpstreamError, deployment_health
+from app.core.metrics import metrics
+from tests.test_gateway import make_model, make_db, completion_response, azure_settings  # noqa: F401
+
+HEALTH_KEY = "unit-test.openai.azure.com/gpt-4o-prod"
+
+@pytest.fixture
+def fast_backoff():
+    with patch("app.services.llm_resilience.settings.LLM_RETRY_BASE_DELAY", 0.01), \
+         patch("app.services.llm_resilience.settings.LLM_BREAKER_FAILURE_THRESHOLD", 2), \
+         patch("app.services.llm_resilience.settings.LLM_BREAKER_OPEN_SECONDS", 0.1), \
+         patch("app.services.llm_resilience.settings.LLM_HEDGE_MIN_SAMPLES", 5):
+        yield
+
+def scripted_client(responses: dict, calls: list):
+    """responses: deployment name -> list of (status, headers, delay) consumed in order (last one repeats)."""
+    async def handler(request: httpx.Request):
+        deployment = request.url.path.split("/")[3]
+        calls.append(deployment)
+        script = responses[deployment]
+        status, headers, delay = script.pop(0) if len(script) > 1 else script[0]
+        if delay:
+            await asyncio.sleep(delay)
+        if status == 200:
+            return httpx.Response(200, json=completion_response(deployment))
+        return httpx.Response(status, headers=headers, text="upstream error")
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def with_fallback():
+    primary = make_model()
+    fallback = make_model(name="gpt-4o-eu", deployment="gpt-4o-eu")
+    fallback.id = "model-2"
+    primary.fallback_model_id = fallback.id
+    db = MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = fallback
+    return primary, db
+
+def content(response: dict) -> str:
+    return response["choices"][0]["message"]["content"]
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried(azure_settings, fast_backoff):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 3
+    metrics.reset()
+    calls = []
+    responses = {"gpt-4o-prod": [(503, {}, 0), (502, {}, 0), (200, {}, 0)]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)), \
+         patch("app.services.llm_resilience.settings.LLM_BREAKER_FAILURE_THRESHOLD", 5):
+        response = await LLMGateway(make_db(make_model())).chat([{"role": "user", "content": "hi"}], cache=False)
+
+    assert content(response) == "gpt-4o-prod"
+    assert len(calls) == 3
+    assert metrics.get_counter("llm_retries", reason="503") == 1
+    assert metrics.get_counter("llm_retries", reason="502") == 1
+
+@pytest.mark.asyncio
+async def test_retry_honors_retry_after(azure_settings, fast_backoff):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 2
+    calls = []
+    responses = {"gpt-4o-prod": [(429, {"retry-after-ms": "150"}, 0), (200, {}, 0)]}
+
+    start = time.monotonic()
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        await LLMGateway(make_db(make_model())).chat([{"role": "user", "content": "hi"}], cache=False)
+
+    assert len(calls) == 2
+    assert time.monotonic() - start >= 0.15
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(azure_settings, fast_backoff):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 3
+    calls = []
+    responses = {"gpt-4o-prod": [(400, {}, 0)]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        with pytest.raises(LLMUpstreamError) as excinfo:
+            await LLMGateway(make_db(make_model())).chat([{"role": "user", "content": "hi"}], cache=False)
+
+    assert excinfo.value.status_code == 400
+    assert len(calls) == 1
+    assert deployment_health.get(HEALTH_KEY).breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_retry_fails_over_to_fallback_deployment(azure_settings, fast_backoff):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 2
+    primary, db = with_fallback()
+    calls = []
+    responses = {"gpt-4o-prod": [(500, {}, 0)], "gpt-4o-eu": [(200, {}, 0)]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        response = await LLMGateway(db).chat([{"role": "user", "content": "hi"}], ai_model=primary, cache=False)
+
+    assert calls == ["gpt-4o-prod", "gpt-4o-eu"]
+    assert content(response) == "gpt-4o-eu"
+
+@pytest.mark.asyncio
+async def test_open_circuit_skips_deployment_until_probe(azure_settings, fast_backoff):
+    primary, db = with_fallback()
+    calls = []
+    responses = {"gpt-4o-prod": [(500, {}, 0), (500, {}, 0), (200, {}, 0)], "gpt-4o-eu": [(200, {}, 0)]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        gateway = LLMGateway(db)
+        for _ in range(2):
+            with pytest.raises(LLMUpstreamError):
+                await gateway.chat([{"role": "user", "content": "hi"}], ai_model=primary, cache=False)
+        assert deployment_health.get(HEALTH_KEY).breaker.state == "open"
+
+        # Open: traffic goes straight to the fallback
+        response = await gateway.chat([{"role": "user", "content": "hi"}], ai_model=primary, cache=False)
+        assert content(response) == "gpt-4o-eu"
+        assert calls == ["gpt-4o-prod", "gpt-4o-prod", "gpt-4o-eu"]
+
+        # After the cool-down one probe goes to the primary and closes the circuit
+        await asyncio.sleep(0.12)
+        response = await gateway.chat([{"role": "user", "content": "hi"}], ai_model=primary, cache=False)
+        assert content(response) == "gpt-4o-prod"
+        assert deployment_health.get(HEALTH_KEY).breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_open_circuit_without_fallback_fails_fast(azure_settings, fast_backoff):
+    calls = []
+    responses = {"gpt-4o-prod": [(503, {}, 0)]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        gateway = LLMGateway(make_db(make_model()))
+        for _ in range(2):
+            with pytest.raises(LLMUpstreamError):
+                await gateway.chat([{"role": "user", "content": "hi"}], cache=False)
+        with pytest.raises(LLMUpstreamError) as excinfo:
+            await gateway.chat([{"role": "user", "content": "hi"}], cache=False)
+
+    assert excinfo.value.reason == "circuit_open"
+    assert len(calls) == 2
+
+def sse_client(responses: dict, calls: list):
+    """Streaming variant of scripted_client: 200 answers with SSE deltas naming the deployment."""
+    async def handler(request: httpx.Request):
+        deployment = request.url.path.split("/")[3]
+        calls.append(deployment)
+        script = responses[deployment]
+        status = script.pop(0) if len(script) > 1 else script[0]
+        if status != 200:
+            return httpx.Response(status, text="upstream error")
+        body = f'data: {{"choices":[{{"delta":{{"content":"{deployment}"}}}}]}}\n\ndata: [DONE]\n\n'
+        return httpx.Response(200, content=body.encode(), headers={"Content-Type": "text/event-stream"})
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+@pytest.mark.asyncio
+async def test_stream_retries_before_first_token_and_records_health(azure_settings, fast_backoff):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 2
+    primary, db = with_fallback()
+    calls = []
+    responses = {"gpt-4o-prod": [503], "gpt-4o-eu": [200]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=sse_client(responses, calls)):
+        chunks = [c async for c in LLMGateway(db).chat_stream([{"role": "user", "content": "hi"}], ai_model=primary)]
+
+    assert chunks == ["gpt-4o-eu"]
+    assert calls == ["gpt-4o-prod", "gpt-4o-eu"]
+    assert deployment_health.get(HEALTH_KEY).breaker.failures == 1
+    assert deployment_health.get("unit-test.openai.azure.com/gpt-4o-eu").percentile(50, min_samples=1) is not None
+
+@pytest.mark.asyncio
+async def test_stream_respects_open_circuit(azure_settings, fast_backoff):
+    calls = []
+    responses = {"gpt-4o-prod": [503]}
+
+    with patch.object(LLMGateway, "_new_client", side_effect=sse_client(responses, calls)):
+        gateway = LLMGateway(make_db(make_model()))
+        for _ in range(2):
+            with pytest.raises(LLMUpstreamError):
+                [c async for c in gateway.chat_stream([{"role": "user", "content": "hi"}])]
+        with pytest.raises(LLMUpstreamError) as excinfo:
+            [c async for c in gateway.chat_stream([{"role": "user", "content": "hi"}])]
+
+    assert excinfo.value.reason == "circuit_open"
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_to_fallback(azure_settings, fast_backoff):
+    azure_settings.LLM_HEDGE_ENABLED = True
+    metrics.reset()
+    primary, db = with_fallback()
+    for _ in range(10):
+        deployment_health.get(HEALTH_KEY).record_success(20.0) # p95 = 20 ms
+    calls = []
+    responses = {"gpt-4o-prod": [(200, {}, 1.0)], "gpt-4o-eu": [(200, {}, 0)]}
+
+    start = time.monotonic()
+    with patch.object(LLMGateway, "_new_client", side_effect=scripted_client(responses, calls)):
+        response = await LLMGateway(db).chat([{"role": "user", "content": "hi"}], ai_model=primary, cache=False)
+
+    assert content(response) == "gpt-4o-eu"
+    assert time.monotonic() - start < 0.5
+    assert metrics.get_counter("llm_hedged_requests", deployment=HEALTH_KEY) == 1
+    assert metrics.get_counter("llm_hedge_wins", deployment="unit-test.openai.azure.com/gpt-4o-eu") == 1
+
+def test_breaker_half_open_allows_a_single_probe(fast_backoff):
+    breaker = CircuitBreaker("test/breaker")
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.11)
+    assert breaker.allow()
+    assert not breaker.allow() # Probe in flight
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_breaker_half_open_probe_is_claimed_once_across_threads(fast_backoff):
+    from concurrent.futures import ThreadPoolExecutor
+    breaker = CircuitBreaker("test/threads")
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.11)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        allowed = list(pool.map(lambda _: breaker.allow(), range(64)))
+
+    assert allowed.count(True) == 1
+    assert breaker.state == "half_open"
+
+def test_health_registry_creates_one_entry_per_key_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    deployment_health.reset()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        entries = list(pool.map(lambda _: deployment_health.get("unit-test.openai.azure.com/threads"), range(64)))
+
+    assert len({id(health) for health in entries}) == 1
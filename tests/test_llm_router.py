@@ -0,0 +1,167 @@
+import sys
+import os
+import random
+import pytest
+import httpx
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.user import User # noqa: F401 - mapper registry for db_session
+from app.models.assistant import Assistant # noqa: F401 - chat_sessions.assistant_id target
+from app.models.feedback import Feedback # noqa: F401 - User.feedbacks relationship target
+from app.services.gateway import LLMGateway
+from app.services.llm_router import llm_router
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_resilience import deployment_health
+from tests.test_gateway import make_model, completion_response, azure_settings  # noqa: F401
+
+ENDPOINT = "https://unit-test.openai.azure.com"
+
+def deployment(deployment_name, weight=None, pinned=None, model_id=None):
+    model = make_model(name=deployment_name, deployment=deployment_name)
+    model.id = model_id or deployment_name
+    model.route_group = "gpt-4o"
+    model.route_weight = weight
+    model.pinned_tenants = pinned
+    return model
+
+def group_db(rows):
+    db = MagicMock()
+    db.query.return_value.filter.return_value.order_by.return_value.all.return_value = rows
+    return db
+
+@pytest.fixture(autouse=True)
+def fresh_router():
+    llm_router.invalidate()
+    deployment_health.reset()
+    llm_limiter.reset()
+    random.seed(7)
+    yield
+    llm_router.invalidate()
+    deployment_health.reset()
+    llm_limiter.reset()
+
+def seed_latency(deployment_name, latency_ms, failures=0, count=20):
+    health = deployment_health.get(f"unit-test.openai.azure.com/{deployment_name}")
+    for _ in range(count):
+        health.record_success(latency_ms)
+    for _ in range(failures):
+        health.samples.append((health.samples[-1][0], None)) # Failed call, without tripping the breaker
+
+def picks(rows, n=2000, tenant=None) -> Counter:
+    db = group_db(rows)
+    return Counter(llm_router.route(db, rows[0], ENDPOINT, tenant)[0].deployment_name for _ in range(n))
+
+def test_models_without_group_are_not_routed():
+    model = make_model()
+    model.route_group = None
+    assert llm_router.route(MagicMock(), model, ENDPOINT) == [model]
+
+def test_traffic_follows_weights():
+    counts = picks([deployment("east", weight=3), deployment("west", weight=1)])
+    assert 0.7 < counts["east"] / 2000 < 0.8
+
+def test_faster_deployment_gets_more_traffic():
+    seed_latency("east", 400)
+    seed_latency("west", 100)
+    counts = picks([deployment("east"), deployment("west")])
+    assert 0.75 < counts["west"] / 2000 < 0.85 # Score 1.0 vs 0.25
+
+def test_error_rate_and_open_circuit_shift_traffic():
+    seed_latency("east", 100, failures=20) # 50% errors -> score x0.25
+    seed_latency("west", 100)
+    counts = picks([deployment("east"), deployment("west")])
+    assert 0.75 < counts["west"] / 2000 < 0.85
+
+    breaker = deployment_health.get("unit-test.openai.azure.com/west").breaker
+    for _ in range(10):
+        breaker.record_failure()
+    assert picks([deployment("east"), deployment("west")], n=200)["east"] == 200
+
+def test_standby_deployment_is_only_a_failover_candidate():
+    rows = [deployment("east"), deployment("standby", weight=0)]
+    db = group_db(rows)
+    for _ in range(50):
+        ranked = llm_router.route(db, rows[0], ENDPOINT)
+        assert [d.deployment_name for d in ranked] == ["east", "standby"]
+
+def test_pinned_tenant_is_spread_over_its_own_deployments():
+    rows = [
+        deployment("shared"),
+        deployment("eu-west", pinned=["acme"]),
+        deployment("eu-north", pinned=["acme"]),
+    ]
+    acme = picks(rows, n=400, tenant="acme")
+    assert set(acme) == {"eu-west", "eu-north"}
+    assert min(acme.values()) > 120
+
+    others = picks(rows, n=100, tenant=lambda: "globex")
+    assert set(others) == {"shared"}
+
+@pytest.mark.asyncio
+async def test_gateway_sends_to_the_routed_deployment(azure_settings):
+    rows = [deployment("east", model_id="east"), deployment("eu", pinned=["acme"], model_id="eu")]
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url.path.split("/")[3])
+        return httpx.Response(200, json=completion_response())
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))):
+        gateway = LLMGateway(group_db(rows))
+        await gateway.chat([{"role": "user", "content": "hi"}], ai_model=rows[0], tenant_id="acme", cache=False)
+        await gateway.chat([{"role": "user", "content": "hi"}], ai_model=rows[0], tenant_id="globex", cache=False)
+
+    assert calls == ["eu", "east"]
+    assert deployment_health.get("unit-test.openai.azure.com/eu").snapshot()["samples"] == 1
+
+def test_inactive_members_and_fallbacks_are_skipped(db_session):
+    from app.models.domain import AIModel
+
+    rows = [
+        AIModel(name=name, deployment_name=name, api_version="2024-12-01-preview", is_active=active, route_group="gpt-4o")
+        for name, active in (("east", True), ("west", False))
+    ]
+    standby = AIModel(name="standby", deployment_name="standby", api_version="2024-12-01-preview", is_active=False)
+    db_session.add_all([*rows, standby])
+    db_session.commit()
+    rows[0].fallback_model_id = standby.id
+    db_session.commit()
+
+    ranked = llm_router.route(db_session, rows[0], ENDPOINT)
+    assert [d.deployment_name for d in ranked] == ["east"]
+    assert all(d.is_active for d in ranked)
+
+    # Deactivated fallback is not used for failover either
+    candidates = LLMGateway(db_session)._deployment_candidates(rows[0], ENDPOINT)
+    assert [c.deployment_name for c in candidates] == ["east"]
+
+@pytest.mark.asyncio
+async def test_group_members_on_other_resources_use_their_endpoint_and_key(azure_settings, monkeypatch):
+    azure_settings.LLM_RETRY_MAX_ATTEMPTS = 2
+    azure_settings.LLM_RETRY_BASE_DELAY = 0.0
+    monkeypatch.setenv("AZURE_OPENAI_KEY_WEST", "west-key")
+    east = deployment("gpt-4o", weight=1, model_id="east")
+    west = deployment("gpt-4o", weight=0, model_id="west") # Standby copy in another region
+    west.name = "gpt-4o-west"
+    west.endpoint = "https://west-test.openai.azure.com/"
+    west.api_key_env = "AZURE_OPENAI_KEY_WEST"
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append((request.url.host, request.headers["api-key"]))
+        if request.url.host == "unit-test.openai.azure.com":
+            return httpx.Response(503, text="regional outage")
+        return httpx.Response(200, json=completion_response())
+
+    with patch.object(LLMGateway, "_new_client", side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))), \
+         patch("app.services.llm_resilience.settings.LLM_RETRY_BASE_DELAY", 0.0):
+        await LLMGateway(group_db([east, west])).chat([{"role": "user", "content": "hi"}], ai_model=east, cache=False)
+
+    assert calls == [("unit-test.openai.azure.com", "test-key"), ("west-test.openai.azure.com", "west-key")]
+    # Health is tracked per resource, so the east outage does not count against the west copy
+    assert deployment_health.get("unit-test.openai.azure.com/gpt-4o").breaker.failures == 1
+    assert deployment_health.get("west-test.openai.azure.com/gpt-4o").breaker.failures == 0
@@ -0,0 +1,210 @@
+import sys
+import os
+import json
+import asyncio
+import time
+import pytest
+import httpx
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.core.config import settings
+from app.services import azure_integration
+from app.services.azure_integration import call_azure_ocr, OCRError
+from app.services.ocr_cache import OCRCache
+
+ANALYSIS_DONE = {
+    "status": "succeeded",
+    "analyzeResult": {"readResults": [{"lines": [{"text": "Total: $500.00"}]}]}
+}
+
+@pytest.fixture
+def vision_settings():
+    overrides = {
+        "AZURE_VISION_ENDPOINT": "https://unit-test.cognitiveservices.azure.com/",
+        "AZURE_VISION_KEY": "test-key",
+        "OCR_POLL_INITIAL_INTERVAL": 0.05,
+        "OCR_POLL_MAX_INTERVAL": 0.1,
+        "OCR_POLL_BACKOFF": 2.0,
+        "OCR_POLL_TIMEOUT": 2.0,
+        "OCR_CACHE_ENABLED": False,
+    }
+    patches = [patch.object(settings, key, value) for key, value in overrides.items()]
+    for p in patches:
+        p.start()
+    yield
+    for p in patches:
+        p.stop()
+
+def mock_vision_client(polls_until_done: int, retry_after: str | None = None):
+    state = {"operations": 0, "polls": {}, "submitted": []}
+
+    def handler(request: httpx.Request):
+        if request.method == "POST":
+            state["operations"] += 1
+            state["submitted"].append(request.content)
+            return httpx.Response(202, headers={"Operation-Location": f"https://unit-test/operations/{state['operations']}"})
+        op = request.url.path
+        state["polls"][op] = state["polls"].get(op, 0) + 1
+        if state["polls"][op] < polls_until_done:
+            headers = {"Retry-After": retry_after} if retry_after else {}
+            return httpx.Response(200, json={"status": "running"}, headers=headers)
+        return httpx.Response(200, json=ANALYSIS_DONE)
+
+    real_client = httpx.AsyncClient
+    return patch.object(azure_integration.httpx, "AsyncClient", lambda *a, **kw: real_client(transport=httpx.MockTransport(handler))), state
+
+@pytest.mark.asyncio
+async def test_ocr_polls_until_succeeded(vision_settings):
+    client_patch, state = mock_vision_client(polls_until_done=3)
+    with client_patch:
+        result = await call_azure_ocr(b"fake-image")
+
+    assert result["full_text"] == "Total: $500.00"
+    assert state["polls"] == {"/operations/1": 3}
+
+@pytest.mark.asyncio
+async def test_concurrent_ocr_does_not_block_event_loop(vision_settings):
+    """
+    Polling must yield to the loop: N concurrent analyses take about as long as one.
+    """
+    client_patch, _ = mock_vision_client(polls_until_done=4)
+    with client_patch:
+        start = time.perf_counter()
+        await call_azure_ocr(b"one")
+        single = time.perf_counter() - start
+
+    client_patch, _ = mock_vision_client(polls_until_done=4)
+    with client_patch:
+        start = time.perf_counter()
+        await asyncio.gather(*(call_azure_ocr(b"many") for _ in range(5)))
+        concurrent = time.perf_counter() - start
+
+    assert concurrent < single * 3
+
+@pytest.mark.asyncio
+async def test_ocr_times_out(vision_settings):
+    client_patch, _ = mock_vision_client(polls_until_done=10_000, retry_after="0.05")
+    with patch.object(settings, "OCR_POLL_TIMEOUT", 0.3), client_patch:
+        with pytest.raises(OCRError) as excinfo:
+            await call_azure_ocr(b"slow")
+
+    assert excinfo.value.status_code == 504
+
+@pytest.mark.asyncio
+async def test_ocr_cache_skips_azure_on_repeat_upload(vision_settings, tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"), max_bytes=1024 * 1024)
+    client_patch, state = mock_vision_client(polls_until_done=1)
+    with patch.object(azure_integration, "get_ocr_cache", return_value=cache), client_patch:
+        first = await call_azure_ocr(b"same-invoice")
+        second = await call_azure_ocr(b"same-invoice")
+
+    assert state["operations"] == 1
+    assert second == first
+    assert cache.stats()["entries"] == 1
+
+def test_ocr_cache_lru_eviction_and_ttl(tmp_path):
+    entry = {"status": "success", "full_text": "x" * 100, "lines": []}
+    entry_size = len(json.dumps(entry))
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"), max_bytes=entry_size * 2 + 10)
+
+    cache.put("a", entry)
+    cache.put("b", entry)
+    assert cache.get("a") is not None # "a" is now most recently used
+    cache.put("c", entry)
+
+    assert cache.get("b") is None # LRU victim
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    expiring = OCRCache(str(tmp_path / "ttl.sqlite3"), max_bytes=1024 * 1024, ttl_seconds=1)
+    expiring.put("k", entry)
+    with patch("app.services.ocr_cache.time.time", return_value=time.time() + 5):
+        assert expiring.get("k") is None
+
+def _pdf_bytes(pages: list[str | None]) -> bytes:
+    # None = page without a text layer (stands in for a scanned page)
+    import io
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for text in pages:
+        if text:
+            c.drawString(72, 720, text)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+@pytest.mark.asyncio
+async def test_digital_pdf_skips_ocr(vision_settings):
+    from app.services.azure_integration import extract_document_text
+    client_patch, state = mock_vision_client(polls_until_done=1)
+    with client_patch:
+        result = await extract_document_text(_pdf_bytes(["Invoice 2024-001 for ACME Corp", "Total amount due: 500 USD"]))
+
+    assert state["operations"] == 0
+    assert result["text_source"] == "text_layer"
+    assert result["ocr_pages"] == []
+    assert result["lines"] == ["Invoice 2024-001 for ACME Corp", "Total amount due: 500 USD"]
+
+@pytest.mark.asyncio
+async def test_mixed_pdf_ocrs_only_scanned_pages(vision_settings):
+    import io
+    import pypdf
+    from app.services.azure_integration import extract_document_text
+
+    client_patch, state = mock_vision_client(polls_until_done=1)
+    with client_patch:
+        result = await extract_document_text(_pdf_bytes(["Contract between ACME and Globex", None]))
+
+    assert result["text_source"] == "mixed"
+    assert result["ocr_pages"] == [2]
+    assert result["lines"] == ["Contract between ACME and Globex", "Total: $500.00"]
+    # Only the scanned page was uploaded
+    assert len(pypdf.PdfReader(io.BytesIO(state["submitted"][0])).pages) == 1
+
+@pytest.mark.asyncio
+async def test_ocr_skill_reads_text_layer_once_without_keys(tmp_path):
+    from app.services import pdf_text
+    from app.services.skill_loader import SKILLS_DIR, load_skill_module
+
+    pdf_path = tmp_path / "invoice.pdf"
+    pdf_path.write_bytes(_pdf_bytes(["Invoice 2024-001 for ACME Corp", "Total amount due: 500 USD"]))
+    module = load_skill_module("ocr_processor", os.path.join(SKILLS_DIR, "ocr_processor", "run.py"))
+
+    real_iter = pdf_text.iter_page_text
+    passes = []
+
+    def counting_iter(source, *args, **kwargs):
+        passes.append(source)
+        return real_iter(source, *args, **kwargs)
+
+    with patch.object(settings, "AZURE_VISION_ENDPOINT", None), patch.object(settings, "AZURE_VISION_KEY", None), \
+         patch.object(pdf_text, "iter_page_text", side_effect=counting_iter):
+        result = await module.execute({"file_path": str(pdf_path)})
+
+    assert result["text_source"] == "text_layer"
+    assert result["lines"] == ["Invoice 2024-001 for ACME Corp", "Total amount due: 500 USD"]
+    assert len(passes) == 1
+
+@pytest.mark.asyncio
+async def test_ocr_skill_mock_mode_does_not_need_a_file():
+    from app.services.skill_loader import SKILLS_DIR, load_skill_module
+
+    module = load_skill_module("ocr_processor", os.path.join(SKILLS_DIR, "ocr_processor", "run.py"))
+    with patch.object(settings, "AZURE_VISION_ENDPOINT", None), patch.object(settings, "AZURE_VISION_KEY", None):
+        assert (await module.execute({}))["text_source"] == "mock"
+        assert (await module.execute({"file_path": "/nonexistent/receipt.png"}))["text_source"] == "mock"
+
+@pytest.mark.asyncio
+async def test_non_pdf_goes_to_ocr(vision_settings):
+    from app.services.azure_integration import extract_document_text
+    client_patch, state = mock_vision_client(polls_until_done=1)
+    with client_patch:
+        result = await extract_document_text(b"\x89PNG fake image")
+
+    assert state["operations"] == 1
+    assert result["text_source"] == "ocr"
+    assert result["ocr_pages"] is None
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from app.core.config import settings
+from app.services import pdf_text
+from app.services.pdf_text import parse_page_range, extract_text, iter_page_text
+
+def _make_pdf(path, pages):
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(str(path))
+    for i in range(1, pages + 1):
+        c.drawString(72, 720, f"Page {i} content")
+        c.showPage()
+    c.save()
+    return str(path)
+
+def test_parse_page_range():
+    assert parse_page_range(None, 5) == [0, 1, 2, 3, 4]
+    assert parse_page_range("2-3,5", 5) == [1, 2, 4]
+    assert parse_page_range("4-", 5) == [3, 4]
+    assert parse_page_range([3, 1, 3], 5) == [2, 0]
+    with pytest.raises(ValueError):
+        parse_page_range("7", 5)
+
+def test_extract_text_serial_and_parallel_match(tmp_path):
+    pdf = _make_pdf(tmp_path / "doc.pdf", 12)
+
+    serial = extract_text(pdf, parallel=False)
+    assert serial.splitlines()[0] == "Page 1 content"
+    assert serial.count("\n") == 12
+
+    with patch.object(settings, "PDF_EXTRACT_WORKERS", 2), patch.object(settings, "PDF_EXTRACT_CHUNK_PAGES", 4):
+        assert extract_text(pdf, parallel=True) == serial
+
+    # Fast mode and page ranges
+    assert extract_text(pdf, pages="11-", engine="pypdf").split() == "Page 11 content Page 12 content".split()
+
+def test_iter_page_text_is_incremental(tmp_path):
+    pdf = _make_pdf(tmp_path / "doc.pdf", 6)
+    with patch.object(settings, "PDF_EXTRACT_CHUNK_PAGES", 2), \
+         patch("app.services.pdf_text.extract_pages", wraps=pdf_text.extract_pages) as spy:
+        pages = iter_page_text(pdf, parallel=False)
+        assert next(pages) == (1, "Page 1 content")
+        assert spy.call_count == 1 # Only the first chunk has been extracted
+        assert [n for n, _ in pages] == [2, 3, 4, 5, 6]
+
+def test_pdf_skill_pages_output(tmp_path):
+    import importlib.util, os
+    pdf = _make_pdf(tmp_path / "doc.pdf", 3)
+    run_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app", "skills", "pdf", "run.py")
+    spec = importlib.util.spec_from_file_location("pdf_skill_test", run_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    result = module.execute({"operation": "extract_text", "files": [pdf], "pages": "2-3", "output": "pages"})
+    assert result[pdf]["total_pages"] == 3
+    assert result[pdf]["pages"] == [{"page": 2, "text": "Page 2 content"}, {"page": 3, "text": "Page 3 content"}]
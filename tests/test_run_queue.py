@@ -0,0 +1,68 @@
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.domain import Component, Workflow, RunExecution, RunStatus, EndpointType
+from app.services.workflow_engine import WorkflowEngine
+from app.services.run_queue import RunWorkerPool, claim_next_run, recover_stale_runs
+
+def make_workflow(db):
+    component = Component(
+        name="Mock Step", description="", input_schema={}, output_schema={}, tags=[],
+        endpoint_type=EndpointType.RULE_ENGINE, configuration={"kind": "mock", "payload": {"ok": True}}
+    )
+    db.add(component)
+    db.commit()
+    workflow = Workflow(name="Queued", description="", steps=[
+        {"step_id": 1, "component_id": str(component.id)},
+        {"step_id": 2, "component_id": str(component.id)},
+    ])
+    db.add(workflow)
+    db.commit()
+    return workflow
+
+def test_submitted_run_is_drained_by_workers(db_session):
+    from tests.conftest import TestingSessionLocal
+
+    workflow = make_workflow(db_session)
+    run = WorkflowEngine(db_session).submit_run(workflow.id, {"x": 1}, user_id=None)
+    assert run.status == RunStatus.PENDING
+    run_id = run.id
+
+    pool = RunWorkerPool(session_factory=TestingSessionLocal, workers=2, poll_interval=0.05)
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            db_session.expire_all()
+            run = db_session.get(RunExecution, run_id)
+            if run.status not in (RunStatus.PENDING, RunStatus.RUNNING):
+                break
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    assert run.status == RunStatus.SUCCESS, run.log
+    assert run.output_payload == {"ok": True}
+    assert [entry["step_id"] for entry in run.log] == [1, 2]
+    assert run.attempts == 1
+
+def test_claim_is_exclusive_and_stale_runs_are_requeued(db_session):
+    workflow = make_workflow(db_session)
+    run = WorkflowEngine(db_session).submit_run(workflow.id, {})
+    run_id = run.id
+
+    claimed = claim_next_run(db_session)
+    assert claimed.id == run_id
+    assert claim_next_run(db_session) is None
+
+    # Worker died mid-run: no heartbeat for longer than the stale window
+    claimed.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+    db_session.commit()
+    assert recover_stale_runs(db_session, stale_minutes=30, max_attempts=3) == 1
+    db_session.expire_all()
+    assert db_session.get(RunExecution, run_id).status == RunStatus.PENDING
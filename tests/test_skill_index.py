@@ -0,0 +1,69 @@
+import sys
+import os
+import glob
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.skill import Skill, SkillType
+from app.models.user import User # noqa: F401 - mapper registry for db_session
+from app.models.feedback import Feedback # noqa: F401 - User.feedbacks relationship target
+from app.services.skill_loader import parse_skill_md, SKILLS_DIR
+from app.services.skill_index import SkillIndex
+
+def repo_skills() -> list[Skill]:
+    skills = []
+    for md_path in sorted(glob.glob(os.path.join(SKILLS_DIR, "*", "skill.md"))):
+        meta = parse_skill_md(md_path)
+        skills.append(Skill(
+            name=meta.get("name"), description=meta.get("description", ""), category=meta.get("category"),
+            skill_type=SkillType.PYTHON_FUNC, input_schema=meta.get("input_schema", {}),
+            configuration={"instructions": meta.get("instructions", "")}, is_active=True
+        ))
+    return skills
+
+def test_shortlist_ranks_relevant_skills_first():
+    skills = repo_skills()
+    index = SkillIndex()
+    index.sync(skills)
+
+    assert index.shortlist("幫我審閱這份合約的風險", skills, 3)[0].name == "legal_contract_review"
+    assert index.shortlist("請幫我求解這個代數方程式", skills, 3)[0].name == "sympy"
+    assert index.shortlist("從收據中提取總金額與商家", skills, 3)[0].name == "receipt_extractor"
+    assert len(index.shortlist("你好", skills, 3)) == 3
+
+def test_sync_is_incremental():
+    skills = repo_skills()
+    index = SkillIndex()
+    assert index.sync(skills) == len(skills)
+    assert index.sync(skills) == 0
+
+    skills[0].description = "全新的描述：天氣預報"
+    assert index.sync(skills) == 1
+    assert index.search("天氣預報")[0][0] == skills[0].name
+
+    assert index.sync(skills[1:]) == 1
+    assert len(index) == len(skills) - 1
+
+def test_tool_catalog_is_cached_until_skills_change(db_session):
+    from app.services.tool_catalog import tool_catalog_cache
+    from app.services.agent_service import render_planner_prompt
+
+    db_session.add(Skill(name="calc", description="算術", category="math", skill_type=SkillType.PYTHON_FUNC,
+                         input_schema={"expr": "運算式"}, configuration={}, is_active=True))
+    db_session.commit()
+    tool_catalog_cache.invalidate()
+
+    catalog = tool_catalog_cache.get(db_session, None, render_planner_prompt)
+    assert tool_catalog_cache.get(db_session, None, render_planner_prompt) is catalog
+    prompt = catalog.system_prompt()
+    assert '- calc: 算術 (Args: {"expr": "\\u904b\\u7b97\\u5f0f"})' in prompt
+    assert catalog.system_prompt() is prompt
+
+    # A committed Skill change bumps the catalog version
+    skill = db_session.query(Skill).filter(Skill.name == "calc").first()
+    skill.description = "四則運算"
+    db_session.commit()
+    rebuilt = tool_catalog_cache.get(db_session, None, render_planner_prompt)
+    assert rebuilt is not catalog
+    assert "- calc: 四則運算" in rebuilt.system_prompt()
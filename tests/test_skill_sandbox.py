@@ -0,0 +1,90 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+from app.models.user import User # noqa: F401 (mapper registry)
+from app.models.feedback import Feedback # noqa: F401
+from app.models.skill import Skill, SkillType, SkillExecution
+from app.services.skill_sandbox import SkillSandbox, SkillSandboxError
+
+SKILL_CODE = """
+import os, time
+def execute(input_data):
+    mode = input_data.get("mode")
+    if mode == "sleep":
+        time.sleep(30)
+    if mode == "crash":
+        os._exit(3)
+    if mode == "alloc":
+        block = bytearray(input_data["mb"] * 1024 * 1024)
+        return {"allocated": len(block)}
+    if mode == "fail":
+        raise ValueError("bad input")
+    return {"pid": os.getpid()}
+"""
+
+@pytest.fixture
+def sandbox():
+    pool = SkillSandbox(workers=1, preload=[], max_tasks=100)
+    pool.start()
+    yield pool
+    pool.stop()
+
+@pytest.fixture
+def run_script(tmp_path):
+    path = tmp_path / "run.py"
+    path.write_text(SKILL_CODE)
+    return str(path)
+
+def test_sandbox_runs_in_worker_process_and_recovers(sandbox, run_script):
+    first = sandbox.run("sandbox_test", run_script, {})
+    assert first["pid"] != os.getpid()
+    # Pre-warmed worker is reused
+    assert sandbox.run("sandbox_test", run_script, {})["pid"] == first["pid"]
+
+    with pytest.raises(SkillSandboxError) as excinfo:
+        sandbox.run("sandbox_test", run_script, {"mode": "fail"})
+    assert excinfo.value.error_code == "SKILL_EXECUTION_FAILED"
+    assert "bad input" in excinfo.value.remote_traceback
+
+    with pytest.raises(SkillSandboxError) as excinfo:
+        sandbox.run("sandbox_test", run_script, {"mode": "sleep"}, timeout=0.5)
+    assert excinfo.value.error_code == "SKILL_TIMEOUT"
+
+    with pytest.raises(SkillSandboxError) as excinfo:
+        sandbox.run("sandbox_test", run_script, {"mode": "crash"})
+    assert excinfo.value.error_code == "SKILL_CRASHED"
+
+    # Timed out / crashed workers were replaced
+    assert sandbox.run("sandbox_test", run_script, {})["pid"] != first["pid"]
+
+@pytest.mark.skipif(sys.platform == "win32", reason="RLIMIT_AS is not available on Windows")
+def test_sandbox_memory_cap(sandbox, run_script):
+    with pytest.raises(SkillSandboxError) as excinfo:
+        sandbox.run("sandbox_test", run_script, {"mode": "alloc", "mb": 4096}, memory_mb=1024)
+    assert excinfo.value.error_code == "SKILL_MEMORY_LIMIT"
+    # Limit is lifted after the call
+    assert sandbox.run("sandbox_test", run_script, {"mode": "alloc", "mb": 8})["allocated"] == 8 * 1024 * 1024
+
+def test_execute_skill_records_sandbox_timeout(db_session, sandbox, tmp_path, run_script):
+    from app.services.skill_loader import execute_skill
+
+    skill = Skill(
+        name="sandboxed",
+        description="Test Skill",
+        category="test",
+        skill_type=SkillType.PYTHON_FUNC,
+        configuration={"folder_path": os.path.dirname(run_script), "execution": "process", "timeout_seconds": 0.5},
+        is_active=True
+    )
+    db_session.add(skill)
+    db_session.commit()
+
+    with patch("app.services.skill_loader.skill_sandbox", sandbox):
+        first = execute_skill("sandboxed", {}, db_session)
+        assert first["pid"] != os.getpid()
+        result = execute_skill("sandboxed", {"mode": "sleep"}, db_session, trace_id="t-1")
+
+    assert result["error_code"] == "SKILL_TIMEOUT"
+    record = db_session.query(SkillExecution).filter(SkillExecution.trace_id == "t-1").one()
+    assert record.status == "ERROR"
@@ -31,3 +31,67 @@ def test_missing_skill(db_session):
     with pytest.raises(ValueError) as excinfo:
         execute_skill("non_existent_skill", {}, db_session)
     assert "not found" in str(excinfo.value)
+
+def _register_tmp_skill(db_session, tmp_path, name, code, configuration=None):
+    skill_dir = tmp_path / name
+    skill_dir.mkdir()
+    (skill_dir / "run.py").write_text(code)
+    skill = Skill(
+        name=name,
+        description="Test Skill",
+        category="test",
+        skill_type=SkillType.PYTHON_FUNC,
+        configuration={"folder_path": str(skill_dir), **(configuration or {})},
+        is_active=True
+    )
+    db_session.add(skill)
+    db_session.commit()
+    return skill
+
+def test_execute_skill_async_awaits_async_and_offloads_sync(db_session, tmp_path):
+    import asyncio
+    import threading
+    from app.services.skill_loader import execute_skill_async
+
+    _register_tmp_skill(db_session, tmp_path, "async_skill",
+        "async def execute(input_data):\n    return {'mode': 'async', 'x': input_data['x']}\n")
+    _register_tmp_skill(db_session, tmp_path, "sync_skill",
+        "import threading\ndef execute(input_data):\n    return {'thread': threading.current_thread().name}\n")
+
+    async def run():
+        return (
+            await execute_skill_async("async_skill", {"x": 1}, db_session),
+            await execute_skill_async("sync_skill", {}, db_session),
+        )
+
+    async_result, sync_result = asyncio.run(run())
+    assert async_result == {"mode": "async", "x": 1}
+    # Sync execute() runs in the skill pool, not on the event loop thread
+    assert sync_result["thread"].startswith("skill")
+    assert sync_result["thread"] != threading.current_thread().name
+
+    # Async skills still work for blocking callers
+    assert execute_skill("async_skill", {"x": 2}, db_session) == {"mode": "async", "x": 2}
+
+def test_execute_skill_async_per_skill_limit(db_session, tmp_path):
+    import asyncio
+    from unittest.mock import patch
+    from app.core.config import settings
+    from app.services.skill_loader import execute_skill_async
+
+    _register_tmp_skill(db_session, tmp_path, "slow_skill",
+        "import time\ndef execute(input_data):\n    time.sleep(0.3)\n    return {'done': True}\n",
+        {"max_concurrency": 1})
+
+    async def run():
+        return await asyncio.gather(
+            execute_skill_async("slow_skill", {}, db_session),
+            execute_skill_async("slow_skill", {}, db_session),
+        )
+
+    with patch.object(settings, "SKILL_QUEUE_TIMEOUT_SECONDS", 0.05):
+        results = asyncio.run(run())
+
+    assert {"done": True} in results
+    busy = [r for r in results if r.get("error_code") == "SKILL_BUSY"]
+    assert len(busy) == 1
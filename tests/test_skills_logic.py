@@ -2,7 +2,7 @@ import sys
 import os
 import importlib.util
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
@@ -28,17 +28,15 @@ def test_hello_world_skill():
     # Fixed assertion: "Hello, World!" has a comma
     assert "Hello, World!" in result["message"]
 
-@patch("httpx.Client")
-def test_sympy_skill_with_mock(mock_client_cls):
+def test_sympy_skill_with_mock():
     """
-    Test SymPy skill by mocking the Azure OpenAI call.
+    Test SymPy skill (async execute) by mocking the gateway call.
     """
+    import asyncio
     module = load_skill_module("sympy")
     
     # Setup Mock
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {
+    mock_response = {
         "choices": [
             {
                 "message": {
@@ -47,14 +45,58 @@ def test_sympy_skill_with_mock(mock_client_cls):
             }
         ]
     }
-    
-    mock_client = mock_client_cls.return_value
-    mock_client.__enter__.return_value.post.return_value = mock_response
 
     # Execute
     input_data = {"query": "1+1"} # Correct key is 'query'
-    result = module.execute(input_data)
+    with patch.object(module.settings, "AZURE_OPENAI_API_KEY", "test-key"), \
+         patch("app.services.gateway.LLMGateway.chat", new_callable=AsyncMock) as mock_chat:
+        mock_chat.return_value = mock_response
+        result = asyncio.run(module.execute(input_data))
     
     # Assert
     assert result["summary"] == "Calcs 1+1"
     assert result["code"] == "print(2)"
+
+def test_skill_module_cache_reloads_on_change(tmp_path):
+    """
+    The loader keeps run.py hot and only re-imports it when the file changes.
+    """
+    from app.services.skill_loader import load_skill_module, invalidate_skill_module
+
+    run_path = tmp_path / "run.py"
+    run_path.write_text("def execute(input_data):\n    return {'version': 1}\n")
+    invalidate_skill_module("cache_test")
+
+    first = load_skill_module("cache_test", str(run_path))
+    assert load_skill_module("cache_test", str(run_path)) is first
+
+    run_path.write_text("def execute(input_data):\n    return {'version': 2, 'changed': True}\n")
+    reloaded = load_skill_module("cache_test", str(run_path))
+    assert reloaded is not first
+    assert reloaded.execute({})["version"] == 2
+    invalidate_skill_module("cache_test")
+
+def test_slow_skill_import_does_not_block_other_skills(tmp_path):
+    """
+    run.py is imported outside the cache lock: a skill with heavy imports does not stall the others.
+    """
+    import threading
+    import time
+    from app.services.skill_loader import load_skill_module, invalidate_skill_module
+
+    slow_path = tmp_path / "slow.py"
+    slow_path.write_text("import time\ntime.sleep(0.3)\ndef execute(input_data):\n    return {}\n")
+    fast_path = tmp_path / "fast.py"
+    fast_path.write_text("def execute(input_data):\n    return {}\n")
+    invalidate_skill_module()
+
+    loader = threading.Thread(target=load_skill_module, args=("slow_import", str(slow_path)))
+    loader.start()
+    time.sleep(0.05) # Slow import under way
+    start = time.monotonic()
+    load_skill_module("fast_import", str(fast_path))
+    assert time.monotonic() - start < 0.2
+    loader.join()
+
+    assert load_skill_module("slow_import", str(slow_path)) is load_skill_module("slow_import", str(slow_path))
+    invalidate_skill_module()
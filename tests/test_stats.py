@@ -0,0 +1,156 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.user import User
+from app.models.feedback import Feedback # noqa: F401 - User.feedbacks relationship target
+from app.models.stats import UsageLog
+from app.models.domain import AIModel
+from app.routers.stats import get_dashboard_stats, get_usage_report
+from app.services.usage_accounting import record_usage, backfill_rollup, ensure_rollup, UsageWriter
+
+def test_dashboard_aggregates_in_sql(db_session):
+    user = User(email="stats@example.com", hashed_password="!")
+    other = User(email="other@example.com", hashed_password="!")
+    db_session.add_all([user, other])
+    db_session.add(AIModel(name="GPT-4o", deployment_name="gpt-4o", api_version="2024-12-01-preview", is_active=True))
+    db_session.commit()
+
+    now = datetime.utcnow()
+    rows = [
+        (user.id, now, 100, 0.5),
+        (user.id, now - timedelta(minutes=5), 50, 0.25),
+        (user.id, now - timedelta(days=2), 30, 0.1),
+        (user.id, now - timedelta(days=30), 1000, 2.0), # outside chart window, still in totals
+        (other.id, now, 999, 9.9),
+    ]
+    for user_id, ts, tokens, cost in rows:
+        db_session.add(UsageLog(user_id=user_id, app_name="Test", model_name="gpt-4o",
+                                total_tokens=tokens, estimated_cost=cost, timestamp=ts))
+    db_session.commit()
+    # Raw inserts bypass record_usage(); rebuild the rollup the dashboard reads
+    backfill_rollup(db_session)
+
+    stats = get_dashboard_stats(db=db_session, current_user=user)
+
+    assert stats["total_tokens"] == 1180
+    assert stats["current_cost"] == "2.8500"
+    assert stats["active_model"] == "GPT-4o"
+
+    tokens = stats["chart_data"]["datasets"][0]["data"]
+    assert len(tokens) == 7
+    assert tokens[-1] == 150
+    assert tokens[-3] == 30
+    assert sum(tokens) == 180
+
+    assert len(stats["recent_activity"]) == 4
+    assert stats["recent_activity"][0]["details"] == "100 tokens (gpt-4o)"
+
+def test_record_usage_maintains_rollup_incrementally(db_session):
+    user = User(email="rollup@example.com", hashed_password="!", tenant_id="acme")
+    db_session.add(user)
+    db_session.commit()
+
+    for tokens, app in [(100, "Agent-General"), (50, "Agent-General"), (10, "Enterprise Chat")]:
+        record_usage(db_session, UsageLog(user_id=user.id, app_name=app, model_name="gpt-4o",
+                                          total_tokens=tokens, estimated_cost=tokens / 1000))
+
+    report = get_usage_report(group_by="app", db=db_session, current_user=user)
+    by_app = {item["app"]: item for item in report["items"]}
+    assert by_app["Agent-General"]["requests"] == 2
+    assert by_app["Agent-General"]["tokens"] == 150
+    assert by_app["Enterprise Chat"]["tokens"] == 10
+
+    # Incremental result matches a full rebuild from raw logs
+    backfill_rollup(db_session)
+    rebuilt = get_usage_report(group_by="app", db=db_session, current_user=user)
+    assert rebuilt["items"] == report["items"]
+    assert db_session.query(UsageLog).first().tenant_id == "acme"
+
+def test_ensure_rollup_backfills_history_older_than_the_rollup(db_session):
+    # Rollup deployed while raw logs already existed: new traffic keeps it non-empty, old days must still be filled
+    user = User(email="history@example.com", hashed_password="!")
+    db_session.add(user)
+    db_session.commit()
+
+    old = datetime.utcnow() - timedelta(days=3)
+    db_session.add(UsageLog(user_id=user.id, app_name="Legacy", model_name="gpt-4o",
+                            total_tokens=40, estimated_cost=0.04, timestamp=old))
+    db_session.commit()
+    record_usage(db_session, UsageLog(user_id=user.id, app_name="Agent-General", model_name="gpt-4o",
+                                      total_tokens=10, estimated_cost=0.01))
+
+    ensure_rollup(db_session)
+    report = get_usage_report(group_by="app", db=db_session, current_user=user)
+    by_app = {item["app"]: item["tokens"] for item in report["items"]}
+    assert by_app == {"Legacy": 40, "Agent-General": 10}
+
+    ensure_rollup(db_session) # Already covered: nothing rebuilt or double counted
+    assert get_usage_report(group_by="app", db=db_session, current_user=user)["items"] == report["items"]
+
+def test_usage_writer_batches_and_flushes_on_stop(db_session):
+    from tests.conftest import TestingSessionLocal
+
+    user = User(email="writer@example.com", hashed_password="!", tenant_id="acme")
+    db_session.add(user)
+    db_session.commit()
+
+    writer = UsageWriter(session_factory=TestingSessionLocal, batch_size=50, flush_interval_ms=10_000)
+    writer.start()
+    for i in range(120):
+        assert writer.enqueue({"user_id": user.id, "trace_id": None, "tenant_id": None, "app_name": "Agent-General",
+                               "model_name": "gpt-4o", "tokens_input": 1, "tokens_output": 1, "total_tokens": 2,
+                               "estimated_cost": 0.001, "timestamp": datetime.utcnow()})
+    writer.stop()
+
+    # Long flush interval: everything past the full batches was written by the shutdown drain
+    assert not writer.running
+    assert db_session.query(UsageLog).count() == 120
+    report = get_usage_report(group_by="app", db=db_session, current_user=user)
+    assert report["items"][0]["requests"] == 120
+    assert report["items"][0]["tokens"] == 240
+    assert db_session.query(UsageLog).first().tenant_id == "acme"
+
+def test_usage_writer_retries_and_isolates_bad_records(db_session):
+    from unittest.mock import patch
+    from app.core.config import settings
+    from app.core.metrics import metrics
+    from app.services import usage_accounting
+    from tests.conftest import TestingSessionLocal
+
+    user = User(email="retry@example.com", hashed_password="!", tenant_id="acme")
+    db_session.add(user)
+    db_session.commit()
+
+    def record(user_id):
+        return {"user_id": user_id, "trace_id": None, "tenant_id": None, "app_name": "Agent-General",
+                "model_name": "gpt-4o", "tokens_input": 1, "tokens_output": 1, "total_tokens": 2,
+                "estimated_cost": 0.001, "timestamp": datetime.utcnow()}
+
+    real_write = usage_accounting.write_usage_batch
+    calls = []
+
+    def flaky_write(db, records, commit=True):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise RuntimeError("database is restarting")
+        real_write(db, records, commit=commit)
+
+    metrics.reset()
+    writer = UsageWriter(session_factory=TestingSessionLocal)
+    with patch.object(settings, "USAGE_WRITER_RETRY_DELAY", 0.0), \
+         patch.object(usage_accounting, "write_usage_batch", side_effect=flaky_write):
+        # Transient failure: the retry writes the whole batch
+        writer._flush([record(user.id), record(user.id)])
+        assert calls == [2, 2]
+        assert db_session.query(UsageLog).count() == 2
+
+        # Persistent failure (user_id is NOT NULL): only the bad record is dropped
+        writer._flush([record(user.id), record(None), record(user.id)])
+
+    assert db_session.query(UsageLog).count() == 4
+    assert metrics.get_counter("usage_writer_dropped_records") == 1
+    assert metrics.get_counter("usage_writer_flushed_records") == 4
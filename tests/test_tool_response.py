@@ -0,0 +1,30 @@
+import sys
+import os
+import json
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.skill_loader import parse_skill_md, SKILLS_DIR
+from app.services.tool_response import render_direct, response_spec, project_result
+
+def spec_for(skill_folder: str) -> dict:
+    return response_spec(parse_skill_md(os.path.join(SKILLS_DIR, skill_folder, "skill.md")))
+
+def test_direct_mode_renders_templates_locally():
+    spec = spec_for("skill_discovery")
+    assert spec["response_mode"] == "direct"
+    reply = render_direct({"count": 2, "skills": [{"name": "pdf_manager", "description": "PDF"}, {"name": "sympy", "description": "數學"}]}, spec)
+    assert reply == "目前共有 2 個可用技能：\n- **pdf_manager**：PDF\n- **sympy**：數學"
+
+    assert render_direct({"message": "Hello, Bob!", "status": "success"}, spec_for("hello_world")) == "Hello, Bob!"
+    # Errors go back through synthesis so the model can explain them
+    assert render_direct({"error": "boom"}, spec_for("hello_world")) is None
+
+def test_synthesis_projection_is_bounded():
+    result = {"text": "字" * 50_000, "rows": list(range(500)), "pages": 12}
+    projected = project_result(result, spec_for("pdf")["synthesis_max_chars"])
+
+    assert len(json.dumps(projected, ensure_ascii=False)) <= 6000
+    assert projected["pages"] == 12
+    assert len(projected["rows"]) == 21
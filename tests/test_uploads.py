@@ -0,0 +1,91 @@
+import io
+import os
+import hashlib
+import httpx
+import pytest
+from unittest.mock import patch
+from starlette.datastructures import UploadFile
+from app.core.config import settings
+from app.services import azure_integration
+from app.services.uploads import SpooledUpload, UploadTooLarge, spool_upload
+
+def _upload(data: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), size=size, filename="scan.bin")
+
+@pytest.mark.asyncio
+async def test_spool_upload_hashes_and_rolls_to_disk():
+    data = os.urandom(300_000)
+    with patch.object(settings, "UPLOAD_SPOOL_MEMORY_BYTES", 100_000), patch.object(settings, "UPLOAD_CHUNK_BYTES", 64_000):
+        upload = await spool_upload(_upload(data))
+
+    with upload:
+        assert not upload.in_memory
+        assert os.path.exists(upload.path)
+        assert upload.size == len(data)
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert b"".join([chunk async for chunk in upload.aiter_chunks(50_000)]) == data
+        path = upload.path
+    assert not os.path.exists(path) # Spool file removed on close
+
+@pytest.mark.asyncio
+async def test_spool_upload_enforces_size_limit():
+    with patch.object(settings, "UPLOAD_CHUNK_BYTES", 1000):
+        with pytest.raises(UploadTooLarge):
+            await spool_upload(_upload(b"x" * 5000), max_bytes=2000)
+        # Declared size is checked before reading anything
+        with pytest.raises(UploadTooLarge):
+            await spool_upload(_upload(b"", size=10_000), max_bytes=2000)
+
+@pytest.mark.asyncio
+async def test_spooled_upload_is_streamed_to_azure():
+    data = os.urandom(250_000)
+    received = {}
+
+    def handler(request: httpx.Request):
+        if request.method == "POST":
+            received["headers"] = request.headers
+            received["body"] = request.read()
+            return httpx.Response(202, headers={"Operation-Location": "https://unit-test/operations/1"})
+        return httpx.Response(200, json={"status": "succeeded", "analyzeResult": {"readResults": [{"lines": [{"text": "ok"}]}]}})
+
+    real_client = httpx.AsyncClient
+    overrides = {
+        "AZURE_VISION_ENDPOINT": "https://unit-test.cognitiveservices.azure.com/",
+        "AZURE_VISION_KEY": "test-key",
+        "OCR_POLL_INITIAL_INTERVAL": 0.01,
+        "UPLOAD_SPOOL_MEMORY_BYTES": 50_000,
+    }
+    patches = [patch.object(settings, k, v) for k, v in overrides.items()]
+    for p in patches:
+        p.start()
+    try:
+        cache_keys = []
+        class RecordingCache:
+            def get(self, key):
+                cache_keys.append(key)
+                return None
+            def put(self, key, value):
+                pass
+
+        with patch.object(azure_integration.httpx, "AsyncClient", lambda *a, **kw: real_client(transport=httpx.MockTransport(handler))), \
+             patch.object(azure_integration, "get_ocr_cache", return_value=RecordingCache()):
+            with await spool_upload(_upload(data)) as upload:
+                result = await azure_integration.call_azure_ocr(upload)
+    finally:
+        for p in patches:
+            p.stop()
+
+    assert result["full_text"] == "ok"
+    assert received["body"] == data
+    assert received["headers"]["content-length"] == str(len(data))
+    assert cache_keys == [hashlib.sha256(data).hexdigest()]
+
+def test_spooled_upload_from_path(tmp_path):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    upload = SpooledUpload.from_path(str(path))
+    assert upload.source == str(path)
+    assert upload.head(4) == b"%PDF"
+    assert upload.sha256 == hashlib.sha256(b"%PDF-1.4 test").hexdigest()
+    upload.close()
+    assert path.exists() # Caller's file is never deleted
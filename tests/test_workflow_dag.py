@@ -0,0 +1,104 @@
+import sys
+import os
+import time
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from app.models.domain import Component, Workflow, RunStatus, EndpointType
+from app.services.workflow_engine import WorkflowEngine
+
+STEP_SECONDS = 0.2
+
+def make_component(db, name):
+    component = Component(
+        name=name, description="", input_schema={}, output_schema={}, tags=[],
+        endpoint_type=EndpointType.RULE_ENGINE, configuration={"kind": "mock", "payload": {name: True}}
+    )
+    db.add(component)
+    db.commit()
+    return component
+
+def slow_execute_step(self, component, input_data, user_id=None, manual_context=None):
+    time.sleep(STEP_SECONDS)
+    return {**component.configuration["payload"], "seen": sorted(k for k in input_data if k != "seen")}
+
+def test_dag_runs_independent_steps_in_parallel(db_session, monkeypatch):
+    monkeypatch.setattr(WorkflowEngine, "execute_step", slow_execute_step)
+    ocr, legal, receipt, report = (make_component(db_session, n) for n in ("ocr", "legal", "receipt", "report"))
+
+    workflow = Workflow(name="Fan-out", description="", steps=[
+        {"step_id": 1, "component_id": str(ocr.id)},
+        {"step_id": 2, "component_id": str(legal.id), "depends_on": [1]},
+        {"step_id": 3, "component_id": str(receipt.id), "depends_on": [1]},
+        {"step_id": 4, "component_id": str(report.id), "depends_on": [2, 3]},
+    ])
+    db_session.add(workflow)
+    db_session.commit()
+
+    start = time.perf_counter()
+    run = WorkflowEngine(db_session).run_workflow(workflow.id, {"doc": "x"})
+    elapsed = time.perf_counter() - start
+
+    assert run.status == RunStatus.SUCCESS, run.log
+    # Critical path is 3 steps; sequential would be 4
+    assert elapsed < STEP_SECONDS * 3.8
+    assert run.output_payload["report"] is True
+    # Input = run input + direct dependencies only
+    assert run.output_payload["seen"] == ["doc", "legal", "receipt"]
+    assert [entry["step_id"] for entry in run.log][0] == 1
+    assert [entry["step_id"] for entry in run.log][-1] == 4
+
+def test_linear_next_step_semantics_unchanged(db_session):
+    first, skipped, last = (make_component(db_session, n) for n in ("first", "skipped", "last"))
+    workflow = Workflow(name="Linear", description="", steps=[
+        {"step_id": 1, "component_id": str(first.id), "next_step_id": 3, "condition": {"field": "first", "value": "True"}},
+        {"step_id": 2, "component_id": str(skipped.id)},
+        {"step_id": 3, "component_id": str(last.id)},
+    ])
+    db_session.add(workflow)
+    db_session.commit()
+
+    run = WorkflowEngine(db_session).run_workflow(workflow.id, {})
+
+    assert run.status == RunStatus.SUCCESS
+    assert [entry["step_id"] for entry in run.log] == [1, 3]
+    assert run.output_payload == {"last": True}
+
+def test_dag_rejects_cycles(db_session):
+    a = make_component(db_session, "a")
+    workflow = Workflow(name="Cycle", description="", steps=[
+        {"step_id": 1, "component_id": str(a.id), "depends_on": [2]},
+        {"step_id": 2, "component_id": str(a.id), "depends_on": [1]},
+    ])
+    db_session.add(workflow)
+    db_session.commit()
+
+    run = WorkflowEngine(db_session).run_workflow(workflow.id, {})
+
+    assert run.status == RunStatus.FAILED
+    assert "cycle" in run.log[-1]["error"]
+
+def test_run_plan_prefetches_components_once(db_session):
+    from sqlalchemy import event
+
+    shared = make_component(db_session, "shared")
+    workflow = Workflow(name="Prefetch", description="", steps=[
+        {"step_id": i, "component_id": str(shared.id)} for i in range(1, 6)
+    ])
+    db_session.add(workflow)
+    db_session.commit()
+
+    statements = []
+    bind = db_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        run = WorkflowEngine(db_session).run_workflow(workflow.id, {})
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+    assert run.status == RunStatus.SUCCESS
+    assert len(run.log) == 5
+    component_selects = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM components" in s]
+    assert len(component_selects) == 1